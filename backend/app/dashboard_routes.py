@@ -1,9 +1,12 @@
 # app/dashboard_routes.py
 import asyncio
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from app.db import get_db
 from bson.objectid import ObjectId
 from app.services.scraper_service import analyze_website_forms
+from app.services import rag_service
+from app.services import page_settle
 
 
 router = APIRouter()
@@ -46,11 +49,40 @@ async def update_scraper_config(site_id: str, scraper_config: dict, db = Depends
     )
 
     if result.modified_count == 1:
+        page_settle.invalidate_site_configs()
         return {"status": "ok"}
     else:
         return {"status": "failed", "error": "Site not found."}
 
 
+@router.post("/sites/{site_id}/knowledge")
+async def add_site_knowledge(site_id: str, data: dict):
+    """Add (or replace) a markdown document in the site's own knowledge index."""
+    source = data.get("source")
+    text = data.get("text")
+    if not source or not text:
+        return {"status": "failed", "error": "Both 'source' and 'text' are required."}
+    try:
+        chunks = await rag_service.add_documents([text], source=source, replace=True, site_id=site_id)
+    except ValueError:
+        return {"status": "failed", "error": "Invalid site ID."}
+    except rag_service.RAGUnavailableError as e:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": f"Knowledge base unavailable: {e}."})
+    return {"status": "ok", "chunks": chunks}
+
+@router.delete("/sites/{site_id}/knowledge/{source:path}")
+async def remove_site_knowledge(site_id: str, source: str):
+    """Remove a document from the site's knowledge index (``source`` may contain slashes)."""
+    try:
+        removed = await rag_service.remove_documents([source], site_id=site_id)
+    except ValueError:
+        return {"status": "failed", "error": "Invalid site ID."}
+    except rag_service.RAGUnavailableError as e:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": f"Knowledge base unavailable: {e}."})
+    if removed == 0:
+        return {"status": "failed", "error": "Document not found."}
+    return {"status": "ok", "removed": removed}
+
 @router.post("/analyze-site")
 async def analyze_site(data: dict):
     url = data.get("url")
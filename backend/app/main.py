@@ -11,18 +11,40 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import router
 from app.dashboard_routes import router as dashboard_router
-from app.services.rag_service import add_documents
+from app.services import rag_service
+from app.services.browser_pool import browser_pool
+from app.services.http_clients import http_clients
 from app.services.knowledge_base import initialize_knowledge_base
 
 app = FastAPI(title="Agentic AI Backend")
 
 
+async def _warmup_and_ingest():
+    # Model load, dummy encode and index load run in the background so the
+    # server accepts traffic immediately; /api/health/ready reports progress.
+    await rag_service.warmup()
+    print("✅ RAG warmup complete")
+    await initialize_knowledge_base()
+    print("✅ Knowledge base initialized")
+
+
 @app.on_event("startup")
 async def startup_event():
     loop = asyncio.get_running_loop()
     print(f"🔍 Active Event Loop: {type(loop)}")
-    await initialize_knowledge_base()
-    print("✅ Knowledge base initialized")
+    # Pooled keep-alive HTTP clients shared by the LLM, scraping and cache code
+    await http_clients.start()
+    app.state.warmup_task = loop.create_task(_warmup_and_ingest())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush any debounced RAG index snapshots so restarts replay less of the log
+    if rag_service.default_index.loaded:
+        await rag_service.persist_all()
+    # Close the pooled browsers so no Chromium processes outlive the server
+    await browser_pool.close()
+    await http_clients.close()
 
 
 """CORS configuration
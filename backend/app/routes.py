@@ -1,11 +1,20 @@
 from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import asyncio
 import json
 import os
 
 from app.services.agent_service import run_agent_stream
+from app.services import rag_service
+from app.services import knowledge_base
+from app.services.browser_pool import browser_pool
+from app.services.http_clients import http_clients
+from app.services.llm_gateway import llm_gateway
+from app.services import conversation_context, page_cache, page_settle, prefetch, tiered_fetch
+from app.services.cache import scrape_cache
+from app.services.single_flight import scrape_flights
 
 router = APIRouter()
 
@@ -14,6 +23,7 @@ class ChatRequest(BaseModel):
     history: Optional[List[Dict[str, Any]]] = []
     current_url: Optional[str] = None
     site_navigation: Optional[List[Dict[str, str]]] = []
+    site_id: Optional[str] = None
 
 import logging
 
@@ -39,7 +49,8 @@ async def chat_endpoint(req: ChatRequest):
                 user_input=user_input,
                 chat_history=req.history,
                 current_url=req.current_url,
-                site_navigation=req.site_navigation
+                site_navigation=req.site_navigation,
+                site_id=req.site_id,
             ):
                 # logger.debug(f"CHUNK RECEIVED: {chunk}")
                 # Each chunk is a dict, so we format it as a JSON string
@@ -51,4 +62,57 @@ async def chat_endpoint(req: ChatRequest):
             logger.error(f"Error in chat stream: {e}")
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
\ No newline at end of file
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@router.get("/rag/stats")
+async def rag_stats():
+    """Runtime counters for the RAG retrieval path."""
+    return {
+        "batcher": rag_service.batcher.stats(),
+        "cache": rag_service.cache_stats(),
+        "sites": rag_service.sites.stats(),
+    }
+
+
+@router.get("/scrape/stats")
+async def scrape_stats():
+    """Runtime counters for the browser/scraping path."""
+    return {
+        "browser_pool": browser_pool.stats(),
+        "settle": page_settle.stats(),
+        "fetch_tiers": tiered_fetch.stats(),
+        "page_cache": page_cache.stats(),
+        # Counts the SQLite tier, so off the event loop
+        "scrape_cache": await asyncio.to_thread(scrape_cache.stats),
+        "single_flight": scrape_flights.stats(),
+        "prefetch": prefetch.stats(),
+        "http_clients": http_clients.stats(),
+    }
+
+
+@router.get("/llm/stats")
+async def llm_stats():
+    """Runtime counters for LLM calls: gateway (pacing, retries, circuit breaker) and prompt context."""
+    return {
+        "gateway": llm_gateway.stats(),
+        "context": conversation_context.stats(),
+    }
+
+
+@router.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@router.get("/health/ready")
+async def health_ready():
+    """Readiness: model and index are loaded. 503 while warmup is still running."""
+    ready = rag_service.is_ready()
+    body = {
+        "status": "ready" if ready else "warming_up",
+        "rag": rag_service.status(),
+        "knowledge_base": knowledge_base.status,
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
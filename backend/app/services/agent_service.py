@@ -1,41 +1,88 @@
 import logging
 import json
+import os
 import asyncio
+from contextvars import ContextVar
 from typing import List, Dict, Any, AsyncGenerator, Optional
 
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import AIMessage, message_chunk_to_message
 from langchain_core.tools import tool
 from langchain_community.tools import DuckDuckGoSearchRun
 
 from app.services.llm_provider import llm
-from app.services.scraper_service import get_interactive_elements_with_crawl4ai
-from app.services.crawler_service import get_page_content_as_markdown, deep_crawl_website, seed_and_crawl_website, adaptive_crawl_website
+from app.services.scraper_service import analyze_page
+from app.services.crawler_service import deep_crawl_website, seed_and_crawl_website, adaptive_crawl_website
 from app.services.menu_parser import parse_menu_from_markdown
 from app.services.booking import auto_fill_and_submit_async
-from app.services.cache import scrape_cache
+from app.services import page_cache
+from app.services.conversation_context import ConversationContext
+from app.services.llm_gateway import is_unavailable
+from app.services.prefetch import Prefetch
+from app.services.single_flight import request_key, scrape_flights
+from app.services.search import run_search
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Stream the model's text to the client token by token (``{"delta": ...}`` events)
+AGENT_STREAM_TOKENS = os.getenv("AGENT_STREAM_TOKENS", "true").lower() in ("1", "true", "yes")
+
+# Independent tool calls of one model response run concurrently, at most
+# AGENT_TOOL_CONCURRENCY at a time, each bounded by its timeout. UI tools
+# (web_action, fill_form) are never run concurrently: they end the turn.
+AGENT_TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+AGENT_TOOL_TIMEOUT_S = float(os.getenv("AGENT_TOOL_TIMEOUT_S", "60"))
+TOOL_TIMEOUTS_S = {"deep_crawl": 180.0, "seeded_crawl": 180.0, "adaptive_crawl": 180.0, "search_knowledge_base": 20.0}
+UI_TOOLS = ("web_action", "fill_form")
+
+# Site (tenant) of the current chat turn. Tools read it from here rather than
+# taking it as an argument, so the model cannot query another tenant's index.
+current_site_id: ContextVar[Optional[str]] = ContextVar("current_site_id", default=None)
+
 # --- 1. Define Tools ---
 
+@tool
+async def search_knowledge_base(query: str) -> Dict[str, Any]:
+    """
+    Search the business's own knowledge base (services, opening hours, prices, booking and
+    cancellation policies). Use this first for questions about the business itself; it is
+    much faster than scraping or crawling.
+    """
+    return await run_search({"query": query, "site_id": current_site_id.get()})
+
+async def _cached_analysis(url: str) -> Dict[str, Any]:
+    """analyze_page through page_cache.
+
+    Cached pages are revalidated with a conditional GET once stale, and
+    forms/elements have a shorter TTL than the content.
+    """
+    analysis = await page_cache.lookup(url)
+    if analysis:
+        logger.info(f"Using cached scrape for {url}")
+        analysis["success"] = True
+        return analysis
+    # One page load yields markdown, interactive elements, forms and title
+    analysis = await analyze_page(url)
+    if analysis.get("success") and analysis.get("markdown"):
+        await page_cache.store(
+            url,
+            content={"markdown": analysis["markdown"], "title": analysis.get("title")},
+            structure={"elements": analysis.get("elements") or [], "forms": analysis.get("forms") or []},
+        )
+    return analysis
+
 @tool
 async def scrape_webpage(url: str, user_agent: Optional[str] = None, verify_ssl: bool = True) -> Dict[str, Any]:
     """
-    Fetch + analyze a single page. Returns: title, truncated content, interactive summary, menu_items (structured list), counts.
+    Fetch + analyze a single page. Returns: title, truncated content, interactive summary, forms, menu_items (structured list), counts.
     Also returns interactive elements. Use this to understand the content and what actions
     are possible on the page. Always returns detailed information about the page.
     """
     try:
-        # Check cache first - DISABLED to ensure fresh form data
-        # cached = scrape_cache.get(url)
-        # if cached:
-        #     logger.info(f"Using cached scrape for {url}")
-        #     return cached
-
-        # Get page content with retries
-        content = await get_page_content_as_markdown(url)
+        # Users asking about the same page at once share one analysis
+        analysis = await scrape_flights.run(request_key("analyze_page", url), lambda: _cached_analysis(url))
+        content = analysis.get("markdown", "") if analysis.get("success") else ""
         
         if not content:
             return {
@@ -45,16 +92,12 @@ async def scrape_webpage(url: str, user_agent: Optional[str] = None, verify_ssl:
                 "suggestion": "Try accessing the page manually or check if the URL is correct."
             }
         
-        # Try to get interactive elements (non-blocking if it fails)
-        try:
-            elements = await get_interactive_elements_with_crawl4ai(url)
-        except Exception as elem_error:
-            logger.warning(f"Could not get interactive elements: {elem_error}")
-            elements = []
+        elements = analysis.get("elements") or []
+        forms = analysis.get("forms") or []
         
         # Extract key information from content
         lines = content.split('\n')
-        title = next((line.strip('# ') for line in lines if line.startswith('# ')), 'No title found')
+        title = analysis.get("title") or next((line.strip('# ') for line in lines if line.startswith('# ')), 'No title found')
         
         # Parse menu items heuristically
         menu_items = parse_menu_from_markdown(content)
@@ -66,7 +109,7 @@ async def scrape_webpage(url: str, user_agent: Optional[str] = None, verify_ssl:
             "content": content[:4000],
             "content_length": len(content),
             "interactive_elements_count": len(elements),
-            "has_forms": any(el.get('tag') in ['input', 'textarea', 'select'] for el in elements) if elements else False,
+            "has_forms": bool(forms) or (any(el.get('tag') in ['input', 'textarea', 'select'] for el in elements) if elements else False),
             "has_buttons": any(el.get('tag') == 'button' for el in elements) if elements else False,
             "interactive_elements": [
                 {k: v for k, v in el.items() if k in ['tag', 'text', 'selector', 'id', 'name', 'type', 'aria_label', 'placeholder']} 
@@ -74,12 +117,11 @@ async def scrape_webpage(url: str, user_agent: Optional[str] = None, verify_ssl:
                 if el.get('tag') in ['input', 'textarea', 'select', 'button'] or (el.get('tag') == 'a' and len(el.get('text', '')) < 30)
             ][:50], # Limit to 50 key elements to save tokens
             "sample_links": [el.get('text', '')[:50] for el in elements if el.get('tag') == 'a'][:5],
+            "forms": forms[:5],
             "menu_items": menu_items,
             "menu_items_count": len(menu_items),
         }
         
-        # Cache the result
-        scrape_cache.set(url, result)
         return result
 
     except Exception as e:
@@ -100,7 +142,7 @@ async def deep_crawl(url: str, max_depth: int = 1, max_pages: int = 5) -> List[D
         max_depth: The maximum depth to crawl. Defaults to 1.
         max_pages: The maximum number of pages to crawl. Defaults to 5.
     """
-    return await asyncio.to_thread(deep_crawl_website, url, max_depth, max_pages)
+    return await deep_crawl_website(url, max_depth, max_pages)
 
 @tool
 async def seeded_crawl(url: str, query: str) -> List[Dict[str, Any]]:
@@ -111,7 +153,7 @@ async def seeded_crawl(url: str, query: str) -> List[Dict[str, Any]]:
         url: The URL of the website to find the sitemap for.
         query: The query to filter URLs from the sitemap.
     """
-    return await asyncio.to_thread(seed_and_crawl_website, url, query)
+    return await seed_and_crawl_website(url, query)
 
 @tool
 async def adaptive_crawl(url: str, query: str) -> List[Dict[str, Any]]:
@@ -122,7 +164,7 @@ async def adaptive_crawl(url: str, query: str) -> List[Dict[str, Any]]:
         url: The starting URL to crawl.
         query: The query to guide the adaptive crawl.
     """
-    return await asyncio.to_thread(adaptive_crawl_website, url, query)
+    return await adaptive_crawl_website(url, query)
 
 
 @tool
@@ -159,6 +201,7 @@ async def fill_form(url: str, form_data: Dict[str, str]) -> Dict[str, Any]:
 # --- 2. Tool Registry and LLM Binding ---
 
 tool_registry = {
+    "search_knowledge_base": search_knowledge_base,
     "duckduckgo_search": DuckDuckGoSearchRun(),
     "scrape_webpage": scrape_webpage,
     "deep_crawl": deep_crawl,
@@ -173,11 +216,42 @@ llm_with_tools = llm.bind_tools(tools)
 
 # --- 3. Main Agent Function ---
 
-async def run_agent_stream(user_input: str, chat_history: List[Dict[str, str]], current_url: str = None, site_navigation: List[Dict[str, str]] = None) -> AsyncGenerator[Dict, None]:
+async def _run_tool(tool_name: str, tool_args: Dict[str, Any], semaphore: asyncio.Semaphore, prefetched: Optional[Prefetch] = None) -> Any:
+    """Runs one (non-UI) tool call under the turn's concurrency cap and the tool's timeout.
+
+    Failures and timeouts are returned as an error result for the model
+    instead of ending the turn.
+    """
+    timeout = TOOL_TIMEOUTS_S.get(tool_name, AGENT_TOOL_TIMEOUT_S)
+
+    async def call():
+        if prefetched is not None:
+            result = await prefetched.take()
+            if result is not None:
+                return result
+        return await tool_registry[tool_name].ainvoke(tool_args)
+
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(call(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool {tool_name} timed out after {timeout:g}s")
+            return {"success": False, "error": f"Tool '{tool_name}' timed out after {timeout:g} seconds."}
+        except Exception as e:
+            logger.error(f"Tool {tool_name} failed: {e}")
+            return {"success": False, "error": f"Tool '{tool_name}' failed: {type(e).__name__}: {str(e)}"}
+
+
+async def run_agent_stream(user_input: str, chat_history: List[Dict[str, str]], current_url: str = None, site_navigation: List[Dict[str, str]] = None, site_id: Optional[str] = None) -> AsyncGenerator[Dict, None]:
     """
     Runs the LangChain agent with the given user input and chat history,
-    streaming intermediate steps and the final answer.
+    streaming intermediate steps and the final answer. ``site_id`` scopes
+    knowledge-base searches to that site's index.
     """
+    current_site_id.set(site_id)
+    # Usually the first tool call is scrape_webpage(current_url); start it
+    # alongside the first LLM call (opt-in, see prefetch.py)
+    prefetched = Prefetch.start("scrape_webpage", current_url, lambda: scrape_webpage.ainvoke({"url": current_url}))
     try:
         # Define System Prompt with Context
         system_prompt = """You are an AI assistant designed to help users interact with websites and answer questions.
@@ -200,29 +274,87 @@ You have access to a comprehensive suite of tools for web scraping and interacti
             system_prompt += "\nUse this navigation list to understand the website structure.\n"
             system_prompt += "**CRITICAL**: If the user asks a question that might be answered on one of these other pages (e.g., 'How much does it cost?' -> check '/pricing'), you MUST use the `scrape_webpage` tool on that specific URL to find the answer."
 
-        # Initialize messages
-        messages = [SystemMessage(content=system_prompt)]
-        for msg in chat_history:
-            messages.append(HumanMessage(content=msg["content"]) if msg["role"] == "user" else AIMessage(content=msg["content"]))
-        messages.append(HumanMessage(content=user_input))
+        # Recent turns verbatim, older ones as a running summary, all within the token budget
+        context = ConversationContext(system_prompt, chat_history, user_input)
 
         # Agent Loop
+        tool_semaphore = asyncio.Semaphore(AGENT_TOOL_CONCURRENCY)
         while True:
             import time
             start_time = time.time()
-            response = await llm_with_tools.ainvoke(messages)
+            if AGENT_STREAM_TOKENS:
+                # Forward text as it is generated; tool-call chunks are merged
+                # into complete tool calls by adding the message chunks up
+                gathered = None
+                first_token_time = None
+                async for chunk in llm_with_tools.astream(context.fit()):
+                    gathered = chunk if gathered is None else gathered + chunk
+                    if chunk.content and not gathered.tool_call_chunks:
+                        if first_token_time is None:
+                            first_token_time = time.time()
+                            logger.info(f"LLM Time To First Token: {first_token_time - start_time:.4f} seconds")
+                        yield {"delta": chunk.content}
+                response = message_chunk_to_message(gathered) if gathered is not None else AIMessage(content="")
+                streamed = first_token_time is not None
+            else:
+                response = await llm_with_tools.ainvoke(context.fit())
+                streamed = False
             end_time = time.time()
             logger.info(f"LLM Response Time: {end_time - start_time:.4f} seconds")
-            messages.append(response)
+            context.add_response(response)
 
+            if prefetched is not None and not prefetched.requested_by(response.tool_calls):
+                prefetched.discard()
+                prefetched = None
             if not response.tool_calls:
-                yield {"content": response.content}
+                if not streamed:
+                    yield {"content": response.content}
                 break
 
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                tool_args = tool_call["args"]
-                
+            # Tools before the first UI tool run concurrently; a UI tool ends the turn
+            tool_calls = response.tool_calls
+            ui_index = next((i for i, call in enumerate(tool_calls) if call["name"] in UI_TOOLS), len(tool_calls))
+            for tool_call in tool_calls[:ui_index]:
+                yield {"content": f"<tool_code>{tool_call['name']}({json.dumps(tool_call['args'])})</tool_code>\n"}
+
+            tasks = {}
+            used_prefetch = None
+            for i, tool_call in enumerate(tool_calls[:ui_index]):
+                if tool_call["name"] not in tool_registry:
+                    yield {"content": f"<tool_output>Error: Tool '{tool_call['name']}' not found.</tool_output>\n"}
+                    continue
+                use_prefetch = None
+                if prefetched is not None and prefetched.matches(tool_call["name"], tool_call["args"]):
+                    use_prefetch = used_prefetch = prefetched
+                    prefetched = None
+                task = asyncio.ensure_future(_run_tool(tool_call["name"], tool_call["args"], tool_semaphore, use_prefetch))
+                tasks[task] = i
+
+            # Stream each output as soon as its tool finishes
+            results = {}
+            try:
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in sorted(done, key=tasks.get):
+                        results[tasks[task]] = task.result()
+                        yield {"content": f"<tool_output>{str(task.result())}</tool_output>\n"}
+            finally:
+                # Only left running if the client went away mid-turn
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                if used_prefetch is not None and not used_prefetch.task.done():
+                    used_prefetch.discard()
+
+            # Results go back to the model in the order it asked for them
+            for i in sorted(results):
+                context.add_tool_result(tool_calls[i]["name"], tool_calls[i]["id"], results[i])
+
+            if ui_index < len(tool_calls):
+                tool_name = tool_calls[ui_index]["name"]
+                tool_args = tool_calls[ui_index]["args"]
+
                 yield {"content": f"<tool_code>{tool_name}({json.dumps(tool_args)})</tool_code>\n"}
 
                 if tool_name == "web_action":
@@ -231,7 +363,7 @@ You have access to a comprehensive suite of tools for web scraping and interacti
                     yield {"content": "Task successfully performed."}
                     return
 
-                elif tool_name == "fill_form":
+                else:
                     # Decompose fill_form into multiple web_action events
                     form_data = tool_args.get("form_data", {})
                     for selector, value in form_data.items():
@@ -247,25 +379,18 @@ You have access to a comprehensive suite of tools for web scraping and interacti
                     yield {"content": f"Form filled with {len(form_data)} fields."}
                     # Break out of the loop to prevent further LLM calls
                     return
-
-                if tool_name in tool_registry:
-                    tool_function = tool_registry[tool_name]
-                    tool_result = await tool_function.ainvoke(tool_args)
-                    if tool_name not in ["web_action", "fill_form"]:
-                        yield {"content": f"<tool_output>{str(tool_result)}</tool_output>\n"}
-                    messages.append(
-                        HumanMessage(
-                            content=json.dumps(tool_result),
-                            name=tool_name,
-                            tool_call_id=tool_call["id"],
-                        )
-                    )
-                else:
-                    yield {"content": f"<tool_output>Error: Tool '{tool_name}' not found.</tool_output>\n"}
             
             await asyncio.sleep(0.1) # Reduced delay for better responsiveness
 
 
     except Exception as e:
+        if is_unavailable(e):
+            # Circuit breaker open: fail fast with a message the widget can show as-is
+            logger.warning(f"LLM unavailable, agent turn skipped: {e}")
+            yield {"error": "The AI service is temporarily unavailable. Please try again in a moment."}
+            return
         logger.error(f"Error in agent stream: {e}")
-        yield {"error": str(e)}
\ No newline at end of file
+        yield {"error": str(e)}
+    finally:
+        if prefetched is not None:
+            prefetched.discard()
\ No newline at end of file
@@ -1,5 +1,7 @@
 import logging
-from playwright.async_api import async_playwright, Page, ElementHandle
+from playwright.async_api import Page, ElementHandle
+from app.services.browser_pool import browser_pool
+from app.services import page_settle
 from typing import Dict, Any, Optional, List
 
 logger = logging.getLogger(__name__)
@@ -21,19 +23,16 @@ async def perform_action(
         value: Value to fill/select, or attribute to extract.
         wait_for: Optional selector to wait for after action.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        # In a real agentic loop, we'd want to persist context, but for now we launch fresh
-        # This limits multi-step actions that depend on state, but fits the current architecture.
-        # To improve, we'd need a persistent browser session manager.
-        page = await browser.new_page()
-        
+    # The browser is shared and long-lived, but every action gets a fresh context,
+    # so actions stay stateless: multi-step flows that depend on state would need
+    # a persistent session (context) manager on top of the pool.
+    async with browser_pool.page() as page:
         try:
             logger.info(f"Performing action '{action_type}' on {url}")
             
             # Always navigate first since we are stateless
             # Optimization: In the future, pass a browser_context_id to reuse sessions
-            await page.goto(url, wait_until="networkidle")
+            await page_settle.goto_and_settle(page, url)
             
             result = {"success": True, "message": "Action completed", "data": None}
             
@@ -110,6 +109,4 @@ async def perform_action(
                 "success": False,
                 "error": str(e),
                 "url": url
-            }
-        finally:
-            await browser.close()
\ No newline at end of file
+            }
\ No newline at end of file
@@ -1,5 +1,6 @@
 import logging
-from playwright.async_api import async_playwright
+from app.services.browser_pool import browser_pool
+from app.services import page_settle
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -11,12 +12,10 @@ async def auto_fill_and_submit_async(target_url: str, field_data: Dict[str, Any]
     
     field_data: A dictionary where keys are selectors (or field names) and values are the values to fill.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+    async with browser_pool.page() as page:
         try:
             logger.info(f"Navigating to {target_url} for form filling...")
-            await page.goto(target_url, wait_until="networkidle")
+            await page_settle.goto_and_settle(page, target_url)
             
             filled_fields = []
             failed_fields = []
@@ -73,6 +72,4 @@ async def auto_fill_and_submit_async(target_url: str, field_data: Dict[str, Any]
             return {
                 "success": False,
                 "error": str(e)
-            }
-        finally:
-            await browser.close()
\ No newline at end of file
+            }
\ No newline at end of file
@@ -0,0 +1,214 @@
+# backend/app/services/browser_pool.py
+"""
+Process-wide pool of long-lived headless browsers.
+
+Launching Chromium costs seconds, far more than loading a typical page, so
+the crawler, scraper, automation and booking services all lease from one
+pool instead of launching their own browser per call:
+
+- ``browser_pool.crawl(url, ...)`` runs ``AsyncWebCrawler.arun`` on a shared,
+  already started crawl4ai crawler.
+- ``async with browser_pool.page() as page`` yields a Playwright page in a
+  fresh (isolated) context of a shared Chromium instance.
+
+At most BROWSER_MAX_CONCURRENCY leases are active at once. A browser is
+recycled after BROWSER_RECYCLE_AFTER pages (to bound memory growth), or
+immediately when it crashes or disconnects; leases still using a recycled
+browser finish on it before it is closed. ``close()`` shuts everything down
+on app shutdown.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+BROWSER_MAX_CONCURRENCY = int(os.getenv("BROWSER_MAX_CONCURRENCY", "4"))
+BROWSER_RECYCLE_AFTER = int(os.getenv("BROWSER_RECYCLE_AFTER", "100"))
+BROWSER_ARGS = ["--disable-blink-features=AutomationControlled", "--no-sandbox"]
+
+# Error messages that mean the browser process itself is gone, not just the page.
+CRASH_MARKERS = (
+    "has been closed",
+    "browser has disconnected",
+    "target closed",
+    "connection closed",
+    "browser closed",
+)
+
+
+def _is_crash(error: Any) -> bool:
+    message = str(error or "").lower()
+    return any(marker in message for marker in CRASH_MARKERS)
+
+
+class _Slot:
+    """One launched browser (``kind`` "crawler" or "playwright") and its usage."""
+
+    def __init__(self, kind: str, handle: Any):
+        self.kind = kind
+        self.handle = handle
+        self.pages = 0
+        self.active = 0
+        self.retired = False
+
+    def healthy(self) -> bool:
+        if self.kind == "playwright":
+            return self.handle.is_connected()
+        return True
+
+
+class BrowserPool:
+    def __init__(self, max_concurrency: int = BROWSER_MAX_CONCURRENCY, recycle_after: int = BROWSER_RECYCLE_AFTER):
+        self.max_concurrency = max_concurrency
+        self.recycle_after = recycle_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._launch_lock = asyncio.Lock()
+        self._slots: Dict[str, _Slot] = {}
+        self._playwright = None
+        self._closed = False
+        # Counters
+        self.launches = 0
+        self.recycles = 0
+        self.crashes = 0
+        self.leases = 0
+
+    # --- Launching & recycling -----------------------------------------------
+
+    async def _launch(self, kind: str) -> _Slot:
+        if kind == "crawler":
+            crawler = AsyncWebCrawler(config=BrowserConfig(headless=True, verbose=False, extra_args=BROWSER_ARGS))
+            await crawler.start()
+            handle = crawler
+        else:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            handle = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        self.launches += 1
+        logger.info(f"🌐 Launched pooled {kind} browser.")
+        return _Slot(kind, handle)
+
+    async def _acquire(self, kind: str) -> _Slot:
+        async with self._launch_lock:
+            if self._closed:
+                raise RuntimeError("Browser pool is shut down")
+            slot = self._slots.get(kind)
+            if slot is None or slot.retired or not slot.healthy():
+                if slot is not None:
+                    await self._retire(slot)
+                slot = self._slots[kind] = await self._launch(kind)
+            slot.active += 1
+            self.leases += 1
+            return slot
+
+    async def _release(self, slot: _Slot, pages: int = 1):
+        slot.active -= 1
+        slot.pages += pages
+        if not slot.retired and slot.pages >= self.recycle_after:
+            logger.info(f"♻️ Recycling pooled {slot.kind} browser after {slot.pages} pages.")
+            self.recycles += 1
+            await self._retire(slot)
+        elif slot.retired and slot.active == 0:
+            await self._close_slot(slot)
+
+    def _crashed(self, slot: _Slot, error: Any):
+        if not slot.retired:
+            logger.warning(f"💥 Pooled {slot.kind} browser crashed ({error}); it will be relaunched.")
+            self.crashes += 1
+            slot.retired = True
+            if self._slots.get(slot.kind) is slot:
+                del self._slots[slot.kind]
+
+    async def _retire(self, slot: _Slot):
+        """Stop handing out ``slot``; close it once its last lease is released."""
+        slot.retired = True
+        if self._slots.get(slot.kind) is slot:
+            del self._slots[slot.kind]
+        if slot.active == 0:
+            await self._close_slot(slot)
+
+    async def _close_slot(self, slot: _Slot):
+        try:
+            await slot.handle.close()
+        except Exception as e:
+            logger.debug(f"Closing pooled {slot.kind} browser failed: {e}")
+
+    # --- Leases ----------------------------------------------------------------
+
+    async def crawl(self, url: str, config: Optional[Any] = None, **kwargs):
+        """``AsyncWebCrawler.arun`` on the shared crawler; returns its result (or list of results)."""
+        async with self._semaphore:
+            slot = await self._acquire("crawler")
+            pages = 1
+            try:
+                result = await slot.handle.arun(url=url, config=config, **kwargs)
+                results = result if isinstance(result, list) else [result]
+                pages = max(1, len(results))
+                if any(_is_crash(getattr(r, "error_message", None)) for r in results):
+                    self._crashed(slot, results[0].error_message)
+                return result
+            except Exception as e:
+                if _is_crash(e):
+                    self._crashed(slot, e)
+                raise
+            finally:
+                await self._release(slot, pages)
+
+    @asynccontextmanager
+    async def page(self, **context_options):
+        """Lease a Playwright page in a fresh browser context (closed afterwards)."""
+        async with self._semaphore:
+            slot = await self._acquire("playwright")
+            context = None
+            try:
+                context = await slot.handle.new_context(**context_options)
+                yield await context.new_page()
+            except Exception as e:
+                if _is_crash(e) or not slot.healthy():
+                    self._crashed(slot, e)
+                raise
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        if not slot.healthy():
+                            self._crashed(slot, e)
+                await self._release(slot)
+
+    # --- Lifecycle -----------------------------------------------------------
+
+    async def close(self):
+        """Close every browser and Playwright itself (app shutdown)."""
+        async with self._launch_lock:
+            self._closed = True
+            for slot in list(self._slots.values()):
+                slot.retired = True
+                await self._close_slot(slot)
+            self._slots.clear()
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception as e:
+                    logger.debug(f"Stopping Playwright failed: {e}")
+                self._playwright = None
+        logger.info("🛑 Browser pool shut down.")
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "recycle_after": self.recycle_after,
+            "browsers": {kind: {"pages": s.pages, "active": s.active} for kind, s in self._slots.items()},
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "crashes": self.crashes,
+            "leases": self.leases,
+        }
+
+
+browser_pool = BrowserPool()
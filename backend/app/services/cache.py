@@ -1,11 +1,31 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from app.services.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_CACHE_L2 = os.getenv("SCRAPE_CACHE_L2", "true").lower() in ("1", "true", "yes")
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "scrape_cache.sqlite3"
+)
+SCRAPE_CACHE_MAX_MB = float(os.getenv("SCRAPE_CACHE_MAX_MB", "256"))
+SCRAPE_CACHE_L1_MAX_MB = float(os.getenv("SCRAPE_CACHE_L1_MAX_MB", "64"))
 
 
 class TTLCache:
     """Simple in-memory TTL cache for lightweight scraping results.
 
-    Not thread-safe; acceptable for single-process uvicorn dev usage.
+    Not thread-safe, and eviction sorts every entry once over ``max_size``;
+    prefer ``LRUCache``, which replaced it as the scrape cache L1.
     Keys are strings (e.g. URLs). Values are arbitrary python objects.
     """
 
@@ -48,12 +68,266 @@ class TTLCache:
             return None
         return self._store.get(key)
 
+    def delete(self, key: str):
+        self._store.pop(key, None)
+        self._expiries.pop(key, None)
+
     def clear(self):
         self._store.clear()
         self._expiries.clear()
 
 
-# Global instance used by scraping logic
-scrape_cache = TTLCache(default_ttl=300, max_size=128)
+def approx_size(value: Any) -> int:
+    """Rough in-memory size of ``value`` in bytes (strings, containers, arrays)."""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value) + 49
+    if isinstance(value, dict):
+        return 64 + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return 56 + sum(approx_size(item) for item in value)
+    nbytes = getattr(value, "nbytes", None)  # numpy arrays
+    if isinstance(nbytes, int):
+        return nbytes + 112
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Bounded LRU cache with per-entry TTLs, an optional byte budget and statistics.
+
+    Lookups, inserts and LRU evictions are O(1) (``OrderedDict``). Expiries sit
+    in a min-heap that is only drained lazily: an expired entry is dropped
+    when it is read, or when the cache is over budget and expired entries are
+    removed before live ones are evicted. With ``max_bytes`` set, values are
+    sized with ``sizeof`` (``approx_size`` by default) and least recently used
+    entries are evicted until both ``max_size`` and ``max_bytes`` hold; a
+    single value larger than ``max_bytes`` is not cached. Guarded by a lock so
+    it can be shared with executor threads.
+    """
+
+    def __init__(self, max_size: int = 1024, default_ttl: Optional[float] = 600,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or approx_size
+        self._store: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expiry, size)
+        self._expiry_heap: List[tuple] = []  # (expiry, seq, key); stale records are skipped
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._store.pop(key)
+        self.bytes -= size
+
+    def _over_budget(self) -> bool:
+        return len(self._store) > self.max_size or (self.max_bytes is not None and self.bytes > self.max_bytes)
+
+    def _purge_expired(self, now: float):
+        heap = self._expiry_heap
+        while heap and heap[0][0] < now:
+            expiry, _, key = heapq.heappop(heap)
+            item = self._store.get(key)
+            # Skip records of keys that were deleted or set again since
+            if item is not None and item[1] == expiry:
+                self._remove(key)
+                self.expirations += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._store.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expiry, _ = item
+            if expiry is not None and expiry < time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._store.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        now = time.time()
+        expiry = now + ttl if ttl is not None else None
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._store:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._store[key] = (value, expiry, size)
+            self.bytes += size
+            if expiry is not None:
+                heapq.heappush(self._expiry_heap, (expiry, next(self._seq), key))
+            if self._over_budget():
+                self._purge_expired(now)
+            while self._over_budget():
+                old_key = next(iter(self._store))
+                self._remove(old_key)
+                self.evictions += 1
+            # Overwritten and evicted keys leave stale heap records behind
+            if len(self._expiry_heap) > 2 * len(self._store) + 64:
+                self._expiry_heap = [
+                    (exp, next(self._seq), k) for k, (_, exp, _) in self._store.items() if exp is not None
+                ]
+                heapq.heapify(self._expiry_heap)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            if key in self._store:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self._expiry_heap.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._store),
+            "max_size": self.max_size,
+            "bytes": self.bytes if self.max_bytes is not None else None,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TieredCache:
+    """In-process L1 (``LRUCache``) in front of a shared on-disk L2 (``DiskCache``).
+
+    Reads try L1, then L2 (promoting hits into L1); writes go to both. L1
+    entries live at most ``l1.default_ttl`` so changes made by other workers
+    become visible within that time.
+
+    L2 calls are blocking SQLite I/O (and may wait on another worker's write
+    lock), so async code uses ``aget``/``aset``/``adelete``, which run them in
+    a worker thread. Values handed to ``aset`` must not be mutated afterwards:
+    they are serialized off the event loop.
+    """
+
+    def __init__(self, l1: LRUCache, l2: Optional[DiskCache] = None):
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+
+    def _l1_ttl(self, ttl: Optional[float]) -> float:
+        return min(ttl if ttl is not None else self.l1.default_ttl, self.l1.default_ttl)
+
+    def _l2_get(self, key: str):
+        try:
+            return self.l2.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Disk cache read failed: {e}")
+            return None
+
+    def _promote(self, key: str, item) -> Optional[Any]:
+        if item is None:
+            self.misses += 1
+            return None
+        value, expires = item
+        self.l1.set(key, value, ttl=self._l1_ttl(expires - time.time()))
+        self.l2_hits += 1
+        return value
+
+    def _l2_set(self, key: str, value: Any, ttl: Optional[float]):
+        try:
+            self.l2.set(key, value, ttl=ttl if ttl is not None else self.l1.default_ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ Disk cache write failed: {e}")
+
+    def _l2_delete(self, key: str):
+        try:
+            self.l2.delete(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Disk cache delete failed: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None:
+            self.l1_hits += 1
+            return value
+        return self._promote(key, self._l2_get(key) if self.l2 is not None else None)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.l1.set(key, value, ttl=self._l1_ttl(ttl))
+        if self.l2 is not None:
+            self._l2_set(key, value, ttl)
+
+    def delete(self, key: str):
+        self.l1.delete(key)
+        if self.l2 is not None:
+            self._l2_delete(key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """``get`` for async callers: an L1 miss reads L2 in a worker thread."""
+        value = self.l1.get(key)
+        if value is not None:
+            self.l1_hits += 1
+            return value
+        item = await asyncio.to_thread(self._l2_get, key) if self.l2 is not None else None
+        return self._promote(key, item)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        """``set`` for async callers: L1 is updated at once, L2 in a worker thread."""
+        self.l1.set(key, value, ttl=self._l1_ttl(ttl))
+        if self.l2 is not None:
+            await asyncio.to_thread(self._l2_set, key, value, ttl)
+
+    async def adelete(self, key: str):
+        """``delete`` for async callers: L1 at once, L2 in a worker thread."""
+        self.l1.delete(key)
+        if self.l2 is not None:
+            await asyncio.to_thread(self._l2_delete, key)
+
+    def clear(self):
+        self.l1.clear()
+        if self.l2 is not None:
+            self.l2.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "l1": self.l1.stats(),
+            "l2": self.l2.stats() if self.l2 is not None else None,
+        }
+
+
+def _scrape_l2() -> Optional[DiskCache]:
+    if not SCRAPE_CACHE_L2:
+        return None
+    try:
+        os.makedirs(os.path.dirname(SCRAPE_CACHE_PATH), exist_ok=True)
+        return DiskCache(SCRAPE_CACHE_PATH, max_bytes=int(SCRAPE_CACHE_MAX_MB * 1024 * 1024))
+    except Exception as e:
+        logger.warning(f"⚠️ Disk cache at {SCRAPE_CACHE_PATH} unavailable, using the in-memory cache only: {e}")
+        return None
+
+
+# Global instance used by scraping logic, shared across workers through the L2
+scrape_cache = TieredCache(
+    LRUCache(max_size=1024, default_ttl=300, max_bytes=int(SCRAPE_CACHE_L1_MAX_MB * 1024 * 1024)),
+    _scrape_l2(),
+)
 
-__all__ = ["scrape_cache", "TTLCache"]
+__all__ = ["scrape_cache", "TTLCache", "LRUCache", "TieredCache", "approx_size"]
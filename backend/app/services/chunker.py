@@ -0,0 +1,95 @@
+import re
+from typing import List, Dict, Any, Optional
+
+# Markdown ATX heading, e.g. "## Dental"
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+# Bump when chunk text, offsets or embedding text change, so ingested files are re-embedded.
+CHUNKER_VERSION = 2
+
+
+def _sections(text: str):
+    """Yield (heading_path, start, end) character spans, one per heading section."""
+    path: List[str] = []
+    start = 0
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        match = HEADING_RE.match(line.rstrip("\r\n"))
+        if match:
+            if pos > start:
+                yield list(path), start, pos
+            level = len(match.group(1))
+            path = path[: level - 1] + [match.group(2)]
+            start = pos
+        pos += len(line)
+    if pos > start:
+        yield list(path), start, pos
+
+
+def _split_span(text: str, start: int, end: int, max_chars: int, overlap: int):
+    """Split [start, end) into windows of at most max_chars, preferring line breaks."""
+    if end - start <= max_chars:
+        yield start, end
+        return
+    while start < end:
+        stop = min(start + max_chars, end)
+        if stop < end:
+            # Back off to the last paragraph / line / word break in the window.
+            for sep in ("\n\n", "\r\n\r\n", "\n", " "):
+                cut = text.rfind(sep, start + max_chars // 2, stop)
+                if cut != -1:
+                    stop = cut + len(sep)
+                    break
+        yield start, stop
+        if stop >= end:
+            break
+        start = max(stop - overlap, start + 1)
+
+
+def chunk_markdown(
+    text: str,
+    source: Optional[str] = None,
+    max_chars: int = 800,
+    overlap: int = 100,
+) -> List[Dict[str, Any]]:
+    """
+    Split a markdown document into heading-scoped chunks.
+
+    Each chunk carries its source, the heading path it sits under and the
+    UTF-8 byte offsets of its text in ``text`` exactly as passed in (line
+    endings included, surrounding whitespace excluded), so for a file decoded
+    as-is ``raw[start:end]`` is the chunk. Chunk text has CRLF normalized to LF.
+    """
+    chunks = []
+    for heading_path, sec_start, sec_end in _sections(text):
+        for start, end in _split_span(text, sec_start, sec_end, max_chars, overlap):
+            span = text[start:end]
+            chunk_text = span.strip()
+            if not chunk_text or HEADING_RE.match(chunk_text):
+                # Empty or heading-only sections carry no content worth a vector.
+                continue
+            lead = len(span) - len(span.lstrip())
+            byte_start = len(text[:start + lead].encode("utf-8"))
+            chunks.append({
+                "text": chunk_text.replace("\r\n", "\n"),
+                "source": source,
+                "heading_path": heading_path,
+                "start": byte_start,
+                "end": byte_start + len(chunk_text.encode("utf-8")),
+            })
+    return chunks
+
+
+def embedding_text(chunk: Dict[str, Any]) -> str:
+    """Text that is actually embedded: heading context followed by the chunk body.
+
+    A section's first chunk already starts with its own heading line, so only
+    the parent headings are prepended to it.
+    """
+    path = list(chunk.get("heading_path") or [])
+    first_line = HEADING_RE.match(chunk["text"].split("\n", 1)[0])
+    if path and first_line and first_line.group(2) == path[-1]:
+        path.pop()
+    if path:
+        return " > ".join(path) + "\n" + chunk["text"]
+    return chunk["text"]
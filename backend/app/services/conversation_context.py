@@ -0,0 +1,285 @@
+# backend/app/services/conversation_context.py
+"""
+Token-budgeted messages for the agent loop.
+
+``run_agent_stream`` gets the whole chat history from the client on every
+turn. Sending it all back to the model makes prompts (and latency and cost)
+grow without bound in long sessions. ``ConversationContext`` builds the
+messages of one turn instead:
+
+- The system prompt and the current user message are always kept.
+- The last AGENT_CONTEXT_KEEP_TURNS turns of the history (a turn being a user
+  message and the replies to it) are kept verbatim.
+- Older messages are replaced by a running summary. Summaries are cached by
+  a hash chain over the summarized messages, so next turn's summary extends
+  this one instead of starting over. A summary is extended in the background
+  after the turn starts. Messages it does not cover yet are sent verbatim, so
+  the turn never waits on a summarization call.
+- Tool outputs are sent in full once. After the model has answered them,
+  they are replaced by a compact digest (scalars kept, long strings cut,
+  lists shortened to their first items).
+- Before each LLM call the messages are fitted to the model's token budget
+  (AGENT_CONTEXT_BUDGET_TOKENS, per model via AGENT_CONTEXT_MODEL_BUDGETS).
+  The oldest history goes first, and the largest fresh tool output is cut as
+  a last resort.
+
+Tokens are counted with ``tiktoken`` when installed, otherwise estimated from
+the text length.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from app.services.cache import LRUCache
+from app.services.llm_provider import MODEL_NAME, decide_action_raw
+
+logger = logging.getLogger(__name__)
+
+AGENT_CONTEXT_BUDGET_TOKENS = int(os.getenv("AGENT_CONTEXT_BUDGET_TOKENS", "4000"))
+# model=tokens, comma separated
+AGENT_CONTEXT_MODEL_BUDGETS = os.getenv("AGENT_CONTEXT_MODEL_BUDGETS", "")
+AGENT_CONTEXT_KEEP_TURNS = int(os.getenv("AGENT_CONTEXT_KEEP_TURNS", "4"))
+AGENT_SUMMARY_MAX_WORDS = int(os.getenv("AGENT_SUMMARY_MAX_WORDS", "150"))
+AGENT_SUMMARY_TTL_S = float(os.getenv("AGENT_SUMMARY_TTL_S", "86400"))
+AGENT_TOOL_DIGEST_CHARS = int(os.getenv("AGENT_TOOL_DIGEST_CHARS", "600"))
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per message
+DIGEST_STRING_CHARS = 160
+DIGEST_LIST_ITEMS = 3
+SUMMARY_INPUT_CHARS = 1000  # per message sent to the summarizer
+
+SUMMARY_PROMPT = """Summarize this conversation between a user and a website assistant so the assistant can continue it.
+Keep what the user told or asked for (names, dates, times, party sizes, preferences, booking and form details),
+what was done or decided, and open questions. Drop greetings and small talk. At most {max_words} words.
+Return only the summary.
+
+Summary so far:
+{summary}
+
+New messages:
+{messages}"""
+
+summary_cache = LRUCache(max_size=2048, default_ttl=AGENT_SUMMARY_TTL_S)
+counters: Counter = Counter()
+_pending: Dict[str, asyncio.Task] = {}  # chain key -> running summary extension
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or the encoding cannot be loaded offline
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(count_tokens(str(m.content)) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def parse_model_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for item in spec.split(","):
+        model, _, tokens = item.partition("=")
+        if not tokens:
+            continue
+        try:
+            budgets[model.strip()] = int(tokens)
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid AGENT_CONTEXT_MODEL_BUDGETS entry: {item!r}")
+    return budgets
+
+
+MODEL_BUDGETS = parse_model_budgets(AGENT_CONTEXT_MODEL_BUDGETS)
+
+
+def budget_for(model: str) -> int:
+    return MODEL_BUDGETS.get(model, AGENT_CONTEXT_BUDGET_TOKENS)
+
+
+def _digest(value: Any, depth: int = 0) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= DIGEST_STRING_CHARS else value[:DIGEST_STRING_CHARS] + "…"
+    if isinstance(value, dict):
+        if depth >= 2:
+            return f"{{{len(value)} keys}}"
+        return {k: _digest(v, depth + 1) for k, v in value.items() if v not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        if depth >= 2:
+            return f"[{len(value)} items]"
+        items = [_digest(v, depth + 1) for v in value[:DIGEST_LIST_ITEMS]]
+        if len(value) > DIGEST_LIST_ITEMS:
+            items.append(f"… {len(value) - DIGEST_LIST_ITEMS} more")
+        return items
+    return value
+
+
+def tool_digest(tool_name: str, result: Any) -> str:
+    """Compact stand-in for a tool output the model has already used."""
+    text = json.dumps(_digest(result), ensure_ascii=False, default=str)
+    if len(text) > AGENT_TOOL_DIGEST_CHARS:
+        text = text[:AGENT_TOOL_DIGEST_CHARS] + "…"
+    return f"(Digest of earlier {tool_name} output) {text}"
+
+
+def _chain_keys(history: List[Dict[str, str]]) -> List[str]:
+    """keys[i] identifies history[:i + 1]: a hash chain, so prefixes share keys."""
+    keys, digest = [], hashlib.sha1(MODEL_NAME.encode())
+    for msg in history:
+        digest = digest.copy()
+        digest.update(f"\0{msg.get('role')}\0{msg.get('content')}".encode())
+        keys.append(f"summary:{digest.hexdigest()}")
+    return keys
+
+
+def _split_turns(history: List[Dict[str, str]], keep_turns: int) -> int:
+    """Index where the last ``keep_turns`` turns of ``history`` start."""
+    starts = [i for i, msg in enumerate(history) if msg.get("role") == "user"]
+    if keep_turns <= 0:
+        return len(history)
+    if len(starts) <= keep_turns:
+        return 0
+    return starts[-keep_turns]
+
+
+def _to_message(msg: Dict[str, str]) -> BaseMessage:
+    return HumanMessage(content=msg["content"]) if msg["role"] == "user" else AIMessage(content=msg["content"])
+
+
+async def _extend_summary(keys: List[str], older: List[Dict[str, str]], start: int, summary: Optional[str]):
+    lines = "\n".join(
+        f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {str(msg.get('content', ''))[:SUMMARY_INPUT_CHARS]}"
+        for msg in older[start:]
+    )
+    prompt = SUMMARY_PROMPT.format(max_words=AGENT_SUMMARY_MAX_WORDS, summary=summary or "(none)", messages=lines)
+    result = await decide_action_raw(prompt)
+    if result:
+        summary_cache.set(keys[len(older) - 1], result)
+        counters["summaries_written"] += 1
+        logger.info(f"🧾 Conversation summary extended by {len(older) - start} messages.")
+    else:
+        counters["summary_errors"] += 1
+
+
+def _schedule_summary(keys: List[str], older: List[Dict[str, str]], start: int, summary: Optional[str]):
+    target = keys[len(older) - 1]
+    if target in _pending:
+        return
+    try:
+        task = asyncio.get_running_loop().create_task(_extend_summary(keys, older, start, summary))
+    except RuntimeError:
+        return
+    _pending[target] = task
+    task.add_done_callback(lambda _: _pending.pop(target, None))
+
+
+def running_summary(older: List[Dict[str, str]]) -> Tuple[Optional[str], int]:
+    """The cached summary of the longest prefix of ``older`` and that prefix's length.
+
+    If the summary does not cover all of ``older``, an extension is started
+    in the background for the next turn.
+    """
+    if not older:
+        return None, 0
+    keys = _chain_keys(older)
+    summary, covered = None, 0
+    for i in range(len(older), 0, -1):
+        summary = summary_cache.get(keys[i - 1])
+        if summary is not None:
+            covered = i
+            break
+    if covered == len(older):
+        counters["summary_hits"] += 1
+    else:
+        counters["summary_misses"] += 1
+        _schedule_summary(keys, older, covered, summary)
+    return summary, covered
+
+
+class ConversationContext:
+    """Messages of one agent turn, kept within the model's token budget."""
+
+    def __init__(self, system_prompt: str, chat_history: List[Dict[str, str]], user_input: str,
+                 model: str = MODEL_NAME, keep_turns: int = AGENT_CONTEXT_KEEP_TURNS):
+        self.budget = budget_for(model)
+        history = [m for m in chat_history or [] if m.get("content")]
+        split = _split_turns(history, keep_turns)
+        older, recent = history[:split], history[split:]
+        tokens_full = message_tokens([SystemMessage(content=system_prompt), *map(_to_message, history)])
+        summary, covered = running_summary(older)
+        if summary:
+            system_prompt += f"\n\n**EARLIER CONVERSATION** (summary):\n{summary}"
+        self.system = SystemMessage(content=system_prompt)
+        # Messages the summary does not cover yet are sent verbatim until it does
+        self.history = [_to_message(m) for m in older[covered:] + recent]
+        self.turn: List[BaseMessage] = [HumanMessage(content=user_input)]
+        self._fresh: List[Tuple[BaseMessage, str]] = []  # tool outputs the model has not answered yet
+        counters["turns"] += 1
+        counters["messages_summarized"] += covered
+        counters["tokens_saved"] += max(0, tokens_full - message_tokens([self.system, *self.history]))
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return [self.system, *self.history, *self.turn]
+
+    def add_response(self, response: AIMessage):
+        """Append the model's response; the tool outputs it answered become digests."""
+        for message, digest in self._fresh:
+            message.content = digest
+            counters["tool_digests"] += 1
+        self._fresh = []
+        self.turn.append(response)
+
+    def add_tool_result(self, tool_name: str, tool_call_id: str, result: Any):
+        message = HumanMessage(content=json.dumps(result), name=tool_name, tool_call_id=tool_call_id)
+        self.turn.append(message)
+        self._fresh.append((message, tool_digest(tool_name, result)))
+
+    def fit(self) -> List[BaseMessage]:
+        """The messages for the next LLM call, trimmed to the token budget."""
+        tokens = message_tokens(self.messages)
+        while tokens > self.budget and self.history:
+            dropped = self.history.pop(0)
+            tokens -= count_tokens(str(dropped.content)) + MESSAGE_OVERHEAD_TOKENS
+            counters["history_dropped"] += 1
+        if tokens > self.budget and self._fresh:
+            # Last resort: cut the largest tool output the model still has to read
+            message = max((m for m, _ in self._fresh), key=lambda m: len(m.content))
+            excess = tokens - self.budget
+            keep_chars = max(AGENT_TOOL_DIGEST_CHARS, len(message.content) - excess * 4 - 64)  # margin for the marker and rounding
+            if keep_chars < len(message.content):
+                message.content = message.content[:keep_chars] + "…[truncated]"
+                counters["tool_outputs_truncated"] += 1
+                tokens = message_tokens(self.messages)
+        if tokens > self.budget:
+            logger.warning(f"⚠️ Agent context is {tokens} tokens, over the {self.budget} budget.")
+        counters["llm_calls"] += 1
+        counters["tokens_sent"] += tokens
+        return self.messages
+
+
+def stats() -> dict:
+    return {
+        "budget_tokens": AGENT_CONTEXT_BUDGET_TOKENS,
+        "model_budgets": MODEL_BUDGETS,
+        "keep_turns": AGENT_CONTEXT_KEEP_TURNS,
+        "tokenizer": "tiktoken" if _encoding is not None else "estimate",
+        **{name: counters[name] for name in (
+            "turns", "llm_calls", "tokens_sent", "tokens_saved", "messages_summarized", "summary_hits",
+            "summary_misses", "summaries_written", "summary_errors", "history_dropped", "tool_digests",
+            "tool_outputs_truncated")},
+        "avg_tokens_per_call": round(counters["tokens_sent"] / counters["llm_calls"], 1) if counters["llm_calls"] else 0.0,
+        "summaries_cached": len(summary_cache),
+        "summaries_pending": len(_pending),
+    }
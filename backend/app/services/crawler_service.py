@@ -1,65 +1,93 @@
 # backend/app/services/crawler_service.py
-import httpx
 import html2text
 import asyncio
 import logging
 from typing import Optional, List
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+from crawl4ai import CrawlerRunConfig, CacheMode
 from crawl4ai.deep_crawling import BFSDeepCrawlStrategy, BestFirstCrawlingStrategy
 from crawl4ai.deep_crawling.scorers import KeywordRelevanceScorer
 
+from app.services.browser_pool import browser_pool
+from app.services.http_clients import http_clients
+from app.services import page_cache, page_settle, tiered_fetch
+from app.services.single_flight import request_key, scrape_flights
+
 logger = logging.getLogger(__name__)
 
 async def get_page_content_as_markdown(url: str, js_code: Optional[str] = None, wait_for: Optional[str] = None) -> str:
     """
-    Uses crawl4ai to fetch the fully rendered content of a given URL
-    and return it in Markdown format. Falls back to httpx if it fails.
+    Fetches the content of a given URL and returns it in Markdown format.
+    Tries a plain HTTP GET first and only renders the page with crawl4ai
+    when it needs JavaScript (see tiered_fetch). Falls back to httpx if
+    the browser fails.
     """
     if not url or not url.startswith(('http://', 'https://')):
         logger.error(f"Invalid URL format: {url}")
         return ""
 
+    # Concurrent requests for the same page share one fetch
+    key = request_key("markdown", url, js_code=js_code, wait_for=wait_for)
+    return await scrape_flights.run(key, lambda: _fetch_markdown(url, js_code, wait_for))
+
+async def _fetch_markdown(url: str, js_code: Optional[str], wait_for: Optional[str]) -> str:
+    # Page scripts and wait conditions only make sense in a browser
+    tier = "browser"
+    plain = not js_code and not wait_for
+    if plain:
+        cached = await page_cache.lookup(url, parts=("content",))
+        if cached:
+            logger.info(f"Using cached content for {url}")
+            return cached["markdown"]
+    if not plain or not tiered_fetch.FETCH_HTTP_FIRST:
+        tier = "browser_direct"
+    elif tiered_fetch.known_to_need_js(url):
+        tier = "browser_remembered"
+    else:
+        markdown, _ = await tiered_fetch.fetch_static(url)
+        if markdown is not None:
+            logger.info(f"Fetched {url} over HTTP, no browser needed")
+            tiered_fetch.served("http")
+            await page_cache.store(url, content={"markdown": markdown})
+            return markdown
+
     try:
         logger.info(f"Crawling URL with crawl4ai: {url}")
-        browser_config = BrowserConfig(
-            headless=True,
-            verbose=False,
-            extra_args=["--disable-blink-features=AutomationControlled", "--no-sandbox"]
-        )
-        
+        # Settle adaptively (DOM/network quiescence, per-site wait_for) instead
+        # of always scrolling the full page
         run_config = CrawlerRunConfig(
             cache_mode=CacheMode.BYPASS,
             js_code=js_code,
             page_timeout=60000,
-            wait_for=wait_for,
             remove_overlay_elements=True,
-            scan_full_page=True,
+            **await page_settle.crawl_options(url, wait_for),
         )
         
-        # AsyncWebCrawler must use 'async with'
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            # Use 'arun' instead of 'run' for async
-            result = await crawler.arun(url=url, config=run_config)
-            
-            if result.success and result.markdown:
-                logger.info(f"Successfully crawled {url}")
-                return result.markdown
-            else:
-                raise Exception(f"Crawl4ai failed: {result.error_message}")
+        # Runs on the shared, already launched crawler instead of starting Chromium
+        result = await browser_pool.crawl(url, config=run_config)
+        page_settle.record_result(url, result)
+
+        if result.success and result.markdown:
+            logger.info(f"Successfully crawled {url}")
+            tiered_fetch.served(tier)
+            if plain:
+                await page_cache.store(url, content={"markdown": result.markdown})
+            return result.markdown
+        else:
+            raise Exception(f"Crawl4ai failed: {result.error_message}")
 
     except Exception as e:
         logger.warning(f"crawl4ai failed for {url}: {e}. Falling back to httpx.")
+        tiered_fetch.served("http_fallback")
         return await _fallback_httpx(url)
 
 async def _fallback_httpx(url: str) -> str:
     """Helper for httpx fallback logic."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, follow_redirects=True, timeout=30)
-            response.raise_for_status()
-            h = html2text.HTML2Text()
-            h.ignore_links = True
-            return h.handle(response.text)
+        response = await http_clients.get(url).get(url, follow_redirects=True, timeout=30)
+        response.raise_for_status()
+        h = html2text.HTML2Text()
+        h.ignore_links = True
+        return h.handle(response.text)
     except Exception as e:
         logger.error(f"Httpx fallback failed: {e}")
         return f"Error: Failed to fetch the page."
@@ -80,13 +108,11 @@ async def get_page_content_with_elements(url: str, js_code: Optional[str] = None
 async def deep_crawl_website(url: str, max_depth: int = 2, max_pages: int = 10) -> List[dict]:
     """Performs a deep crawl using BFS Strategy."""
     try:
-        browser_config = BrowserConfig(headless=True)
         strategy = BFSDeepCrawlStrategy(max_depth=max_depth, max_pages=max_pages)
         
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            # Note: Deep crawling in modern crawl4ai is integrated into arun/acrawl
-            results = await crawler.arun(url=url, crawl_strategy=strategy)
-            return results if isinstance(results, list) else [results]
+        # Note: Deep crawling in modern crawl4ai is integrated into arun/acrawl
+        results = await browser_pool.crawl(url, crawl_strategy=strategy)
+        return results if isinstance(results, list) else [results]
     except Exception as e:
         logger.error(f"Deep crawl error: {e}")
         return [{"success": False, "error": str(e), "url": url}]
@@ -101,7 +127,6 @@ async def seed_and_crawl_website(url: str, query: str) -> List[dict]:
 async def adaptive_crawl_website(url: str, query: str) -> List[dict]:
     """Performs an adaptive crawl based on keyword relevance."""
     try:
-        browser_config = BrowserConfig(headless=True)
         scorer = KeywordRelevanceScorer(keywords=[query])
         strategy = BestFirstCrawlingStrategy(
             scorer=scorer,
@@ -109,9 +134,8 @@ async def adaptive_crawl_website(url: str, query: str) -> List[dict]:
             max_pages=5
         )
 
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            results = await crawler.arun(url=url, crawl_strategy=strategy)
-            return results if isinstance(results, list) else [results]
+        results = await browser_pool.crawl(url, crawl_strategy=strategy)
+        return results if isinstance(results, list) else [results]
     except Exception as e:
         logger.error(f"Adaptive crawl error: {e}")
         return [{"success": False, "error": str(e), "url": url}]
@@ -122,5 +146,6 @@ if __name__ == "__main__":
         content = await get_page_content_as_markdown(test_url)
         print(f"\n--- Content for {test_url} ---\n")
         print(content[:500])
+        await browser_pool.close()
 
     asyncio.run(test_crawler())
\ No newline at end of file
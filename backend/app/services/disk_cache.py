@@ -0,0 +1,139 @@
+"""
+SQLite-backed cache shared by every worker process on a host.
+
+``TTLCache`` lives inside one process, so with several uvicorn workers each one
+would crawl the same pages and everything is lost on restart. ``DiskCache`` is
+the second tier behind it (see ``cache.TieredCache``): one SQLite file in WAL
+mode that all workers read and write. Values are stored as JSON,
+zlib-compressed when larger than COMPRESS_MIN_BYTES (scraped markdown
+compresses 3-5x). Entries expire after their TTL, and once the file holds more
+than ``max_bytes`` of payload the least recently used entries are evicted.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_BYTES = 1024
+# Payload size is re-checked against the budget every this many writes.
+EVICT_CHECK_EVERY = 32
+# Reads refresh an entry's LRU position at most this often (avoids a write per read).
+TOUCH_INTERVAL_S = 60
+
+
+class DiskCache:
+    """Key/value cache in an SQLite file with per-entry TTL and a byte budget."""
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, default_ttl: float = 300):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        # Other workers may hold the write lock briefly; wait instead of failing.
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                compressed INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._conn.commit()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """``(value, expires_at)`` for ``key``, or ``None`` if absent or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, compressed, expires, accessed FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            blob, compressed, expires, accessed = row
+            if expires < now:
+                with self._conn:
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            if now - accessed > TOUCH_INTERVAL_S:
+                with self._conn:
+                    self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        data = zlib.decompress(blob) if compressed else blob
+        return json.loads(data), expires
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            data = json.dumps(value).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Not caching {key} on disk, value is not JSON-serializable: {e}")
+            return
+        compressed = len(data) > COMPRESS_MIN_BYTES
+        blob = zlib.compress(data, 6) if compressed else data
+        now = time.time()
+        expires = now + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, compressed, size, expires, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, blob, int(compressed), len(blob), expires, now),
+                )
+            self._writes += 1
+            if self._writes % EVICT_CHECK_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones down to 90% of the budget."""
+        with self._conn:
+            self.evictions += self._conn.execute("DELETE FROM cache WHERE expires < ?", (now,)).rowcount
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            target = total - int(self.max_bytes * 0.9)
+            freed, victims = 0, []
+            for key, size in self._conn.execute("SELECT key, size FROM cache ORDER BY accessed"):
+                victims.append((key,))
+                freed += size
+                if freed >= target:
+                    break
+            self._conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+            self.evictions += len(victims)
+        logger.info(f"🧹 Evicted {len(victims)} entries ({freed / 1e6:.1f} MB) from the disk cache.")
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,208 @@
+"""
+Append-only persistence for the RAG store.
+
+Document chunks and their vectors are written to an SQLite operation log
+(one ``add`` row per chunk, one ``remove`` row per deleted id), so ingesting a
+document costs O(document) instead of rewriting the whole corpus. The FAISS
+index is persisted separately as snapshots named after the last log sequence
+number they contain (``snapshots/index-<seq>.faiss``); on load the newest
+readable snapshot is used and only log entries after it are replayed. An index
+type / codec chosen with ``scripts/rebuild_index.py`` is kept next to the
+snapshots (``snapshots/settings.json``) so later loads keep it.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_RE = re.compile(r"index-(\d+)\.faiss$")
+SETTINGS_FILENAME = "settings.json"
+
+
+class DocumentLog:
+    """SQLite-backed append-only log of chunk additions and removals."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                chunk TEXT,
+                vector BLOB
+            )"""
+        )
+        self._conn.commit()
+
+    def append(
+        self,
+        remove_ids: Iterable[int] = (),
+        add_ids: Iterable[int] = (),
+        chunks: List[dict] = (),
+        vectors: Optional[np.ndarray] = None,
+    ) -> int:
+        """Append removals, then one ``add`` row per chunk, in one transaction.
+
+        Returns the sequence number of the last row written.
+        """
+        rows = [("remove", int(doc_id), None, None) for doc_id in remove_ids]
+        if vectors is not None:
+            vectors = np.asarray(vectors, dtype="float32")
+            rows += [
+                ("add", int(doc_id), json.dumps(chunk), vectors[i].tobytes())
+                for i, (doc_id, chunk) in enumerate(zip(add_ids, chunks))
+            ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO log (op, doc_id, chunk, vector) VALUES (?, ?, ?, ?)", rows)
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM log").fetchone()[0]
+
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM log").fetchone()[0]
+
+    def replay(self, after_seq: int, dim: int) -> Tuple[Dict[int, dict], Dict[int, np.ndarray], List[int], int]:
+        """Rebuild state from the log.
+
+        Returns ``(documents, new_vectors, removed_ids, last_seq)``: the live
+        documents, vectors added after ``after_seq`` that are still live, ids
+        removed after ``after_seq`` and the last sequence number seen.
+        """
+        documents: Dict[int, dict] = {}
+        new_vectors: Dict[int, np.ndarray] = {}
+        removed: List[int] = []
+        last = 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT seq, op, doc_id, chunk, CASE WHEN seq > ? THEN vector END FROM log ORDER BY seq",
+                (after_seq,),
+            )
+            for seq, op, doc_id, chunk, vector in cursor:
+                last = seq
+                if op == "add":
+                    documents[doc_id] = json.loads(chunk)
+                    if vector is not None:
+                        new_vectors[doc_id] = np.frombuffer(vector, dtype="float32", count=dim)
+                else:
+                    documents.pop(doc_id, None)
+                    new_vectors.pop(doc_id, None)
+                    if seq > after_seq:
+                        removed.append(doc_id)
+        return documents, new_vectors, removed, last
+
+    def live_vectors(self, ids: List[int], dim: int) -> np.ndarray:
+        """Vectors for ``ids`` from their latest ``add`` rows (used when no snapshot is usable)."""
+        latest: Dict[int, bytes] = {}
+        with self._lock:
+            for doc_id, blob in self._conn.execute("SELECT doc_id, vector FROM log WHERE op = 'add' ORDER BY seq"):
+                latest[doc_id] = blob
+        out = np.empty((len(ids), dim), dtype="float32")
+        for row, doc_id in enumerate(ids):
+            out[row] = np.frombuffer(latest[doc_id], dtype="float32", count=dim)
+        return out
+
+    def compact(self, live_ids: Iterable[int], up_to_seq: int) -> int:
+        """Drop rows up to ``up_to_seq`` that no longer affect state.
+
+        That is every ``remove`` row and every ``add`` row of an id that is no
+        longer live. Rows after ``up_to_seq`` are kept because a snapshot at
+        ``up_to_seq`` still needs them replayed.
+        """
+        live = set(int(i) for i in live_ids)
+        with self._lock, self._conn:
+            dead = [
+                (seq,)
+                for seq, op, doc_id in self._conn.execute(
+                    "SELECT seq, op, doc_id FROM log WHERE seq <= ?", (up_to_seq,)
+                )
+                if op == "remove" or doc_id not in live
+            ]
+            self._conn.executemany("DELETE FROM log WHERE seq = ?", dead)
+        return len(dead)
+
+    def row_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM log").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def snapshot_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"index-{seq:012d}.faiss")
+
+
+def list_snapshots(directory: str) -> List[Tuple[int, str]]:
+    """Snapshots in ``directory`` as ``(seq, path)``, newest first."""
+    found = []
+    for path in glob.glob(os.path.join(directory, "index-*.faiss")):
+        match = SNAPSHOT_RE.search(os.path.basename(path))
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found, reverse=True)
+
+
+def write_snapshot(directory: str, seq: int, data: np.ndarray, keep: int = 2):
+    """Atomically write a serialized index for ``seq`` and prune older snapshots."""
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(directory, seq)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    for _, old in list_snapshots(directory)[keep:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def read_settings(directory: str) -> Dict[str, str]:
+    """Index settings saved with the snapshots in ``directory`` (``{"kind", "codec"}``, either may be absent)."""
+    try:
+        with open(os.path.join(directory, SETTINGS_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Ignoring unreadable RAG index settings in {directory}: {e}")
+        return {}
+
+
+def write_settings(directory: str, settings: Dict[str, str]):
+    """Atomically replace the index settings in ``directory``; empty settings remove the file."""
+    path = os.path.join(directory, SETTINGS_FILENAME)
+    if not settings:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+    os.replace(path + ".tmp", path)
+
+
+def read_latest_snapshot(directory: str) -> Optional[Tuple[int, faiss.Index]]:
+    """Load the newest readable snapshot, skipping corrupt ones."""
+    for seq, path in list_snapshots(directory):
+        try:
+            return seq, faiss.read_index(path)
+        except Exception as e:
+            logger.warning(f"⚠️ Skipping unreadable RAG snapshot {path}: {e}")
+    return None
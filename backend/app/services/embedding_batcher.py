@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Micro-batches concurrent query embeddings and index searches.
+
+    Callers ``await submit(query, k, target=...)``. Requests arriving within
+    ``max_wait_ms`` of each other (or until ``max_batch_size`` is reached) are
+    encoded with a single ``encode_fn`` call and searched with one
+    ``search_fn`` call per distinct ``target`` (e.g. per-site index generation) in the
+    default executor; each caller then gets back its own row.
+
+    ``encode_fn(list[str]) -> array (n, dim)`` and
+    ``search_fn(target, array (n, dim), k) -> (distances, ids)`` are supplied
+    by the owner.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], Any],
+        search_fn: Callable[[Any, np.ndarray, int], Tuple[np.ndarray, np.ndarray]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.encode_fn = encode_fn
+        self.search_fn = search_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: list = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Counters
+        self.batches = 0
+        self.queries = 0
+        self.encoded = 0
+        self.batch_sizes: Counter = Counter()
+
+    async def submit(self, query: str, k: int, vector: Optional[np.ndarray] = None, target: Any = None):
+        """Queue a query against ``target`` and wait for its batch.
+
+        A precomputed ``vector`` skips encoding for this query but still joins
+        the batched index search. Returns ``(vector, distances, ids)``.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, k, vector, target, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # Callers that were cancelled while waiting are dropped from the batch.
+        batch = [item for item in batch if not item[4].done()]
+        if batch:
+            asyncio.get_running_loop().create_task(self._run_batch(batch))
+
+    def _encode_and_search(self, batch):
+        to_encode = [i for i, item in enumerate(batch) if item[2] is None]
+        vectors: List[Optional[np.ndarray]] = [item[2] for item in batch]
+        if to_encode:
+            encoded = np.asarray(self.encode_fn([batch[i][0] for i in to_encode]), dtype="float32")
+            for row, i in enumerate(to_encode):
+                vectors[i] = encoded[row]
+        matrix = np.vstack(vectors).astype("float32")
+
+        # One index search per target over all of its queries.
+        groups: dict = {}
+        for i, item in enumerate(batch):
+            groups.setdefault(id(item[3]), (item[3], []))[1].append(i)
+        results: List[Any] = [None] * len(batch)
+        for target, rows in groups.values():
+            max_k = max(batch[i][1] for i in rows)
+            distances, ids = self.search_fn(target, matrix[rows], max_k)
+            for pos, i in enumerate(rows):
+                results[i] = (distances[pos], ids[pos])
+        return matrix, results, len(to_encode)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            matrix, results, encoded = await loop.run_in_executor(None, self._encode_and_search, batch)
+        except Exception as e:
+            logger.error(f"❌ Embedding batch of {len(batch)} failed: {e}")
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.queries += len(batch)
+        self.encoded += encoded
+        self.batch_sizes[len(batch)] += 1
+        logger.debug(f"Embedding batch of {len(batch)} served in {time.perf_counter() - started:.4f}s")
+
+        for row, (_, k, _, _, future) in enumerate(batch):
+            if not future.done():
+                distances, ids = results[row]
+                future.set_result((matrix[row], distances[:k], ids[:k]))
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "queries": self.queries,
+            "encoded": self.encoded,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+        }
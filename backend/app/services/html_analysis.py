@@ -0,0 +1,216 @@
+# backend/app/services/html_analysis.py
+"""
+Page analysis from static HTML, for pages served without a browser.
+
+Mirrors ``scraper_service.PAGE_ANALYSIS_JS`` (title, interactive elements and
+forms, same shapes) using only the standard library parser, so a page that
+``tiered_fetch`` found usable as plain HTML yields everything ``analyze_page``
+returns without a Chromium render. Selectors follow the same rules as the JS
+(``#id`` or a ``tag:nth-of-type(i)`` path below ``<html>``). The few tree
+fixups a browser applies that change such paths (implied ``<tbody>``, ``<p>``
+and list items closed by their next sibling) are applied here too.
+"""
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+import re
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+             "track", "wbr"}
+RAW_TEXT_TAGS = {"script", "style", "template", "noscript"}
+HEAD_TAGS = {"html", "head", "title", "meta", "link", "script", "style", "base", "noscript", "template"}
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "div", "dl", "fieldset", "footer", "form", "h1", "h2",
+              "h3", "h4", "h5", "h6", "header", "hr", "main", "nav", "ol", "p", "pre", "section", "table", "ul"}
+# Open elements a start tag closes implicitly (only the innermost ones)
+IMPLIED_END = {"li": {"li"}, "option": {"option"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"},
+               "tr": {"td", "th", "tr"}, "td": {"td", "th"}, "th": {"td", "th"}}
+INTERACTIVE_TAGS = {"a", "button", "input", "textarea", "select"}
+FIELD_TAGS = {"input", "textarea", "select"}
+# Default ``el.type`` per tag, as the DOM reports it
+DEFAULT_TYPES = {"input": "text", "button": "submit", "textarea": "textarea", "select": "select-one"}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "segment", "children", "text", "record", "form", "labels")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], segment: Optional[str]):
+        self.tag = tag
+        self.attrs = attrs
+        self.segment = segment          # "tag:nth-of-type(i)", None above <body>'s parent
+        self.children: Dict[str, int] = {}
+        self.text: List[str] = []
+        self.record = None              # element dict, for interactive elements
+        self.form = None                # form dict, for <form>
+        self.labels = None              # field dicts this <label> wraps
+
+
+class _Analyzer(HTMLParser):
+    def __init__(self, url: str):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.stack: List[_Node] = [_Node("#document", {}, None)]
+        self.title: Optional[str] = None
+        self.elements: List[Dict[str, Any]] = []
+        self.forms: List[Dict[str, Any]] = []
+        self.fields_by_id: Dict[str, Dict[str, Any]] = {}
+        self.label_for: List[tuple] = []   # (field id, label text)
+        self.current_select: Optional[Dict[str, Any]] = None
+        self.raw_text_depth = 0
+
+    # --- Tree building -------------------------------------------------------
+
+    def _push(self, tag: str, attrs: Dict[str, str]) -> _Node:
+        parent = self.stack[-1]
+        parent.children[tag] = parent.children.get(tag, 0) + 1
+        # html has no parentElement, so the JS paths start below it
+        segment = None if tag == "html" else f"{tag}:nth-of-type({parent.children[tag]})"
+        node = _Node(tag, attrs, segment)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+        return node
+
+    def _pop(self):
+        node = self.stack.pop()
+        self._finish(node)
+
+    def _open(self, tag: str) -> bool:
+        return any(node.tag == tag for node in self.stack)
+
+    def _ensure_body(self, tag: str):
+        if tag in HEAD_TAGS or self._open("body"):
+            return
+        if not self._open("html"):
+            self._push("html", {})
+        while self.stack[-1].tag != "html":
+            self._pop()  # an unclosed <head>
+        if tag != "body":
+            self._push("body", {})
+
+    def handle_starttag(self, tag, attr_list):
+        if self.raw_text_depth:
+            return  # markup inside <noscript>/<template> is not part of the DOM
+        attrs = {name: value if value is not None else "" for name, value in attr_list}
+        self._ensure_body(tag)
+        implied = IMPLIED_END.get(tag, set()) | ({"p"} if tag in BLOCK_TAGS else set())
+        while self.stack[-1].tag in implied:
+            self._pop()
+        if tag == "tr" and self.stack[-1].tag == "table":
+            self._push("tbody", {})
+        node = self._push(tag, attrs)
+        if tag in RAW_TEXT_TAGS:
+            self.raw_text_depth += 1
+        self._start(node)
+        if tag in VOID_TAGS:
+            self._finish(node)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS or not self._open(tag) or (self.raw_text_depth and tag != self.stack[-1].tag):
+            return
+        while self.stack[-1].tag != tag:
+            self._pop()
+        self._pop()
+
+    def handle_data(self, data):
+        if self.raw_text_depth:
+            return
+        # A label's text is its own, not that of the select/textarea it wraps
+        in_field = any(node.tag in ("select", "textarea") for node in self.stack)
+        for node in self.stack:
+            if node.record is not None or node.tag in ("title", "option") or (node.labels is not None and not in_field):
+                node.text.append(data)
+
+    def close(self):
+        super().close()
+        while len(self.stack) > 1:
+            self._pop()
+
+    # --- Extraction ----------------------------------------------------------
+
+    def _start(self, node: _Node):
+        attrs = node.attrs
+        tag = node.tag
+        if tag in INTERACTIVE_TAGS or attrs.get("role") == "button" or "onclick" in attrs:
+            node.record = {
+                "selector": self._path(node),
+                "tag": tag,
+                "text": "",
+                "aria_label": attrs.get("aria-label"),
+                "id": attrs.get("id", ""),
+                "name": attrs.get("name"),
+                "type": attrs.get("type", DEFAULT_TYPES.get(tag)),
+                "placeholder": attrs.get("placeholder"),
+                "href": urljoin(self.url, attrs["href"]) if tag == "a" and "href" in attrs else None,
+            }
+            self.elements.append(node.record)
+        if tag == "form":
+            node.form = {"action": attrs.get("action"), "method": attrs.get("method") or "post", "fields": []}
+            self.forms.append(node.form)
+        elif tag == "label":
+            node.labels = []
+        elif tag in FIELD_TAGS:
+            field = {
+                "tag": tag,
+                "name": attrs.get("name"),
+                "id": attrs.get("id"),
+                "type": attrs.get("type") or "text",
+                "placeholder": attrs.get("placeholder"),
+                "label": None,
+            }
+            if tag == "select":
+                field["options"] = []
+                self.current_select = field
+            form = next((n.form for n in reversed(self.stack) if n.form is not None), None)
+            if form is not None:
+                form["fields"].append(field)
+            if attrs.get("id"):
+                self.fields_by_id.setdefault(attrs["id"], field)
+            label = next((n for n in reversed(self.stack) if n.labels is not None), None)
+            if label is not None:
+                label.labels.append(field)
+
+    def _path(self, node: _Node) -> str:
+        if node.attrs.get("id"):
+            return f"#{node.attrs['id']}"
+        # ``node`` is already on the stack unless it is a void element
+        ancestors = self.stack[1:] if self.stack[-1] is node else self.stack[1:] + [node]
+        return " > ".join(n.segment for n in ancestors if n.segment)
+
+    def _finish(self, node: _Node):
+        if node.tag in RAW_TEXT_TAGS:
+            self.raw_text_depth -= 1
+        text = _collapse("".join(node.text))
+        if node.tag == "title" and self.title is None:
+            self.title = text or None
+        if node.record is not None:
+            value = node.attrs.get("value", "")
+            node.record["text"] = value if node.tag == "input" else (text or value)
+        if node.tag == "option" and self.current_select is not None:
+            self.current_select["options"].append({"value": node.attrs.get("value", text), "text": text})
+        if node.tag == "select" and self.current_select is not None:
+            if node.record is not None:
+                node.record["text"] = " ".join(option["text"] for option in self.current_select["options"])
+            self.current_select = None
+        if node.labels is not None:
+            for field in node.labels:
+                field["label"] = field["label"] or text
+            if node.attrs.get("for"):
+                self.label_for.append((node.attrs["for"], text))
+
+    def result(self) -> Dict[str, Any]:
+        for field_id, text in self.label_for:
+            field = self.fields_by_id.get(field_id)
+            if field is not None and not field["label"]:
+                field["label"] = text
+        return {"title": self.title, "elements": self.elements, "forms": self.forms}
+
+
+def _collapse(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def analyze_html(page_html: str, url: str) -> Dict[str, Any]:
+    """``title``, interactive ``elements`` and ``forms`` of ``page_html``, as PAGE_ANALYSIS_JS returns them."""
+    analyzer = _Analyzer(url)
+    analyzer.feed(page_html)
+    analyzer.close()
+    return analyzer.result()
@@ -0,0 +1,148 @@
+# backend/app/services/http_clients.py
+"""
+App-scoped registry of pooled ``httpx.AsyncClient`` instances.
+
+Creating a client per request means a new TCP (and TLS) handshake per call,
+which matters most for the LLM API that every chat turn calls several times.
+``http_clients.get(url)`` instead returns a long-lived client that keeps
+connections alive between requests:
+
+- Upstream hosts listed in HTTP_HOST_LIMITS get a dedicated client with their
+  own connection limits (e.g. ``api.groq.com=20/10`` for 20 connections, 10
+  of them kept alive), so one busy upstream cannot exhaust the pool of others.
+- Every other host shares the default client (HTTP_MAX_CONNECTIONS /
+  HTTP_MAX_KEEPALIVE).
+- HTTP2_ENABLED turns on HTTP/2 where the server supports it (requires the
+  ``h2`` package, ``pip install httpx[http2]``).
+
+Clients never store cookies, since pages of unrelated users and sites go
+through the same client. Options such as timeouts, headers and redirects are
+passed per request. ``wrap_transport`` routes a host through a transport
+wrapper such as the LLM gateway (``llm_gateway.py``). The registry is started
+and closed with the app (``main.py``); ``get`` also creates clients lazily so
+scripts can use it without starting it.
+"""
+import logging
+import os
+import ssl
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+# host=max_connections[/max_keepalive], comma separated
+HTTP_HOST_LIMITS = os.getenv("HTTP_HOST_LIMITS", "api.groq.com=20/10")
+
+DEFAULT = "default"
+
+
+def parse_host_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        host, _, value = item.partition("=")
+        max_connections, _, max_keepalive = value.partition("/")
+        try:
+            connections = int(max_connections)
+            limits[host.strip().lower()] = (connections, int(max_keepalive) if max_keepalive else connections)
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid HTTP_HOST_LIMITS entry: {item!r}")
+    return limits
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("⚠️ HTTP2_ENABLED is set but the h2 package is missing; using HTTP/1.1.")
+        return False
+
+
+class HttpClients:
+    def __init__(self, host_limits: Optional[Dict[str, Tuple[int, int]]] = None, verify: Union[bool, ssl.SSLContext] = True):
+        self.host_limits = host_limits if host_limits is not None else parse_host_limits(HTTP_HOST_LIMITS)
+        self.verify = verify
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._http2: Optional[bool] = None
+        self._wrappers: Dict[str, Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = {}
+
+    def wrap_transport(self, host: str, wrapper: Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]):
+        """Route ``host``'s requests through ``wrapper(transport)`` (e.g. the LLM gateway).
+
+        The host gets a dedicated client if it has none yet; an existing one
+        is replaced on next ``get``.
+        """
+        host = host.lower()
+        self.host_limits.setdefault(host, (HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE))
+        self._wrappers[host] = wrapper
+        self._clients.pop(host, None)
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        if self._http2 is None:
+            self._http2 = _http2_available()
+        max_connections, max_keepalive = self.host_limits.get(name, (HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE))
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+            ),
+            http2=self._http2,
+            verify=self.verify,
+        )
+        if name in self._wrappers:
+            transport = self._wrappers[name](transport)
+        client = httpx.AsyncClient(
+            transport=transport,
+            timeout=HTTP_TIMEOUT_S,
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+        logger.info(f"🔌 HTTP client for {name} ({max_connections} connections, {max_keepalive} keep-alive).")
+        return client
+
+    def get(self, url: Optional[str] = None) -> httpx.AsyncClient:
+        """The pooled client for ``url``'s host (the shared default client if it has no own limits)."""
+        host = (urlparse(url).hostname or "").lower() if url else ""
+        name = host if host in self.host_limits else DEFAULT
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create(name)
+        return client
+
+    async def start(self):
+        """Create the default client and one per configured host (app startup)."""
+        for name in [DEFAULT, *self.host_limits]:
+            if name not in self._clients:
+                self._clients[name] = self._create(name)
+
+    async def close(self):
+        """Close every client and its pooled connections (app shutdown)."""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug(f"Closing HTTP client failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "http2": bool(self._http2),
+            "clients": sorted(self._clients),
+            "wrapped": sorted(self._wrappers),
+            "host_limits": {host: {"max_connections": c, "max_keepalive": k} for host, (c, k) in self.host_limits.items()},
+        }
+
+
+http_clients = HttpClients()
@@ -18,10 +18,59 @@
 
 
 import os
-import asyncio
-from app.services.rag_service import add_documents
+import json
+import hashlib
+from app.services import rag_service
+from app.services.chunker import CHUNKER_VERSION
+
+# Progress of the startup ingestion, reported by /api/health/ready
+status = "pending"  # pending | running | done | skipped | failed
+
+# Manifest of what has already been embedded: {filename: {mtime, size, sha256, chunks, chunking}}
+MANIFEST_PATH = os.path.join(rag_service.STORAGE_DIR, "kb_manifest.json")
+
+
+def _chunking_params() -> list:
+    # Changing the chunking settings invalidates every previously embedded file.
+    return [rag_service.CHUNK_MAX_CHARS, rag_service.CHUNK_OVERLAP, CHUNKER_VERSION]
+
+
+def _load_manifest() -> dict:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read knowledge base manifest, rebuilding: {e}")
+        return {}
+
+
+def _save_manifest(manifest: dict):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
 
 async def initialize_knowledge_base():
+    global status
+    status = "running"
+    try:
+        await _ingest()
+        if status == "running":
+            status = "done"
+    except Exception as e:
+        status = "failed"
+        print(f"❌ Knowledge base ingestion failed: {e}")
+
+
+async def _ingest():
+    global status
     # current file path
     base_dir = os.path.dirname(os.path.abspath(__file__))
     # do levels upar jao: services -> app -> backend
@@ -30,22 +79,80 @@ async def initialize_knowledge_base():
 
     if not os.path.exists(data_dir):
         print(f"❌ Data directory not found: {data_dir}")
+        status = "skipped"
+        return
+
+    if rag_service.embedder is None:
+        print("⚠️ Embedder not available, skipping knowledge base ingestion.")
+        status = "skipped"
         return
 
     print(f"📂 Loading knowledge base from: {data_dir}")
 
-    tasks = []
-    for filename in os.listdir(data_dir):
-        if filename.endswith(".md"):
-            file_path = os.path.join(data_dir, filename)
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    tasks.append(add_documents([content]))
-                    print(f"✅ Queued for loading: {filename}")
-            except Exception as e:
-                print(f"❌ Failed to read {filename}: {e}")
-    
-    if tasks:
-        await asyncio.gather(*tasks)
-        print("✅ Knowledge base loading complete.")
\ No newline at end of file
+    manifest = _load_manifest()
+    indexed_sources = await rag_service.get_sources()
+    seen = set()
+    changed = False
+
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith(".md"):
+            continue
+        file_path = os.path.join(data_dir, filename)
+        seen.add(filename)
+        try:
+            stat = os.stat(file_path)
+            entry = manifest.get(filename)
+            # An entry only counts as current if its vectors are actually in the index
+            # (the index may have been reset independently of the manifest).
+            in_index = filename in indexed_sources or (entry or {}).get("chunks") == 0
+            if entry and entry.get("chunking") != _chunking_params():
+                entry = None
+
+            if entry and in_index and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+
+            with open(file_path, "rb") as f:
+                raw = f.read()
+            digest = _sha256(raw)
+
+            if entry and in_index and entry["sha256"] == digest:
+                # Touched but not modified; just refresh the stat fields.
+                entry.update(mtime=stat.st_mtime, size=stat.st_size)
+                changed = True
+                continue
+
+            # Decoded as-is so chunk byte offsets point into the file itself
+            content = raw.decode("utf-8")
+            added = 0
+            if content.strip():
+                added = await rag_service.add_documents([content], source=filename, replace=True, save=False)
+            else:
+                await rag_service.remove_documents([filename], save=False)
+            manifest[filename] = {
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": digest,
+                "chunks": added,
+                "chunking": _chunking_params(),
+            }
+            changed = True
+            print(f"✅ Embedded {'updated' if filename in indexed_sources else 'new'} file: {filename} ({added} chunks)")
+        except rag_service.RAGUnavailableError:
+            raise  # not specific to this file; fails the whole ingestion
+        except Exception as e:
+            print(f"❌ Failed to load {filename}: {e}")
+
+    orphans = (set(manifest) | indexed_sources) - seen
+    if orphans:
+        await rag_service.remove_documents(orphans, save=False)
+        for filename in orphans:
+            manifest.pop(filename, None)
+            print(f"🗑️ Removed vectors for deleted file: {filename}")
+        changed = True
+
+    if changed:
+        await rag_service.persist()
+        _save_manifest(manifest)
+        print("✅ Knowledge base loading complete.")
+    else:
+        print("✅ Knowledge base up to date, nothing to embed.")
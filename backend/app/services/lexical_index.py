@@ -0,0 +1,145 @@
+"""
+In-memory BM25 inverted index for the RAG store.
+
+Sentence embeddings are weak at exact tokens (service names, prices, phone
+numbers), so every chunk is also indexed lexically and the two result lists
+are fused with reciprocal rank fusion (see ``rag_service.search_documents``).
+The index is maintained incrementally: adding or removing a chunk only
+touches the postings of its own terms. ``LexicalView`` scores a shared base
+index plus a small delta as if they were one index, so copy-on-write
+generations only copy the delta.
+"""
+import math
+import re
+from collections import Counter
+from typing import AbstractSet, Dict, Iterable, List, Tuple
+
+# Numbers keep their separators ("49.99", "10:30") so prices and times match
+# as a whole; everything else splits on non-word characters.
+TOKEN_RE = re.compile(r"\d+(?:[.,:]\d+)*|\w+")
+# Phone-number-like digit runs are additionally indexed with only their digits,
+# so "(555) 123-4567" and "555.123.4567" match each other.
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{5,}\d")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = TOKEN_RE.findall(text.casefold())
+    for match in PHONE_RE.finditer(text):
+        digits = re.sub(r"\D", "", match.group())
+        if len(digits) >= 7:
+            tokens.append(digits)
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 (Okapi) scoring over an inverted index of document ids."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {doc_id: term frequency}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}  # doc_id -> distinct terms, for removal
+        self.doc_len: Dict[int, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, doc_id: int, text: str):
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_terms[doc_id] = tuple(counts)
+        length = sum(counts.values())
+        self.doc_len[doc_id] = length
+        self.total_len += length
+
+    def remove(self, doc_id: int):
+        for term in self.doc_terms.pop(doc_id, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+
+    def copy(self) -> "LexicalIndex":
+        """Independent copy (postings are copied, term tuples shared)."""
+        other = LexicalIndex(self.k1, self.b)
+        other.postings = {term: dict(postings) for term, postings in self.postings.items()}
+        other.doc_terms = dict(self.doc_terms)
+        other.doc_len = dict(self.doc_len)
+        other.total_len = self.total_len
+        return other
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.doc_len.clear()
+        self.total_len = 0
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top ``k`` documents for ``query`` as ``(doc_id, score)``, best first."""
+        return _bm25(query, k, [(self, frozenset())], len(self.doc_len), self.total_len, self.k1, self.b)
+
+    def memory_bytes(self) -> int:
+        """Rough resident size: ~100 bytes per posting plus per-document bookkeeping."""
+        return 100 * sum(len(terms) for terms in self.doc_terms.values()) + 200 * len(self.doc_len)
+
+
+class LexicalView:
+    """Read-only BM25 over ``base`` (shared, never modified) plus ``delta``, without ``deleted`` base ids.
+
+    Scores are those of a single index holding the same documents: document
+    counts, lengths and frequencies are combined before scoring.
+    """
+
+    def __init__(self, base: LexicalIndex, delta: LexicalIndex, deleted: AbstractSet[int]):
+        self.base = base
+        self.delta = delta
+        self.deleted = deleted
+        self.n_docs = len(base) - len(deleted) + len(delta)
+        self.total_len = base.total_len + delta.total_len - sum(base.doc_len.get(i, 0) for i in deleted)
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        return _bm25(query, k, [(self.base, self.deleted), (self.delta, frozenset())],
+                     self.n_docs, self.total_len, self.base.k1, self.base.b)
+
+    def memory_bytes(self) -> int:
+        return self.base.memory_bytes() + self.delta.memory_bytes()
+
+
+def _bm25(query: str, k: int, layers, n_docs: int, total_len: int, k1: float, b: float) -> List[Tuple[int, float]]:
+    """BM25 over ``layers`` of ``(LexicalIndex, excluded ids)`` with disjoint documents."""
+    if n_docs <= 0:
+        return []
+    avg_len = total_len / n_docs or 1.0
+    scores: Dict[int, float] = {}
+    for term in set(tokenize(query)):
+        matches = []
+        for index, excluded in layers:
+            postings = index.postings.get(term)
+            if postings:
+                matches.extend((doc_id, tf, index.doc_len) for doc_id, tf in postings.items() if doc_id not in excluded)
+        if not matches:
+            continue
+        df = len(matches)
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        for doc_id, tf, doc_len in matches:
+            norm = k1 * (1 - b + b * doc_len[doc_id] / avg_len)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists: each id scores ``sum(1 / (k + rank))`` over the lists it appears in."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,347 @@
+# backend/app/services/llm_gateway.py
+"""
+Gateway in front of the LLM API (Groq).
+
+Every request to the LLM host goes through ``GatewayTransport``, an httpx
+transport wrapper installed on that host's pooled client (see
+``http_clients.wrap_transport``). Both the raw ``llm_provider`` calls and the
+LangChain ``ChatGroq`` binding use that client, so all of them get:
+
+- a concurrency cap: at most LLM_MAX_CONCURRENCY requests in flight per
+  worker (streamed responses hold their slot until the stream is closed),
+- pacing: token buckets for requests and tokens, refilled from the
+  ``x-ratelimit-*`` headers of previous responses, so requests wait locally
+  instead of hitting 429s,
+- retries: 429/5xx responses and connection errors are retried up to
+  LLM_MAX_RETRIES times, after ``retry-after`` when the server sends one and
+  otherwise after a jittered exponential backoff,
+- a circuit breaker: after LLM_BREAKER_THRESHOLD consecutive upstream
+  failures, calls fail fast with ``LLMUnavailableError`` for
+  LLM_BREAKER_COOLDOWN_S. Then one trial call is let through, and its result
+  closes or reopens the breaker.
+
+``scripts/check_llm_gateway.py`` exercises all of this against a local fake
+server.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+# Longer retry-after waits are not worth holding a chat turn for.
+LLM_MAX_RETRY_WAIT_S = float(os.getenv("LLM_MAX_RETRY_WAIT_S", "20"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class LLMUnavailableError(Exception):
+    """The LLM upstream is considered down (circuit breaker open)."""
+
+
+def is_unavailable(error: BaseException) -> bool:
+    """True if ``error`` was caused by an open breaker (SDKs wrap transport errors)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, LLMUnavailableError):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a rate-limit reset value such as ``"7.66s"``, ``"2m59.5s"`` or ``"120ms"``."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART_RE.findall(value)
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts) if parts else None
+
+
+def retry_after(headers: httpx.Headers) -> Optional[float]:
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBucket:
+    """Bucket whose level and refill rate are learned from rate-limit headers.
+
+    After a response says ``remaining`` of ``limit`` are left and the window
+    resets in ``reset_s``, the bucket holds ``remaining`` and refills at the
+    rate that makes it full again at reset time. Until the first response,
+    nothing is paced.
+    """
+
+    def __init__(self):
+        self.capacity: Optional[float] = None
+        self.level = 0.0
+        self.rate = 0.0
+        self.updated = time.monotonic()
+
+    def update(self, limit: Optional[str], remaining: Optional[str], reset: Optional[str]):
+        try:
+            capacity, level = float(limit), float(remaining)
+        except (TypeError, ValueError):
+            return
+        reset_s = parse_duration(reset) or 0.0
+        self.capacity = capacity
+        self.level = level
+        self.rate = (capacity - level) / reset_s if reset_s > 0 else capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until ``cost`` is available (0 if it is now)."""
+        if self.capacity is None:
+            return 0.0
+        self._refill(time.monotonic())
+        cost = min(cost, self.capacity)
+        if self.level >= cost:
+            return 0.0
+        return (cost - self.level) / self.rate if self.rate > 0 else LLM_BACKOFF_BASE_S
+
+    def consume(self, cost: float):
+        if self.capacity is not None:
+            self.level -= min(cost, self.capacity)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown_s: float = LLM_BREAKER_COOLDOWN_S):
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.cooldown_s else "half_open"
+
+    def before_call(self):
+        """Raise ``LLMUnavailableError`` unless a call may go through now."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_flight):
+            remaining = self.cooldown_s - (time.monotonic() - self.opened_at)
+            raise LLMUnavailableError(f"LLM upstream unavailable, retrying in {max(0.0, remaining):.0f}s")
+        if state == "half_open":
+            self.trial_in_flight = True
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.info("✅ LLM circuit breaker closed.")
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def failure(self):
+        self.failures += 1
+        half_open = self.trial_in_flight
+        self.trial_in_flight = False
+        if half_open or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.opened += 1
+            logger.warning(f"🔌 LLM circuit breaker opened after {self.failures} failures.")
+
+    def abandon(self):
+        """A call ended without an outcome (e.g. cancelled): free the trial slot."""
+        self.trial_in_flight = False
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that frees the gateway slot when it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.requests_bucket = TokenBucket()
+        self.tokens_bucket = TokenBucket()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pace_lock: Optional[asyncio.Lock] = None
+        self.in_flight = 0
+        self.counters: Counter = Counter()
+        self.paced_s = 0.0
+
+    def _sync_primitives(self):
+        # Created lazily so the gateway can be built at import time
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._pace_lock = asyncio.Lock()
+
+    async def _pace(self, tokens: float):
+        async with self._pace_lock:
+            while True:
+                wait = max(self.requests_bucket.wait_time(1), self.tokens_bucket.wait_time(tokens))
+                if wait <= 0:
+                    break
+                self.paced_s += wait
+                await asyncio.sleep(min(wait, LLM_MAX_RETRY_WAIT_S))
+            self.requests_bucket.consume(1)
+            self.tokens_bucket.consume(tokens)
+
+    def _learn(self, headers: httpx.Headers):
+        self.requests_bucket.update(headers.get("x-ratelimit-limit-requests"),
+                                    headers.get("x-ratelimit-remaining-requests"),
+                                    headers.get("x-ratelimit-reset-requests"))
+        self.tokens_bucket.update(headers.get("x-ratelimit-limit-tokens"),
+                                  headers.get("x-ratelimit-remaining-tokens"),
+                                  headers.get("x-ratelimit-reset-tokens"))
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps workers that failed together from retrying together
+        return random.uniform(0, min(LLM_MAX_RETRY_WAIT_S, LLM_BACKOFF_BASE_S * 2 ** attempt))
+
+    async def send(self, request: httpx.Request, send: Callable) -> httpx.Response:
+        """Send ``request`` with ``send`` (the wrapped transport) under the gateway's policies."""
+        self._sync_primitives()
+        try:
+            self.breaker.before_call()
+        except LLMUnavailableError:
+            self.counters["failed_fast"] += 1
+            raise
+        # Rough prompt size; the token bucket only needs the order of magnitude
+        tokens = len(request.content) / 4 if request.content else 1
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= 1
+                self._semaphore.release()
+
+        outcome = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.counters["retries"] += 1
+                await self._pace(tokens)
+                self.counters["requests"] += 1
+                try:
+                    response = await send(request)
+                except httpx.TransportError as e:
+                    self.counters["connection_errors"] += 1
+                    self.breaker.failure()
+                    outcome = True
+                    if attempt == self.max_retries or self.breaker.state == "open":
+                        raise
+                    delay = self._backoff(attempt)
+                    logger.warning(f"⚠️ LLM request failed ({type(e).__name__}), retrying in {delay:.1f}s.")
+                    await asyncio.sleep(delay)
+                    continue
+
+                self._learn(response.headers)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.success()
+                    outcome = True
+                    return httpx.Response(response.status_code, headers=response.headers,
+                                          stream=_ReleasingStream(response.stream, release),
+                                          extensions=response.extensions, request=request)
+
+                if response.status_code == 429:
+                    # Upstream is healthy, we are just too fast
+                    self.counters["rate_limited"] += 1
+                else:
+                    self.counters["upstream_errors"] += 1
+                    self.breaker.failure()
+                    outcome = True
+                delay = retry_after(response.headers)
+                delay = delay * random.uniform(1.0, 1.1) if delay is not None else self._backoff(attempt)
+                if attempt == self.max_retries or delay > LLM_MAX_RETRY_WAIT_S or self.breaker.state == "open":
+                    self.counters["gave_up"] += 1
+                    return httpx.Response(response.status_code, headers=response.headers,
+                                          stream=_ReleasingStream(response.stream, release),
+                                          extensions=response.extensions, request=request)
+                logger.warning(f"⚠️ LLM returned {response.status_code}, retrying in {delay:.1f}s.")
+                await response.aclose()
+                await asyncio.sleep(delay)
+        except BaseException:
+            release()
+            raise
+        finally:
+            if not outcome:
+                self.breaker.abandon()
+
+    def transport(self, inner: httpx.AsyncBaseTransport) -> "GatewayTransport":
+        return GatewayTransport(inner, self)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "paced_s": round(self.paced_s, 3),
+            "requests_remaining": self.requests_bucket.level if self.requests_bucket.capacity is not None else None,
+            "tokens_remaining": self.tokens_bucket.level if self.tokens_bucket.capacity is not None else None,
+            **{name: self.counters[name] for name in (
+                "requests", "retries", "rate_limited", "upstream_errors", "connection_errors", "gave_up", "failed_fast")},
+        }
+
+
+class GatewayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, gateway: LLMGateway):
+        self._inner = inner
+        self._gateway = gateway
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._gateway.send(request, self._inner.handle_async_request)
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+llm_gateway = LLMGateway()
@@ -2,9 +2,13 @@ import os
 import re
 import json
 from typing import List, Dict, Any
-import httpx  # Use httpx for async requests
 from dotenv import load_dotenv
 
+from urllib.parse import urlparse
+
+from app.services.http_clients import http_clients  # Pooled keep-alive clients
+from app.services.llm_gateway import llm_gateway, LLMUnavailableError
+
 # ==========================================================
 # Load environment variables
 # ==========================================================
@@ -24,12 +28,18 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
+# Every request to the Groq host (ours and LangChain's) goes through the gateway:
+# concurrency cap, rate-limit pacing, retries and circuit breaker
+http_clients.wrap_transport(urlparse(API_URL).hostname, llm_gateway.transport)
+
 # Initialize LangChain Chat Model
 from langchain_groq import ChatGroq
 llm = ChatGroq(
     api_key=GROQ_API_KEY,
     model_name=MODEL_NAME,
-    temperature=0
+    temperature=0,
+    http_async_client=http_clients.get(API_URL),
+    max_retries=0,  # The gateway retries
 )
 
 # Updated System Prompt to include interactive elements
@@ -99,64 +109,72 @@ async def decide_action(
 
     dynamic_system_prompt += "\nBased on the user message and the context, what is the next action? Return ONLY the JSON object."
 
-    async with httpx.AsyncClient() as client:
+    client = http_clients.get(API_URL)
+    try:
+        payload = {
+            "model": MODEL_NAME,
+            "messages": [
+                {"role": "system", "content": dynamic_system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.0,
+            "response_format": {"type": "json_object"},
+        }
+
+        response = await client.post(API_URL, headers=HEADERS, json=payload, timeout=60)
+
+        if response.status_code == 413:
+             print("❌ Groq API error: Request too large (413).")
+             return {"type": "reply", "parameters": {"message": "The page content is too large for me to process at once."}}
+
+        if response.status_code != 200:
+            print("❌ Groq API error:", response.text)
+            return {"type": "reply", "parameters": {"message": "Sorry, I'm having trouble understanding you right now."}}
+
+        data = response.json()
+        raw_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        
         try:
-            payload = {
-                "model": MODEL_NAME,
-                "messages": [
-                    {"role": "system", "content": dynamic_system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.0,
-                "response_format": {"type": "json_object"},
-            }
-
-            response = await client.post(API_URL, headers=HEADERS, json=payload, timeout=60)
-
-            if response.status_code == 413:
-                 print("❌ Groq API error: Request too large (413).")
-                 return {"type": "reply", "parameters": {"message": "The page content is too large for me to process at once."}}
-
-            if response.status_code != 200:
-                print("❌ Groq API error:", response.text)
-                return {"type": "reply", "parameters": {"message": "Sorry, I'm having trouble understanding you right now."}}
-
-            data = response.json()
-            raw_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            
-            try:
-                return json.loads(raw_text)
-            except json.JSONDecodeError:
-                return {"type": "reply", "parameters": {"message": "Sorry, I received an invalid response from the AI."}}
-
-        except Exception as e:
-            print("decide_action error:", e)
-            return {"type": "reply", "parameters": {"message": "Sorry, an error occurred."}}
+            return json.loads(raw_text)
+        except json.JSONDecodeError:
+            return {"type": "reply", "parameters": {"message": "Sorry, I received an invalid response from the AI."}}
+
+    except LLMUnavailableError as e:
+        print("⚠️ decide_action skipped:", e)
+        return {"type": "reply", "parameters": {"message": "The AI service is temporarily unavailable. Please try again in a moment."}}
+
+    except Exception as e:
+        print("decide_action error:", e)
+        return {"type": "reply", "parameters": {"message": "Sorry, an error occurred."}}
 
 # ==========================================================
 # RAW PROMPT FUNCTION (for structured tasks)
 # ==========================================================
 async def decide_action_raw(prompt: str) -> str:
-    async with httpx.AsyncClient() as client:
-        try:
-            payload = {
-                "model": MODEL_NAME,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.2,
-            }
-
-            response = await client.post(API_URL, headers=HEADERS, json=payload, timeout=120)
-
-            if response.status_code != 200:
-                print("❌ Groq API error:", response.text)
-                return ""
-
-            data = response.json()
-            raw_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            return raw_text.strip()
-
-        except Exception as e:
-            print("decide_action_raw error:", e)
-            return ""
\ No newline at end of file
+    client = http_clients.get(API_URL)
+    try:
+        payload = {
+            "model": MODEL_NAME,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.2,
+        }
+
+        response = await client.post(API_URL, headers=HEADERS, json=payload, timeout=120)
+
+        if response.status_code != 200:
+            print("❌ Groq API error:", response.text)
+            return ""
+
+        data = response.json()
+        raw_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        return raw_text.strip()
+
+    except LLMUnavailableError as e:
+        print("⚠️ decide_action_raw skipped:", e)
+        return ""
+
+    except Exception as e:
+        print("decide_action_raw error:", e)
+        return ""
\ No newline at end of file
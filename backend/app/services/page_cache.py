@@ -0,0 +1,175 @@
+# backend/app/services/page_cache.py
+"""
+Revalidating cache of analyzed pages.
+
+A page is cached in two parts with their own TTLs:
+
+- ``content`` (markdown, title) for PAGE_CONTENT_TTL_S,
+- ``structure`` (interactive elements, forms) for PAGE_STRUCTURE_TTL_S, which
+  is shorter so form data stays fresh.
+
+Within its TTL a part is served without touching the network. Once it is
+stale, the page is revalidated with a conditional GET (``If-None-Match`` /
+``If-Modified-Since`` from the ETag/Last-Modified seen when it was stored). If
+the server answers 304, or the body still has the same content hash (visible
+text plus form fields, for servers without validators), the cached parts are
+served and their TTLs restart. Otherwise the entry is dropped and the caller
+renders the page again. Hosts that need JavaScript (see tiered_fetch) are not
+revalidated, since their raw HTML says nothing about the rendered page.
+
+Entries are plain dicts stored in ``scrape_cache`` under ``page:<url>``,
+through its async API so disk cache I/O stays off the event loop. A stored
+entry is never modified in place (the disk write may still be serializing
+it); updates store a new dict.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Sequence
+
+import httpx
+
+from app.services import tiered_fetch
+from app.services.http_clients import http_clients
+from app.services.cache import scrape_cache
+
+logger = logging.getLogger(__name__)
+
+PAGE_CONTENT_TTL_S = float(os.getenv("PAGE_CONTENT_TTL_S", "900"))
+PAGE_STRUCTURE_TTL_S = float(os.getenv("PAGE_STRUCTURE_TTL_S", "120"))
+# Entries (and their validators) are forgotten after this long regardless.
+PAGE_CACHE_MAX_AGE_S = int(os.getenv("PAGE_CACHE_MAX_AGE_S", "86400"))
+REVALIDATE_TIMEOUT_S = float(os.getenv("REVALIDATE_TIMEOUT_S", "5"))
+
+PART_TTLS = {"content": PAGE_CONTENT_TTL_S, "structure": PAGE_STRUCTURE_TTL_S}
+
+FIELD_RE = re.compile(r"<(?:form|input|select|textarea|button|option)\b[^>]*>", re.I)
+# Attributes that change on every request (CSRF tokens, nonces) or carry state.
+VOLATILE_ATTR_RE = re.compile(r"\s(?:value|nonce|content|data-[\w-]+)\s*=\s*(?:\"[^\"]*\"|'[^']*'|\S+)", re.I)
+
+counters: Counter = Counter()
+_pending: set = set()  # background validator captures
+
+
+def _key(url: str) -> str:
+    return f"page:{url}"
+
+
+def content_hash(page_html: str) -> str:
+    """Hash of what a page shows: its visible text and its form fields."""
+    fields = "".join(VOLATILE_ATTR_RE.sub("", field) for field in FIELD_RE.findall(page_html))
+    return hashlib.sha256((tiered_fetch.visible_text(page_html) + "\x00" + fields).encode("utf-8")).hexdigest()
+
+
+async def _conditional_get(url: str, entry: Dict[str, Any]) -> Optional[httpx.Response]:
+    headers = {"User-Agent": tiered_fetch.USER_AGENT}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        return await http_clients.get(url).get(url, headers=headers, follow_redirects=True, timeout=REVALIDATE_TIMEOUT_S)
+    except Exception as e:
+        logger.debug(f"Revalidating {url} failed: {e}")
+        return None
+
+
+def _validators(response: httpx.Response) -> Dict[str, Optional[str]]:
+    return {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "hash": content_hash(response.text) if response.status_code != 304 else None,
+    }
+
+
+async def lookup(url: str, parts: Sequence[str] = ("content", "structure")) -> Optional[Dict[str, Any]]:
+    """The cached ``parts`` of ``url`` merged into one dict, or ``None`` on a miss."""
+    entry = await scrape_cache.aget(_key(url))
+    if not entry or any(part not in entry["parts"] for part in parts):
+        counters["misses"] += 1
+        return None
+
+    now = time.time()
+    merged: Dict[str, Any] = {}
+    for part in parts:
+        merged.update(entry["parts"][part]["value"])
+    if all(now - entry["parts"][part]["stored_at"] < PART_TTLS[part] for part in parts):
+        counters["hits_fresh"] += 1
+        return merged
+
+    if not entry.get("hash") or tiered_fetch.known_to_need_js(url):
+        counters["misses"] += 1
+        return None
+
+    response = await _conditional_get(url, entry)
+    if response is None:
+        counters["revalidation_errors"] += 1
+        return None
+    validators = {}
+    if response.status_code == 304:
+        unchanged = True
+    else:
+        # Hashing a large page takes a while; keep it off the event loop
+        validators = await asyncio.to_thread(_validators, response)
+        unchanged = response.is_success and validators["hash"] == entry["hash"]
+
+    if not unchanged:
+        logger.info(f"🔄 {url} changed since it was cached.")
+        counters["changed"] += 1
+        await scrape_cache.adelete(_key(url))
+        return None
+
+    # Nothing changed, so every part is as good as freshly fetched
+    parts = {part: {**stored, "stored_at": now} for part, stored in entry["parts"].items()}
+    await scrape_cache.aset(_key(url), {**entry, **validators, "parts": parts}, ttl=PAGE_CACHE_MAX_AGE_S)
+    counters["hits_revalidated"] += 1
+    logger.info(f"✅ {url} revalidated, serving cached page.")
+    return merged
+
+
+async def _capture_validators(url: str, stored: Sequence[str]):
+    response = await _conditional_get(url, {})
+    if response is None or not response.is_success:
+        return
+    validators = await asyncio.to_thread(_validators, response)
+    # Re-read: other parts may have been stored while the request was out
+    entry = await scrape_cache.aget(_key(url))
+    if not entry:
+        return
+    parts = entry["parts"]
+    if entry.get("hash") and entry["hash"] != validators["hash"]:
+        # The page changed since the other parts were stored
+        parts = {part: value for part, value in parts.items() if part in stored}
+    await scrape_cache.aset(_key(url), {**entry, **validators, "parts": parts}, ttl=PAGE_CACHE_MAX_AGE_S)
+
+
+async def store(url: str, **parts: Dict[str, Any]):
+    """Cache freshly rendered ``parts`` (``content=...``, ``structure=...``) of ``url``.
+
+    The page's validators and content hash are fetched in the background, so
+    the caller does not wait for another request.
+    """
+    entry = await scrape_cache.aget(_key(url)) or {"parts": {}}
+    now = time.time()
+    updated = {part: {"value": value, "stored_at": now} for part, value in parts.items()}
+    await scrape_cache.aset(_key(url), {**entry, "parts": {**entry["parts"], **updated}}, ttl=PAGE_CACHE_MAX_AGE_S)
+    if not tiered_fetch.known_to_need_js(url):
+        task = asyncio.create_task(_capture_validators(url, list(parts)))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+
+
+def stats() -> dict:
+    lookups = counters["hits_fresh"] + counters["hits_revalidated"] + counters["misses"] \
+        + counters["changed"] + counters["revalidation_errors"]
+    hits = counters["hits_fresh"] + counters["hits_revalidated"]
+    return {
+        **{name: counters[name] for name in ("hits_fresh", "hits_revalidated", "misses", "changed", "revalidation_errors")},
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "content_ttl_s": PAGE_CONTENT_TTL_S,
+        "structure_ttl_s": PAGE_STRUCTURE_TTL_S,
+    }
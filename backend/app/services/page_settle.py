@@ -0,0 +1,203 @@
+# backend/app/services/page_settle.py
+"""
+Readiness-based page settling for browser loads.
+
+Instead of sleeping a fixed time after navigation, pages are considered
+settled once:
+
+- the DOM has stopped changing (no node/text mutations) for SETTLE_QUIET_MS,
+- no new network resources finished for SETTLE_QUIET_MS, a condition that is
+  dropped after SETTLE_NETWORK_CAP_MS so long-polling pages are not waited
+  on forever,
+- and the site's own ``wait_for`` condition holds, if its ``scraper_config``
+  in Mongo defines one,
+
+or after SETTLE_MAX_MS at the latest. Static pages therefore return almost
+immediately while SPAs get the time they need. The check runs in the page as
+a polled predicate (crawl4ai ``wait_for="js:..."`` or Playwright
+``wait_for_function``). It stamps the time since navigation start onto
+``<html data-settle-ms>``, and the time is recorded per host (``stats()``) so
+defaults can be tuned per site.
+
+Per-site ``scraper_config`` keys: ``wait_for`` (CSS selector, ``css:`` or
+``js:`` predicate), ``settle_quiet_ms``, ``settle_max_ms`` and
+``scan_full_page`` (scroll the whole page for lazy content; off by default).
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from app.db import db
+
+logger = logging.getLogger(__name__)
+
+SETTLE_QUIET_MS = int(os.getenv("SETTLE_QUIET_MS", "500"))
+SETTLE_NETWORK_CAP_MS = int(os.getenv("SETTLE_NETWORK_CAP_MS", "3000"))
+SETTLE_MAX_MS = int(os.getenv("SETTLE_MAX_MS", "8000"))
+# Site scraper configs are read from Mongo at most this often, and a slow or
+# unreachable Mongo never holds up a page load for longer than the timeout.
+SITE_CONFIG_TTL_S = float(os.getenv("SITE_CONFIG_TTL_S", "300"))
+SITE_CONFIG_TIMEOUT_S = float(os.getenv("SITE_CONFIG_TIMEOUT_S", "1.0"))
+
+SETTLE_ATTR_RE = re.compile(r'<html[^>]*\sdata-settle-ms="(\d+)"(?:[^>]*\sdata-settle-capped="1")?', re.I)
+MAX_TRACKED_HOSTS = 500
+SAMPLES_PER_HOST = 100
+
+_site_configs: Dict[str, dict] = {}
+_site_configs_loaded_at: Optional[float] = None
+_site_configs_lock = asyncio.Lock()
+
+_samples: "OrderedDict[str, deque]" = OrderedDict()  # host -> recent (settle_ms, capped)
+
+
+def _host(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+async def _refresh_site_configs():
+    global _site_configs, _site_configs_loaded_at
+    _site_configs_loaded_at = time.monotonic()
+    try:
+        cursor = db["sites"].find({"scraper_config": {"$exists": True}}, {"url": 1, "domain": 1, "scraper_config": 1})
+        sites = await asyncio.wait_for(cursor.to_list(1000), timeout=SITE_CONFIG_TIMEOUT_S)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load site scraper configs, keeping previous ones: {e}")
+        return
+    configs = {}
+    for site in sites:
+        host = _host(site.get("url") or "") or (site.get("domain") or "").lower().removeprefix("www.")
+        if host and isinstance(site.get("scraper_config"), dict):
+            configs[host] = site["scraper_config"]
+    _site_configs = configs
+
+
+async def site_scraper_config(url: str) -> dict:
+    """The ``scraper_config`` of the site that ``url`` belongs to (``{}`` if none)."""
+    if _site_configs_loaded_at is None or time.monotonic() - _site_configs_loaded_at > SITE_CONFIG_TTL_S:
+        async with _site_configs_lock:
+            if _site_configs_loaded_at is None or time.monotonic() - _site_configs_loaded_at > SITE_CONFIG_TTL_S:
+                await _refresh_site_configs()
+    return _site_configs.get(_host(url), {})
+
+
+def invalidate_site_configs():
+    """Reload site scraper configs on next use (e.g. after one was edited)."""
+    global _site_configs_loaded_at
+    _site_configs_loaded_at = None
+
+
+def _ready_expression(wait_for: Optional[str]) -> str:
+    """JS expression for a site's own readiness condition."""
+    if not wait_for:
+        return "true"
+    if wait_for.startswith("js:"):
+        return f"Boolean(({wait_for[3:].strip()})())"
+    selector = wait_for[4:].strip() if wait_for.startswith("css:") else wait_for
+    return f"document.querySelector({json.dumps(selector)}) !== null"
+
+
+def settle_predicate(wait_for: Optional[str] = None, quiet_ms: int = SETTLE_QUIET_MS,
+                     network_cap_ms: int = SETTLE_NETWORK_CAP_MS, max_ms: int = SETTLE_MAX_MS) -> str:
+    """Source of a polled JS predicate that returns true once the page has settled."""
+    return f"""() => {{
+    const now = performance.now();
+    let s = window.__settle;
+    if (!s) {{
+        s = window.__settle = {{lastDom: now, lastNet: now, resources: performance.getEntriesByType('resource').length}};
+        new MutationObserver(() => {{ s.lastDom = performance.now(); }})
+            .observe(document.documentElement, {{childList: true, subtree: true, characterData: true}});
+    }}
+    const resources = performance.getEntriesByType('resource').length;
+    if (resources !== s.resources) {{ s.resources = resources; s.lastNet = now; }}
+    const domQuiet = document.readyState !== 'loading' && now - s.lastDom >= {quiet_ms};
+    const netQuiet = now >= {network_cap_ms} || now - s.lastNet >= {quiet_ms};
+    const capped = now >= {max_ms};
+    if ((domQuiet && netQuiet && {_ready_expression(wait_for)}) || capped) {{
+        document.documentElement.setAttribute('data-settle-ms', String(Math.round(now)));
+        if (capped) document.documentElement.setAttribute('data-settle-capped', '1');
+        return true;
+    }}
+    return false;
+}}"""
+
+
+async def _settings(url: str, wait_for: Optional[str]) -> Dict[str, Any]:
+    config = await site_scraper_config(url)
+    return {
+        "wait_for": wait_for or config.get("wait_for"),
+        "quiet_ms": int(config.get("settle_quiet_ms", SETTLE_QUIET_MS)),
+        "max_ms": int(config.get("settle_max_ms", SETTLE_MAX_MS)),
+        "scan_full_page": bool(config.get("scan_full_page", False)),
+    }
+
+
+async def crawl_options(url: str, wait_for: Optional[str] = None) -> Dict[str, Any]:
+    """``CrawlerRunConfig`` keyword arguments that settle ``url`` adaptively.
+
+    An explicit ``wait_for`` (crawl4ai syntax) overrides the site's configured one.
+    """
+    settings = await _settings(url, wait_for)
+    predicate = settle_predicate(settings["wait_for"], quiet_ms=settings["quiet_ms"], max_ms=settings["max_ms"])
+    return {
+        "wait_for": "js:" + predicate,
+        "scan_full_page": settings["scan_full_page"],
+        "delay_before_return_html": 0.0,
+    }
+
+
+def record(url: str, settle_ms: int, capped: bool = False):
+    host = _host(url)
+    samples = _samples.get(host)
+    if samples is None:
+        samples = _samples[host] = deque(maxlen=SAMPLES_PER_HOST)
+        if len(_samples) > MAX_TRACKED_HOSTS:
+            _samples.popitem(last=False)
+    _samples.move_to_end(host)
+    samples.append((settle_ms, capped))
+    logger.info(f"⏱️ {url} settled after {settle_ms} ms{' (capped)' if capped else ''}.")
+
+
+def record_result(url: str, result: Any):
+    """Record the settle time stamped into a crawl4ai result's HTML, if any."""
+    match = SETTLE_ATTR_RE.search(getattr(result, "html", None) or "")
+    if match:
+        record(url, int(match.group(1)), capped="data-settle-capped" in match.group(0))
+
+
+async def goto_and_settle(page: Any, url: str, wait_for: Optional[str] = None):
+    """Navigate a Playwright page and wait until it has settled (instead of ``networkidle``)."""
+    settings = await _settings(url, wait_for)
+    await page.goto(url, wait_until="domcontentloaded")
+    predicate = settle_predicate(settings["wait_for"], quiet_ms=settings["quiet_ms"], max_ms=settings["max_ms"])
+    try:
+        await page.wait_for_function(predicate, polling=100, timeout=settings["max_ms"] + 2000)
+        stamp = await page.evaluate(
+            "() => [document.documentElement.getAttribute('data-settle-ms'),"
+            " document.documentElement.hasAttribute('data-settle-capped')]"
+        )
+        if stamp and stamp[0]:
+            record(url, int(stamp[0]), capped=bool(stamp[1]))
+    except Exception as e:
+        logger.debug(f"Settle wait for {url} did not complete: {e}")
+
+
+def stats() -> dict:
+    """Per-host settle times (ms) over the most recent loads."""
+    out = {}
+    for host, samples in _samples.items():
+        times = sorted(ms for ms, _ in samples)
+        out[host] = {
+            "pages": len(times),
+            "p50_ms": times[len(times) // 2],
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+            "max_ms": times[-1],
+            "capped": sum(1 for _, capped in samples if capped),
+        }
+    return out
@@ -0,0 +1,106 @@
+# backend/app/services/prefetch.py
+"""
+Speculative prefetch of the page the user is looking at.
+
+The most common first tool call of a turn is ``scrape_webpage(current_url)``,
+which only starts after the first LLM round-trip. With AGENT_PREFETCH
+enabled, ``run_agent_stream`` starts that scrape at the beginning of the turn,
+in parallel with the LLM call:
+
+- If the model then requests ``scrape_webpage`` for the same page (same
+  normalized URL, no other arguments), the tool call takes the prefetched
+  result instead of scraping. Time saved is the part of the scrape that
+  overlapped the LLM call.
+- If the first response does not request it, the prefetch is cancelled.
+
+At most AGENT_PREFETCH_MAX_INFLIGHT prefetches run at once across the
+process, so speculation cannot crowd out real requests for browser slots.
+``stats()`` reports hit rate and time saved.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from app.services.single_flight import normalize_url
+
+logger = logging.getLogger(__name__)
+
+AGENT_PREFETCH = os.getenv("AGENT_PREFETCH", "false").lower() in ("1", "true", "yes")
+AGENT_PREFETCH_MAX_INFLIGHT = int(os.getenv("AGENT_PREFETCH_MAX_INFLIGHT", "2"))
+
+counters: Counter = Counter()
+time_saved_s = 0.0
+_inflight = 0
+
+
+class Prefetch:
+    """A speculative ``tool_name(url=url)`` call running in the background."""
+
+    def __init__(self, tool_name: str, url: str, run: Callable[[], Awaitable[Any]]):
+        global _inflight
+        self.tool_name = tool_name
+        self.url = normalize_url(url)
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        _inflight += 1
+        self.task = asyncio.ensure_future(run())
+        self.task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        global _inflight
+        _inflight -= 1
+        self.finished_at = time.monotonic()
+        if not task.cancelled() and task.exception() is not None:
+            counters["failed"] += 1
+
+    @classmethod
+    def start(cls, tool_name: str, url: str, run: Callable[[], Awaitable[Any]]) -> Optional["Prefetch"]:
+        """Start a prefetch, unless disabled or the in-flight budget is used up."""
+        if not AGENT_PREFETCH or not url:
+            return None
+        if _inflight >= AGENT_PREFETCH_MAX_INFLIGHT:
+            counters["skipped_budget"] += 1
+            return None
+        counters["started"] += 1
+        return cls(tool_name, url, run)
+
+    def matches(self, tool_name: str, args: Dict[str, Any]) -> bool:
+        return tool_name == self.tool_name and set(args) == {"url"} and normalize_url(str(args["url"])) == self.url
+
+    def requested_by(self, tool_calls: Iterable[dict]) -> bool:
+        return any(self.matches(call["name"], call.get("args") or {}) for call in tool_calls)
+
+    async def take(self) -> Optional[Any]:
+        """The prefetched result, awaiting it if still running; ``None`` if the prefetch failed."""
+        global time_saved_s
+        requested_at = time.monotonic()
+        await asyncio.wait({self.task})
+        if self.task.cancelled() or self.task.exception() is not None:
+            return None
+        result = self.task.result()
+        waited = time.monotonic() - requested_at
+        saved = max(0.0, (self.finished_at or time.monotonic()) - self.started_at - waited)
+        counters["hits"] += 1
+        time_saved_s += saved
+        logger.info(f"⚡ Prefetched {self.tool_name}({self.url}) used, saved {saved:.2f}s.")
+        return result
+
+    def discard(self):
+        if not self.task.done():
+            self.task.cancel()
+        counters["discarded"] += 1
+
+
+def stats() -> dict:
+    used = counters["hits"] + counters["discarded"]
+    return {
+        "enabled": AGENT_PREFETCH,
+        "inflight": _inflight,
+        **{name: counters[name] for name in ("started", "hits", "discarded", "failed", "skipped_budget")},
+        "hit_rate": round(counters["hits"] / used, 4) if used else 0.0,
+        "time_saved_s": round(time_saved_s, 3),
+        "avg_saved_s": round(time_saved_s / counters["hits"], 3) if counters["hits"] else 0.0,
+    }
@@ -4,6 +4,20 @@ import asyncio
 import os
 import json
 import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from typing import Optional
+
+from app.services.cache import LRUCache
+from app.services.chunker import chunk_markdown, embedding_text
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.lexical_index import LexicalIndex, LexicalView, reciprocal_rank_fusion
+from app.services import vector_index
+from app.services import doc_store
 
 try:
     from sentence_transformers import SentenceTransformer
@@ -14,94 +28,879 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load embedding model
-# Note: SentenceTransformer is not thread-safe for parallel inference in some cases, 
+# Embedding model
+# Loaded lazily by ``warmup()`` (started in the background on app startup) so
+# importing this module is cheap and the server accepts traffic immediately.
+# Note: SentenceTransformer is not thread-safe for parallel inference in some cases,
 # but for simple usage it's okay. We will run it in an executor.
+EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 embedder = None
-if SentenceTransformer:
-    try:
-        embedder = SentenceTransformer("all-MiniLM-L6-v2")
-    except Exception as e:
-        logger.error(f"Failed to load SentenceTransformer: {e}")
-else:
-    logger.warning("SentenceTransformer not found. RAG functionality will be disabled.")
+embedder_status = "not_loaded"  # not_loaded | loading | ready | unavailable | failed
+_warmup_task = None
 
 # Storage paths
-STORAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage")
+# The shared knowledge base lives directly in STORAGE_DIR; every site (tenant)
+# gets its own namespace under STORAGE_DIR/sites/<site_id>/ with the same layout.
+STORAGE_DIR = os.getenv("RAG_STORAGE_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage")
+SITES_DIR = os.path.join(STORAGE_DIR, "sites")
+# Site ids become directory names as-is (Mongo ObjectIds match); anything else is rejected
+SITE_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+LOG_FILENAME = "rag_log.sqlite3"
+SNAPSHOT_DIRNAME = "snapshots"
+LOG_PATH = os.path.join(STORAGE_DIR, LOG_FILENAME)
+SNAPSHOT_DIR = os.path.join(STORAGE_DIR, SNAPSHOT_DIRNAME)
+# Pre-log format (full rewrite on every add); imported into the log once
 INDEX_PATH = os.path.join(STORAGE_DIR, "index.faiss")
 DOCS_PATH = os.path.join(STORAGE_DIR, "documents.json")
 
+# Index snapshots are coalesced: written SNAPSHOT_DEBOUNCE_S after the last
+# change, but at least every SNAPSHOT_MAX_DELAY_S while changes keep coming.
+SNAPSHOT_DEBOUNCE_S = float(os.getenv("RAG_SNAPSHOT_DEBOUNCE_S", "5"))
+SNAPSHOT_MAX_DELAY_S = float(os.getenv("RAG_SNAPSHOT_MAX_DELAY_S", "60"))
+
+# Writes go to a small delta over a base index shared between generations, so
+# a write copies only the delta. The delta is merged into a new base (one copy
+# of the corpus) once it holds more than max(RAG_DELTA_MIN_DOCS, sqrt(base))
+# changed chunks, which balances per-write copying against merge frequency.
+DELTA_MIN_DOCS = int(os.getenv("RAG_DELTA_MIN_DOCS", "256"))
+
+# Index structure: "flat" (exact), "ivf" or "hnsw" (approximate, used once the
+# corpus passes RAG_ANN_MIN_VECTORS; see vector_index)
+INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat").lower()
+# Vector storage: "none" (float32), "fp16", "sq8" (scalar-quantized) or "pq"
+# (product-quantized); trained codecs wait for RAG_COMPRESS_MIN_VECTORS
+VECTOR_CODEC = os.getenv("RAG_VECTOR_CODEC", "none").lower()
+# A type or codec chosen with scripts/rebuild_index.py is saved with the
+# namespace's snapshots and kept, unless these are set explicitly.
+INDEX_TYPE_EXPLICIT = "RAG_INDEX_TYPE" in os.environ
+VECTOR_CODEC_EXPLICIT = "RAG_VECTOR_CODEC" in os.environ
+
+# Chunking: documents are split by markdown heading, then by size with overlap
+CHUNK_MAX_CHARS = int(os.getenv("RAG_CHUNK_MAX_CHARS", "800"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "100"))
+
+# Query micro-batching: concurrent searches are encoded and searched together
+BATCH_MAX_SIZE = int(os.getenv("RAG_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("RAG_BATCH_MAX_WAIT_MS", "5"))
+
+# Hybrid retrieval: the top RAG_HYBRID_CANDIDATES vector and BM25 hits are
+# fused with reciprocal rank fusion (constant RAG_RRF_K)
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Query caches: normalized query -> vector, and (site directory, epoch, normalized query, k) -> results
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RAG_RESULT_CACHE_TTL", "600"))
+
+# Per-site indexes are loaded on first use and evicted (least recently used
+# first) when idle or when the loaded sites exceed the memory budget.
+SITE_MEMORY_BUDGET_MB = float(os.getenv("RAG_SITE_MEMORY_BUDGET_MB", "512"))
+SITE_IDLE_EVICT_S = float(os.getenv("RAG_SITE_IDLE_EVICT_S", "1800"))
+
+embedding_dim = 384
+
+query_vector_cache = LRUCache(max_size=QUERY_CACHE_SIZE, default_ttl=QUERY_CACHE_TTL)
+search_result_cache = LRUCache(max_size=RESULT_CACHE_SIZE, default_ttl=RESULT_CACHE_TTL)
+# Result-cache epoch per namespace directory, bumped whenever that namespace
+# publishes a generation. Part of the cache key, so a write only retires its
+# own site's cached results; kept outside KnowledgeIndex so it survives eviction.
+result_epochs: Counter = Counter()
+
 # Ensure storage directory exists
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
-# Initialize FAISS index
-embedding_dim = 384
-index = faiss.IndexFlatL2(embedding_dim)
-documents = []
 
-def save_index():
-    """Save the FAISS index and documents to disk."""
-    try:
-        faiss.write_index(index, INDEX_PATH)
-        with open(DOCS_PATH, "w", encoding="utf-8") as f:
-            json.dump(documents, f)
-        logger.info("✅ RAG Index and documents saved to disk.")
-    except Exception as e:
-        logger.error(f"❌ Failed to save RAG index: {e}")
+class RAGUnavailableError(Exception):
+    """Documents cannot be written: the embedding model or the index failed to load."""
+
+
+class DocumentsView(Mapping):
+    """Read-only ``id -> chunk`` mapping: ``base`` without ``deleted`` ids, plus ``delta``."""
+
+    def __init__(self, base: dict, delta: dict, deleted: frozenset):
+        self.base = base
+        self.delta = delta
+        self.deleted = deleted
+
+    def __getitem__(self, doc_id):
+        if doc_id in self.delta:
+            return self.delta[doc_id]
+        if doc_id in self.deleted:
+            raise KeyError(doc_id)
+        return self.base[doc_id]
+
+    def __iter__(self):
+        for doc_id in self.base:
+            if doc_id not in self.deleted:
+                yield doc_id
+        yield from self.delta
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.deleted) + len(self.delta)
+
+
+class IndexGeneration:
+    """
+    One consistent, immutable state of a namespace as of log entry ``seq``:
+    the FAISS index, its chunk documents and the BM25 index over them.
+
+    A generation is never mutated once published. Writers derive a successor
+    (copy-on-write) and swap it in with a single attribute assignment, so
+    readers that grabbed a generation keep a consistent view without locks
+    and snapshots always serialize exactly one log position.
+
+    To keep writes cheap, a generation is a base (``index``, documents and
+    BM25 index as of ``base_seq``, shared with its predecessors) plus a small
+    delta: chunks added since, with their vectors, and tombstones for base
+    chunks removed since. ``derive`` copies only the delta; ``merged`` folds
+    it into a new base once it grows past the DELTA_MIN_DOCS threshold.
+    """
+
+    __slots__ = ("index", "base_documents", "base_lexical", "base_seq", "delta_documents", "delta_lexical",
+                 "delta_ids", "delta_vectors", "deleted", "documents", "lexical", "text_bytes", "seq", "version",
+                 "_selector")
+
+    def __init__(self, index, documents: dict, lexical: LexicalIndex, text_bytes: int = 0,
+                 seq: int = 0, version: int = 0, base_seq: int = None, delta_documents: dict = None,
+                 delta_lexical: LexicalIndex = None, delta_ids: np.ndarray = None,
+                 delta_vectors: np.ndarray = None, deleted: frozenset = frozenset()):
+        self.index = index
+        self.base_documents = documents  # id -> chunk dict: {"text", "source", "heading_path", "start", "end"}
+        self.base_lexical = lexical
+        self.base_seq = seq if base_seq is None else base_seq  # last log entry reflected in ``index``
+        self.delta_documents = delta_documents or {}
+        self.delta_lexical = delta_lexical or LexicalIndex()
+        self.delta_ids = np.empty(0, dtype="int64") if delta_ids is None else delta_ids
+        self.delta_vectors = np.empty((0, index.d), dtype="float32") if delta_vectors is None else delta_vectors
+        self.deleted = deleted      # base ids removed since ``base_seq``
+        if self.delta_documents or deleted:
+            self.documents = DocumentsView(documents, self.delta_documents, deleted)
+            self.lexical = LexicalView(lexical, self.delta_lexical, deleted)
+        else:
+            self.documents = documents
+            self.lexical = lexical
+        self.text_bytes = text_bytes
+        self.seq = seq              # last log entry reflected in this generation
+        self.version = version      # incremented for every published successor
+        self._selector = None       # built on first search when there are tombstones
+
+    @classmethod
+    def empty(cls) -> "IndexGeneration":
+        return cls(vector_index.create_index("flat", embedding_dim), {}, LexicalIndex())
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live vectors."""
+        return self.index.ntotal - len(self.deleted) + len(self.delta_ids)
+
+    def derive(self, remove_ids, add_ids, chunks, embeddings, seq: int, vectors_fn) -> "IndexGeneration":
+        """Successor generation with a logged mutation applied (blocking; run in the executor).
+
+        Copies only the delta, unless it outgrows the threshold and is merged.
+        ``vectors_fn(index, ids)`` supplies exact vectors when a merge forces a rebuild.
+        """
+        delta_documents = dict(self.delta_documents)
+        delta_lexical = self.delta_lexical.copy()
+        deleted = set(self.deleted)
+        text_bytes = self.text_bytes
+        for doc_id in remove_ids:
+            removed = delta_documents.pop(doc_id, None)
+            if removed is not None:
+                delta_lexical.remove(doc_id)
+            elif doc_id in self.base_documents and doc_id not in deleted:
+                removed = self.base_documents[doc_id]
+                deleted.add(doc_id)
+            else:
+                continue
+            text_bytes -= len(removed["text"])
+        keep = ~np.isin(self.delta_ids, np.asarray(remove_ids, dtype="int64"))
+        delta_ids = np.concatenate([self.delta_ids[keep], add_ids])
+        delta_vectors = self.delta_vectors[keep]
+        if len(add_ids):
+            delta_vectors = np.vstack([delta_vectors, np.asarray(embeddings, dtype="float32")])
+            for doc_id, chunk in zip(add_ids.tolist(), chunks):
+                delta_documents[doc_id] = chunk
+                delta_lexical.add(doc_id, embedding_text(chunk))
+                text_bytes += len(chunk["text"])
+        generation = IndexGeneration(
+            self.index, self.base_documents, self.base_lexical, text_bytes, seq, self.version + 1,
+            self.base_seq, delta_documents, delta_lexical, delta_ids, delta_vectors, frozenset(deleted),
+        )
+        if len(delta_documents) + len(deleted) > max(DELTA_MIN_DOCS, math.isqrt(len(self.base_documents))):
+            generation = generation.merged(vectors_fn)
+        return generation
+
+    def merged(self, vectors_fn) -> "IndexGeneration":
+        """Same state with the delta folded into a new base (blocking, one copy of the corpus)."""
+        if not self.delta_documents and not self.deleted:
+            return self
+        index = faiss.clone_index(self.index)
+        vector_index.configure(index)
+        lexical = self.base_lexical.copy()
+        if self.deleted:
+            index = vector_index.remove_ids(
+                index, np.array(sorted(self.deleted), dtype="int64"),
+                keep_ids=sorted(i for i in self.base_documents if i not in self.deleted),
+                vectors_fn=lambda ids: vectors_fn(index, ids),
+            )
+            for doc_id in self.deleted:
+                lexical.remove(doc_id)
+        if len(self.delta_ids):
+            index.add_with_ids(self.delta_vectors, self.delta_ids)
+            for doc_id, chunk in self.delta_documents.items():
+                lexical.add(doc_id, embedding_text(chunk))
+        return IndexGeneration(index, dict(self.documents), lexical, self.text_bytes, self.seq, self.version)
 
-def load_index():
-    """Load the FAISS index and documents from disk if they exist."""
-    global index, documents
-    if os.path.exists(INDEX_PATH) and os.path.exists(DOCS_PATH):
+    def with_index(self, index) -> "IndexGeneration":
+        """Same documents (shared, they are immutable) over a rebuilt index; only for merged generations."""
+        return IndexGeneration(index, self.documents, self.lexical, self.text_bytes, self.seq, self.version + 1)
+
+    def search(self, vectors: np.ndarray, k: int):
+        """``(D, I)`` of the ``k`` nearest live chunks per query, as ``index.search`` returns them."""
+        vectors = np.asarray(vectors, dtype="float32")
+        if self.deleted and self._selector is None:
+            self._selector = vector_index.excluding(list(self.deleted))
+        D, I = vector_index.search(self.index, vectors, k, self._selector)
+        if not len(self.delta_ids):
+            return D, I
+        # The delta is small: exact search, then merge both candidate lists by distance.
+        delta_d, delta_pos = faiss.knn(vectors, self.delta_vectors, min(k, len(self.delta_ids)))
+        D = np.hstack([D, delta_d])
+        I = np.hstack([I, self.delta_ids[delta_pos]])
+        order = np.argsort(D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+
+class KnowledgeIndex:
+    """
+    One RAG namespace: a FAISS index and a BM25 lexical index over its chunk documents.
+
+    Vectors are stored under explicit ids so entries belonging to one source
+    can be removed or replaced without rebuilding everything else. Durable
+    state lives in the append-only log; the index is a snapshot plus replay.
+    The in-memory state is an ``IndexGeneration`` in ``current``: readers
+    take it once and use it throughout, writers (serialized by a lock)
+    publish a new one.
+    """
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.directory = directory
+        self.log_path = os.path.join(directory, LOG_FILENAME)
+        self.snapshot_dir = os.path.join(directory, SNAPSHOT_DIRNAME)
+        self.current = IndexGeneration.empty()
+        self.next_id = 0
+        self.snapshot_seq = 0     # last log entry contained in the newest snapshot on disk
+        self.settings = {}        # index kind/codec saved by ``rebuild`` (see ``_wanted``)
+        self.last_used = time.monotonic()
+        self.loaded = False
+        self.store = None
+        self._write_lock = asyncio.Lock()
+        self._snapshot_lock = threading.Lock()  # snapshots may be written from several threads
+        self._snapshot_timer = None
+        self._dirty_since = None
+
+    # Read-only views of the current generation. Code that reads more than one
+    # of them should take ``current`` once instead.
+    @property
+    def index(self):
+        return self.current.index
+
+    @property
+    def documents(self) -> Mapping:
+        return self.current.documents
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+    @property
+    def applied_seq(self) -> int:
+        return self.current.seq
+
+    def _publish(self, generation: IndexGeneration):
+        self.current = generation
+        # This namespace's cached results may now be stale or missing better matches
+        result_epochs[self.directory] += 1
+
+    # --- Loading & snapshots -------------------------------------------------
+
+    def _vectors(self, index, ids) -> np.ndarray:
+        """Exact vectors for ``ids``: from ``index`` if it stores float32, else from the log."""
+        if self.store is not None and vector_index.index_codec(index) != "none":
+            return self.store.live_vectors(list(ids), embedding_dim)
+        return vector_index.extract_vectors(index, ids)
+
+    def _wanted(self, n_vectors: int) -> tuple:
+        """Index kind and codec this namespace should use at ``n_vectors`` vectors.
+
+        A kind/codec saved by ``rebuild`` is used as is, unless RAG_INDEX_TYPE /
+        RAG_VECTOR_CODEC are set explicitly; otherwise those settings apply,
+        with their size thresholds.
+        """
+        kind = self.settings.get("kind")
+        if kind is None or INDEX_TYPE_EXPLICIT:
+            kind = vector_index.target_kind(INDEX_TYPE, n_vectors)
+        codec = self.settings.get("codec")
+        if codec is None or VECTOR_CODEC_EXPLICIT:
+            codec = vector_index.target_codec(VECTOR_CODEC, n_vectors)
+        return kind, codec
+
+    def _needs_rebuild(self, index) -> bool:
+        return vector_index.needs_rebuild(index, *self._wanted(index.ntotal), exact=True)
+
+    def _rebuilt(self, generation: IndexGeneration, kind: str = None, codec: str = None) -> IndexGeneration:
+        generation = generation.merged(self._vectors)
+        ids = np.array(sorted(generation.documents), dtype="int64")
+        wanted_kind, wanted_codec = self._wanted(len(ids))
+        kind = kind or wanted_kind
+        codec = codec or wanted_codec
+        previous = f"{vector_index.index_kind(generation.index)}/{vector_index.index_codec(generation.index)}"
+        vectors = self._vectors(generation.index, ids)
+        index = vector_index.build_index(kind, embedding_dim, ids, vectors, codec)
+        logger.info(f"🔁 Rebuilt RAG index '{self.name}': {previous} -> {kind}/{codec} ({len(ids)} vectors).")
+        return generation.with_index(index)
+
+    def rebuild(self, kind: str = None, codec: str = None, reset: bool = False):
+        """Rebuild the index as ``kind`` storing ``codec`` codes.
+
+        An explicit ``kind`` / ``codec`` is saved with the snapshots, so later
+        loads and writes keep it; ``reset`` forgets saved ones first. Both
+        default to what the namespace is configured for (see ``_wanted``).
+        Vectors are reused, so no re-embedding is needed. Not serialized with
+        ``add``/``remove``; meant for scripts and startup.
+        """
+        settings = {} if reset else dict(self.settings)
+        settings.update({name: value for name, value in (("kind", kind), ("codec", codec)) if value})
+        doc_store.write_settings(self.snapshot_dir, settings)
+        self.settings = settings
+        self._publish(self._rebuilt(self.current, kind, codec))
+
+    def _write_snapshot(self, generation: IndexGeneration, force: bool = False):
+        """Write a snapshot of ``generation``'s base index, then compact the log behind it.
+
+        The delta is not serialized: its log entries follow ``base_seq`` and are replayed on load.
+        """
         try:
-            index = faiss.read_index(INDEX_PATH)
-            with open(DOCS_PATH, "r", encoding="utf-8") as f:
-                documents = json.load(f)
-            logger.info(f"✅ Loaded RAG index with {len(documents)} documents.")
+            with self._snapshot_lock:
+                seq = generation.base_seq
+                if seq < self.snapshot_seq or (seq == self.snapshot_seq and not force):
+                    return  # this generation (or a newer one) is already on disk
+                doc_store.write_snapshot(self.snapshot_dir, seq, faiss.serialize_index(generation.index))
+                self.snapshot_seq = seq
+                logger.info(f"✅ RAG index '{self.name}' snapshot written at log seq {seq}.")
+                # Only compact up to the oldest snapshot we keep, so falling back to it still works.
+                snapshots = doc_store.list_snapshots(self.snapshot_dir)
+                live = list(generation.documents)
+                if snapshots and self.store.row_count() > 2 * max(len(live), 1):
+                    dropped = self.store.compact(live, up_to_seq=snapshots[-1][0])
+                    logger.info(f"🧹 Compacted RAG log '{self.name}': dropped {dropped} rows.")
         except Exception as e:
-            logger.error(f"❌ Failed to load RAG index: {e}")
+            logger.error(f"❌ Failed to save RAG index snapshot '{self.name}': {e}")
+
+    def save(self, force: bool = False):
+        """Snapshot the current generation to disk now (synchronous).
+
+        Skipped when the newest snapshot already covers the log, unless ``force``
+        (e.g. after the index was rebuilt as a different type).
+        """
+        generation = self.current
+        if force or generation.base_seq > self.snapshot_seq:
+            self._write_snapshot(generation, force)
+
+    def _import_legacy_files(self, index_path: str, docs_path: str):
+        """One-time import of a pre-log ``index.faiss`` + ``documents.json`` into the log."""
+        try:
+            with open(docs_path, "r", encoding="utf-8") as f:
+                loaded_docs = json.load(f)
+            if loaded_docs and not isinstance(loaded_docs[0], dict):
+                # Legacy format: positional vectors with bare strings and no
+                # source information. It cannot be updated incrementally, so we
+                # start fresh and let the knowledge base re-ingest its files.
+                logger.warning("⚠️ Discarding legacy RAG index without document ids.")
+            elif loaded_docs:
+                legacy_index = faiss.read_index(index_path)
+                ids = [doc.pop("id") for doc in loaded_docs]
+                vectors = vector_index.extract_vectors(legacy_index, ids)
+                self.store.append(add_ids=ids, chunks=loaded_docs, vectors=vectors)
+                logger.info(f"📥 Imported {len(ids)} documents from {docs_path} into the RAG log.")
+            for path in (index_path, docs_path):
+                os.replace(path, path + ".migrated")
+        except Exception as e:
+            logger.error(f"❌ Failed to import legacy RAG index: {e}")
+
+    def load(self, legacy_paths: tuple = None):
+        """Load the newest index snapshot and replay the log entries written after it."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.store = doc_store.DocumentLog(self.log_path)
+        self.settings = doc_store.read_settings(self.snapshot_dir)
+        if legacy_paths and self.store.last_seq() == 0 and all(os.path.exists(p) for p in legacy_paths):
+            self._import_legacy_files(*legacy_paths)
+
+        try:
+            snapshot = doc_store.read_latest_snapshot(self.snapshot_dir)
+            snap_seq, snap_index = snapshot if snapshot else (0, None)
+            documents, new_vectors, removed, last_seq = self.store.replay(snap_seq, embedding_dim)
+
+            if snap_index is not None:
+                index = snap_index
+                vector_index.configure(index)
+                if removed:
+                    keep = [i for i in documents if i not in new_vectors]
+                    index = vector_index.remove_ids(
+                        index, np.array(removed, dtype="int64"), keep_ids=sorted(keep),
+                        vectors_fn=lambda ids: self.store.live_vectors(list(ids), embedding_dim),
+                    )
+                if new_vectors:
+                    ids = np.array(list(new_vectors), dtype="int64")
+                    index.add_with_ids(np.vstack(list(new_vectors.values())), ids)
+            else:
+                # No usable snapshot: rebuild from the vectors kept in the log.
+                ids = sorted(documents)
+                kind, codec = self._wanted(len(ids))
+                index = vector_index.build_index(kind, embedding_dim, np.array(ids, dtype="int64"),
+                                                 self.store.live_vectors(ids, embedding_dim), codec)
+
+            lexical = LexicalIndex()
+            for doc_id, doc in documents.items():
+                lexical.add(doc_id, embedding_text(doc))
+            text_bytes = sum(len(doc["text"]) for doc in documents.values())
+            generation = IndexGeneration(index, documents, lexical, text_bytes, last_seq)
+            self.next_id = max(documents, default=-1) + 1
+            self.snapshot_seq = snap_seq
+            replayed = last_seq - snap_seq
+            logger.info(
+                f"✅ Loaded RAG index '{self.name}' ({vector_index.index_kind(index)}/"
+                f"{vector_index.index_codec(index)}) with {len(documents)} "
+                f"documents (snapshot seq {snap_seq}, {replayed} log entries replayed)."
+            )
+            rebuilt = self._needs_rebuild(index)
+            if rebuilt:
+                # Migrate an existing index to the configured structure and codec.
+                generation = self._rebuilt(generation)
+            self._publish(generation)
+            self.save(force=rebuilt)
+        except Exception as e:
+            logger.error(f"❌ Failed to load RAG index '{self.name}': {e}")
             # Reset if load fails
-            index = faiss.IndexFlatL2(embedding_dim)
-            documents = []
-    else:
-        logger.info("ℹ️ No existing RAG index found. Starting fresh.")
-
-# Load on module import (or can be called explicitly)
-load_index()
-
-async def add_documents(texts: list[str]):
-    """Async wrapper to add documents and save index."""
-    global documents
-    
-    if embedder is None:
-        logger.warning("⚠️ RAG is disabled because SentenceTransformer is not available.")
+            self._publish(IndexGeneration.empty())
+            self.next_id = 0
+        self.loaded = True
+
+    async def persist(self):
+        """Write a snapshot of the current generation now instead of waiting for the debounce."""
+        if self._snapshot_timer is not None:
+            self._snapshot_timer.cancel()
+            self._snapshot_timer = None
+        self._dirty_since = None
+        generation = self.current
+        if generation.base_seq <= self.snapshot_seq:
+            return
+        # The generation is immutable, so it can be serialized off the loop
+        # while writers publish newer ones.
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_snapshot, generation)
+
+    def schedule_snapshot(self):
+        """Debounce index snapshots: many small writes produce one snapshot."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        if self._snapshot_timer is not None:
+            self._snapshot_timer.cancel()
+        delay = min(SNAPSHOT_DEBOUNCE_S, max(0.0, self._dirty_since + SNAPSHOT_MAX_DELAY_S - now))
+        self._snapshot_timer = loop.call_later(delay, lambda: loop.create_task(self.persist()))
+
+    def close(self):
+        if self._snapshot_timer is not None:
+            self._snapshot_timer.cancel()
+            self._snapshot_timer = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    # --- Mutations -----------------------------------------------------------
+
+    def sources(self) -> set:
+        return {doc["source"] for doc in self.documents.values() if doc.get("source")}
+
+    def _ids_for_sources(self, sources) -> list:
+        return [doc_id for doc_id, doc in self.documents.items() if doc.get("source") in sources]
+
+    def _next_generation(self, remove_ids, add_ids, chunks, embeddings, seq: int) -> IndexGeneration:
+        """Derive the successor of ``current`` (blocking), retraining if the corpus calls for it."""
+        generation = self.current.derive(remove_ids, add_ids, chunks, embeddings, seq, self._vectors)
+        # The base only changes when the delta was merged; that is when its size can cross a threshold.
+        if generation.index is not self.current.index and self._needs_rebuild(generation.index):
+            # Corpus crossed the ANN/compression threshold (or outgrew its IVF lists): retrain.
+            generation = self._rebuilt(generation)
+        return generation
+
+    async def add(self, chunks: list, embeddings, replace_source: str = None, save: bool = True) -> int:
+        loop = asyncio.get_running_loop()
+        async with self._write_lock:
+            remove_ids = self._ids_for_sources({replace_source}) if replace_source else []
+            if not chunks and not remove_ids:
+                return 0
+            ids = np.arange(self.next_id, self.next_id + len(chunks), dtype="int64")
+            self.next_id += len(chunks)
+
+            seq = await loop.run_in_executor(None, lambda: self.store.append(remove_ids, ids, chunks, embeddings))
+            generation = await loop.run_in_executor(
+                None, self._next_generation, remove_ids, ids, chunks, embeddings, seq
+            )
+            self._publish(generation)
+
+        if save:
+            self.schedule_snapshot()
+        return len(chunks)
+
+    async def remove(self, sources, save: bool = True) -> int:
+        loop = asyncio.get_running_loop()
+        async with self._write_lock:
+            remove_ids = self._ids_for_sources(set(sources))
+            if not remove_ids:
+                return 0
+            seq = await loop.run_in_executor(None, lambda: self.store.append(remove_ids=remove_ids))
+            generation = await loop.run_in_executor(
+                None, self._next_generation, remove_ids, np.empty(0, dtype="int64"), [], None, seq
+            )
+            self._publish(generation)
+        if save:
+            self.schedule_snapshot()
+        return len(remove_ids)
+
+    # --- Queries -------------------------------------------------------------
+
+    def memory_bytes(self) -> int:
+        """Rough resident size: vector codes plus id/graph overhead, delta vectors, postings and chunk text."""
+        generation = self.current
+        return (generation.index.ntotal * vector_index.bytes_per_vector(generation.index)
+                + generation.delta_vectors.nbytes + generation.lexical.memory_bytes() + generation.text_bytes)
+
+    @property
+    def busy(self) -> bool:
+        return self._write_lock.locked()
+
+
+def _site_directory(site_id: str) -> str:
+    """Storage directory of a site. Ids are used verbatim, so distinct ids never share one."""
+    site_id = str(site_id)
+    if not SITE_ID_RE.fullmatch(site_id):
+        raise ValueError(f"Invalid site id: {site_id!r}")
+    return os.path.join(SITES_DIR, site_id)
+
+
+class SiteIndexRegistry:
+    """
+    Lazily loaded per-site indexes with LRU eviction.
+
+    The shared knowledge base (``site_id=None``) is always resident. Site
+    indexes are loaded from disk on first use and evicted, least recently
+    used first, when idle for SITE_IDLE_EVICT_S or when the loaded sites
+    exceed SITE_MEMORY_BUDGET_MB. Eviction snapshots the index first, so
+    nothing is lost.
+    """
+
+    def __init__(self, default: KnowledgeIndex):
+        self.default = default
+        # Keyed by storage directory: exactly one KnowledgeIndex (and log writer) per directory
+        self._sites: "OrderedDict[str, KnowledgeIndex]" = OrderedDict()
+        self._loading: dict = {}
+        self.loads = 0
+        self.evictions = 0
+
+    async def get(self, site_id: str = None, create: bool = False) -> Optional[KnowledgeIndex]:
+        """The index of ``site_id``, or ``None`` if the site has no storage and ``create`` is off.
+
+        Only ingestion passes ``create``: site ids arrive from anonymous chat
+        requests, and reads must not create directories or logs for them.
+        """
+        if site_id is None:
+            self.default.last_used = time.monotonic()
+            return self.default
+
+        site_id = str(site_id)
+        directory = _site_directory(site_id)
+        kb = self._sites.get(directory)
+        if kb is None:
+            # Concurrent first queries for a site share a single load.
+            task = self._loading.get(directory)
+            if task is None:
+                if not create and not os.path.isdir(directory):
+                    return None
+                task = asyncio.ensure_future(self._load(site_id, directory))
+                self._loading[directory] = task
+            kb = await asyncio.shield(task)
+        self._sites.move_to_end(directory)
+        kb.last_used = time.monotonic()
+        await self.evict()
+        return kb
+
+    async def _load(self, site_id: str, directory: str) -> KnowledgeIndex:
+        try:
+            kb = KnowledgeIndex(site_id, directory)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, kb.load)
+            self._sites[directory] = kb
+            self.loads += 1
+            return kb
+        finally:
+            self._loading.pop(directory, None)
+
+    def memory_bytes(self) -> int:
+        return sum(kb.memory_bytes() for kb in self._sites.values())
+
+    async def evict(self):
+        """Drop idle sites, then least recently used ones until under budget."""
+        now = time.monotonic()
+        budget = SITE_MEMORY_BUDGET_MB * 1024 * 1024
+        for directory, kb in list(self._sites.items()):
+            over_budget = self.memory_bytes() > budget and len(self._sites) > 1
+            idle = now - kb.last_used > SITE_IDLE_EVICT_S
+            if not (idle or over_budget):
+                # Entries are in LRU order; if this one stays, newer ones do too.
+                break
+            if kb.busy or directory == next(reversed(self._sites)):
+                continue
+            await self._evict(directory)
+
+    async def _evict(self, directory: str):
+        kb = self._sites.pop(directory, None)
+        if kb is None:
+            return
+        await kb.persist()
+        kb.close()
+        self.evictions += 1
+        logger.info(f"💤 Evicted RAG index for site '{kb.name}' from memory.")
+
+    async def persist_all(self):
+        await self.default.persist()
+        for kb in list(self._sites.values()):
+            await kb.persist()
+
+    def stats(self) -> dict:
+        return {
+            "loaded_sites": [kb.name for kb in self._sites.values()],
+            "memory_mb": round(self.memory_bytes() / (1024 * 1024), 2),
+            "memory_budget_mb": SITE_MEMORY_BUDGET_MB,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+# The shared knowledge base; loaded from disk by ``warmup()``
+default_index = KnowledgeIndex("default", STORAGE_DIR)
+sites = SiteIndexRegistry(default_index)
+
+
+def load_embedder():
+    """Load the embedding model and run one dummy encode (blocking)."""
+    global embedder, embedder_status
+    if SentenceTransformer is None:
+        embedder_status = "unavailable"
+        logger.warning("SentenceTransformer not found. RAG functionality will be disabled.")
         return
+    embedder_status = "loading"
+    try:
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        # The first encode pays for tokenizer/kernel initialisation; do it here, not on a user query.
+        model.encode(["warmup"])
+        embedder = model
+        embedder_status = "ready"
+        logger.info(f"✅ Embedding model '{EMBEDDING_MODEL}' loaded.")
+    except Exception as e:
+        embedder_status = "failed"
+        logger.error(f"Failed to load SentenceTransformer: {e}")
 
+def load_default_index():
+    """Load the shared knowledge base index from disk (blocking)."""
+    if not default_index.loaded:
+        default_index.load(legacy_paths=(INDEX_PATH, DOCS_PATH))
+
+async def _warmup():
     loop = asyncio.get_running_loop()
-    
-    # Run blocking embedding generation in a thread pool
-    embeddings = await loop.run_in_executor(None, embedder.encode, texts)
-    
-    # FAISS add is fast for small data, but good to be safe
-    index.add(np.array(embeddings).astype("float32"))
-    documents.extend(texts)
-    
-    # Save after adding
-    await loop.run_in_executor(None, save_index)
-
-async def search_documents(query: str, k: int = 3):
-    """Async wrapper to search documents."""
+    await asyncio.gather(
+        loop.run_in_executor(None, load_default_index),
+        loop.run_in_executor(None, load_embedder),
+    )
+
+def warmup() -> asyncio.Task:
+    """Start (once) loading the model and the shared index in the background."""
+    global _warmup_task
+    if _warmup_task is None:
+        _warmup_task = asyncio.get_running_loop().create_task(_warmup())
+    return _warmup_task
+
+def is_ready() -> bool:
+    """True once warmup has finished (RAG may still be disabled if the model is unavailable)."""
+    return default_index.loaded and embedder_status in ("ready", "unavailable", "failed")
+
+def status() -> dict:
+    return {
+        "embedder": embedder_status,
+        "model": EMBEDDING_MODEL,
+        "index_loaded": default_index.loaded,
+        "documents": len(default_index.documents),
+    }
+
+
+def rebuild_index(kind: str = None, codec: str = None):
+    load_default_index()
+    default_index.rebuild(kind, codec)
+
+def save_index(force: bool = False):
+    default_index.save(force)
+
+async def get_sources(site_id: str = None) -> set:
+    """Return the set of sources that currently have vectors in the index."""
+    kb = await sites.get(site_id)
+    return kb.sources() if kb is not None else set()
+
+async def persist(site_id: str = None):
+    """Write an index snapshot now instead of waiting for the debounce."""
+    kb = await sites.get(site_id)
+    if kb is not None:
+        await kb.persist()
+
+async def persist_all():
+    await sites.persist_all()
+
+async def _await_warmup():
+    """Wait for a warmup that is still running; writes can arrive before it finishes."""
+    if _warmup_task is not None and not _warmup_task.done():
+        # Shielded: a cancelled request must not cancel the shared warmup
+        await asyncio.shield(_warmup_task)
+
+async def add_documents(
+    texts: list[str],
+    source: str = None,
+    replace: bool = False,
+    save: bool = True,
+    site_id: str = None,
+) -> int:
+    """Async wrapper to chunk, embed and add documents to a site's index.
+
+    Each text is split into heading-scoped chunks (see ``chunker``) and one
+    vector is stored per chunk. If ``replace`` is set, vectors previously
+    stored for ``source`` are dropped first so a changed file does not leave
+    stale duplicates behind. The change is appended to the log before it is
+    applied; with ``save`` an index snapshot is scheduled (debounced).
+    ``site_id=None`` targets the shared knowledge base. Returns the number
+    of chunks added. Waits for a running warmup; raises
+    ``RAGUnavailableError`` if the embedding model is not available.
+    """
+    await _await_warmup()
     if embedder is None:
-        logger.warning("⚠️ RAG is disabled because SentenceTransformer is not available.")
+        raise RAGUnavailableError(f"embedding model {embedder_status}")
+
+    chunks = []
+    for text in texts:
+        chunks.extend(chunk_markdown(text, source=source, max_chars=CHUNK_MAX_CHARS, overlap=CHUNK_OVERLAP))
+
+    embeddings = np.empty((0, embedding_dim), dtype="float32")
+    if chunks:
+        loop = asyncio.get_running_loop()
+        # Run blocking embedding generation in a thread pool
+        embeddings = await loop.run_in_executor(None, embedder.encode, [embedding_text(c) for c in chunks])
+        embeddings = np.asarray(embeddings, dtype="float32")
+
+    kb = await sites.get(site_id, create=True)
+    return await kb.add(chunks, embeddings, replace_source=source if replace else None, save=save)
+
+async def remove_documents(sources, save: bool = True, site_id: str = None) -> int:
+    """Remove every vector that belongs to one of ``sources``.
+
+    Waits for a running warmup; raises ``RAGUnavailableError`` if the shared
+    index is not loaded.
+    """
+    await _await_warmup()
+    if site_id is None and not default_index.loaded:
+        raise RAGUnavailableError("knowledge base index not loaded")
+    kb = await sites.get(site_id)
+    if kb is None:
+        return 0
+    return await kb.remove(sources, save=save)
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: case-folded, whitespace-collapsed, trailing punctuation dropped."""
+    return re.sub(r"\s+", " ", query).strip().strip("?!.,;:").strip().casefold()
+
+def _encode_queries(queries: list[str]):
+    return embedder.encode(queries)
+
+def _search_index(generation: IndexGeneration, vectors, k: int):
+    return generation.search(vectors, k)
+
+batcher = EmbeddingBatcher(
+    _encode_queries,
+    _search_index,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+)
+
+async def search_documents(query: str, k: int = 3, site_id: str = None) -> list[dict]:
+    """Async wrapper to search a site's documents.
+
+    Only the index of ``site_id`` is searched (``None``: the shared knowledge
+    base), so results never cross tenants. Vector and BM25 candidates are
+    fused with reciprocal rank fusion, so exact tokens (names, prices, phone
+    numbers) are found even when the embedding misses them. While the
+    embedding model is loading or unavailable, the BM25 ranking alone is
+    returned. Repeated queries are answered from ``search_result_cache`` (or
+    skip the encoder via ``query_vector_cache``); concurrent misses are
+    coalesced by ``batcher`` into one encode and one index search per site
+    generation. A query reads a single immutable ``IndexGeneration`` and
+    takes no locks.
+    Returns the best matching chunks as dicts with ``text``, ``source``,
+    ``heading_path``, ``start``/``end`` byte offsets, the fused ``score`` and
+    the L2 ``distance`` (``None`` for lexical-only hits).
+    """
+    if not default_index.loaded:
+        # Still warming up: answer without RAG rather than block the request.
+        logger.warning("⚠️ RAG index not loaded yet; returning no results.")
         return []
 
-    loop = asyncio.get_running_loop()
-    
-    # Run blocking embedding generation in a thread pool
-    query_vec = await loop.run_in_executor(None, embedder.encode, [query])
-    
-    # FAISS search
-    D, I = index.search(np.array(query_vec).astype("float32"), k)
-    
-    results = [documents[i] for i in I[0] if i < len(documents)]
-    return results
\ No newline at end of file
+    try:
+        directory = STORAGE_DIR if site_id is None else _site_directory(site_id)
+    except ValueError as e:
+        logger.warning(f"⚠️ {e}; returning no results.")
+        return []
+    key = normalize_query(query)
+    cached = search_result_cache.get((directory, result_epochs[directory], key, k))
+    if cached is not None:
+        return [dict(hit) for hit in cached]
+
+    kb = await sites.get(site_id)
+    if kb is None:
+        # Nothing has been ingested for this site
+        return []
+    # One generation for the whole query: its index, documents and BM25 index agree.
+    generation = kb.current
+    documents = generation.documents
+    n_candidates = max(k, HYBRID_CANDIDATES)
+    lexical = generation.lexical.search(key, n_candidates)
+
+    if embedder is None:
+        # Lexical-only fast path; not cached so vector results take over once the model is up.
+        logger.debug(f"RAG embedding model {embedder_status}; serving BM25 results only.")
+        return [{**documents[i], "distance": None, "score": score} for i, score in lexical[:k]]
+
+    vector, D, I = await batcher.submit(key, n_candidates, vector=query_vector_cache.get(key), target=generation)
+    query_vector_cache.set(key, vector)
+
+    distances = {int(i): float(d) for d, i in zip(D, I) if i in documents}
+    fused = reciprocal_rank_fusion([list(distances), [i for i, _ in lexical]], k=RRF_K)
+    results = [{**documents[i], "distance": distances.get(i), "score": score} for i, score in fused[:k]]
+    if generation is kb.current:
+        search_result_cache.set((directory, result_epochs[directory], key, k), results)
+    return [dict(hit) for hit in results]
+
+def cache_stats() -> dict:
+    return {
+        "query_vectors": query_vector_cache.stats(),
+        "results": search_result_cache.stats(),
+    }
@@ -5,85 +5,138 @@ import re
 import asyncio
 
 from app.services.llm_provider import decide_action_raw
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+from app.services.browser_pool import browser_pool
+from app.services.crawler_service import _fallback_httpx
+from app.services.html_analysis import analyze_html
+from app.services import page_settle, tiered_fetch
+from crawl4ai import CrawlerRunConfig, CacheMode
 
-async def get_interactive_elements_with_crawl4ai(url: str) -> List[Dict[str, Any]]:
-    """
-    Uses crawl4ai to navigate to a URL and extract all interactive elements,
-    including buttons, links, and form fields.
-    """
+# JavaScript to be executed in the browser context to extract elements
+INTERACTIVE_ELEMENTS_JS = """() => {
+    const interactive_elements = [];
     
-    # JavaScript to be executed in the browser context to extract elements
-    extraction_js = """() => {
-        const interactive_elements = [];
-        
-        // Function to create a unique CSS selector
-        const create_selector = (element) => {
-            if (element.id) {
-                return `#${element.id}`;
-            }
-            let path = '';
-            while (element.parentElement) {
-                let sibling_index = 1;
-                let sibling = element.previousElementSibling;
-                while (sibling) {
-                    if (sibling.nodeName === element.nodeName) {
-                        sibling_index++;
-                    }
-                    sibling = sibling.previousElementSibling;
+    // Function to create a unique CSS selector
+    const create_selector = (element) => {
+        if (element.id) {
+            return `#${element.id}`;
+        }
+        let path = '';
+        while (element.parentElement) {
+            let sibling_index = 1;
+            let sibling = element.previousElementSibling;
+            while (sibling) {
+                if (sibling.nodeName === element.nodeName) {
+                    sibling_index++;
                 }
-                const tag_name = element.nodeName.toLowerCase();
-                const path_segment = `${tag_name}:nth-of-type(${sibling_index})`;
-                path = path_segment + (path ? ' > ' + path : '');
-                element = element.parentElement;
+                sibling = sibling.previousElementSibling;
             }
-            return path;
+            const tag_name = element.nodeName.toLowerCase();
+            const path_segment = `${tag_name}:nth-of-type(${sibling_index})`;
+            path = path_segment + (path ? ' > ' + path : '');
+            element = element.parentElement;
+        }
+        return path;
+    };
+
+    // Find all potential interactive elements
+    document.querySelectorAll(
+        'a, button, input, textarea, select, [role="button"], [onclick]'
+    ).forEach(el => {
+        const selector = create_selector(el);
+        const tag_name = el.tagName.toLowerCase();
+        
+        let element_data = {
+            selector: selector,
+            tag: tag_name,
+            text: el.innerText || el.value || '',
+            aria_label: el.getAttribute('aria-label'),
+            id: el.id,
+            name: el.name,
+            type: el.type,
+            placeholder: el.placeholder,
+            href: el.href,
         };
+        
+        interactive_elements.push(element_data);
+    });
+    return interactive_elements;
+}"""
 
-        // Find all potential interactive elements
-        document.querySelectorAll(
-            'a, button, input, textarea, select, [role="button"], [onclick]'
-        ).forEach(el => {
-            const selector = create_selector(el);
-            const tag_name = el.tagName.toLowerCase();
-            
-            let element_data = {
-                selector: selector,
-                tag: tag_name,
-                text: el.innerText || el.value || '',
-                aria_label: el.getAttribute('aria-label'),
-                id: el.id,
-                name: el.name,
-                type: el.type,
-                placeholder: el.placeholder,
-                href: el.href,
+# JavaScript extracting every form and its fields
+FORMS_JS = """() => {
+    const forms = [];
+    document.querySelectorAll('form').forEach(form_element => {
+        const form_details = {
+            action: form_element.getAttribute('action'),
+            method: form_element.getAttribute('method') || 'post',
+            fields: [],
+        };
+        
+        form_element.querySelectorAll('input, textarea, select').forEach(field => {
+            const tag = field.tagName.toLowerCase();
+            const field_info = {
+                tag: tag,
+                name: field.getAttribute('name'),
+                id: field.getAttribute('id'),
+                type: field.getAttribute('type') || 'text',
+                placeholder: field.getAttribute('placeholder'),
+                label: field.labels && field.labels.length ? field.labels[0].innerText : null,
             };
-            
-            interactive_elements.push(element_data);
+            if (tag === 'select') {
+                field_info['options'] = Array.from(field.options).map(o => ({value: o.value, text: o.innerText}));
+            }
+            form_details.fields.push(field_info);
         });
-        return interactive_elements;
-    }"""
+        forms.push(form_details);
+    });
+    return forms;
+}"""
+
+# One script for ``analyze_page``: title, interactive elements and forms from a
+# single page load. Each part is guarded so one failing extractor does not lose
+# the others. The result is returned (crawl4ai's ``js_execution_result``) and
+# also written into the DOM, where it survives in the returned HTML on
+# crawl4ai versions that do not report script results.
+PAGE_ANALYSIS_JS = f"""(() => {{
+    const safe = (fn) => {{ try {{ return fn(); }} catch (e) {{ return []; }} }};
+    const analysis = {{
+        title: document.title || null,
+        elements: safe({INTERACTIVE_ELEMENTS_JS}),
+        forms: safe({FORMS_JS}),
+    }};
+    const holder = document.createElement('script');
+    holder.type = 'application/json';
+    holder.id = '__page_analysis';
+    holder.textContent = JSON.stringify(analysis);
+    document.body.appendChild(holder);
+    return analysis;
+}})()"""
+
+async def get_interactive_elements_with_crawl4ai(url: str) -> List[Dict[str, Any]]:
+    """
+    Uses crawl4ai to navigate to a URL and extract all interactive elements,
+    including buttons, links, and form fields.
+    """
+    
+    extraction_js = INTERACTIVE_ELEMENTS_JS
 
     try:
-        browser_config = BrowserConfig(
-            headless=True
-        )
         run_config = CrawlerRunConfig(
             cache_mode=CacheMode.BYPASS,
             js_code=extraction_js,
             page_timeout=60000,
-            delay_before_return_html=5.0
+            **await page_settle.crawl_options(url),
         )
 
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            result = await crawler.arun(url=url, config=run_config)
-            if result.success and result.extracted_data:
-                return result.extracted_data
-            elif result.error_message:
-                print(f"Error getting interactive elements from {url} with crawl4ai: {result.error_message}")
-                return []
-            else:
-                return []
+        result = await browser_pool.crawl(url, config=run_config)
+        page_settle.record_result(url, result)
+        if result.success and result.extracted_data:
+            return result.extracted_data
+        elif result.error_message:
+            print(f"Error getting interactive elements from {url} with crawl4ai: {result.error_message}")
+            return []
+        else:
+            return []
 
     except Exception as e:
         print(f"Error getting interactive elements from {url} with crawl4ai: {e}")
@@ -104,60 +157,117 @@ async def analyze_website_forms(url: str) -> List[Dict]:
     """
     # This function can be implemented with selenium if needed, for now it will also use crawl4ai
     
-    extraction_js = """() => {
-        const forms = [];
-        document.querySelectorAll('form').forEach(form_element => {
-            const form_details = {
-                action: form_element.getAttribute('action'),
-                method: form_element.getAttribute('method') || 'post',
-                fields: [],
-            };
-            
-            form_element.querySelectorAll('input, textarea, select').forEach(field => {
-                const tag = field.tagName.toLowerCase();
-                const field_info = {
-                    tag: tag,
-                    name: field.getAttribute('name'),
-                    id: field.getAttribute('id'),
-                    type: field.getAttribute('type') || 'text',
-                    placeholder: field.getAttribute('placeholder'),
-                    label: field.labels ? field.labels[0].innerText : null,
-                };
-                if (tag === 'select') {
-                    field_info['options'] = Array.from(field.options).map(o => ({value: o.value, text: o.innerText}));
-                }
-                form_details.fields.push(field_info);
-            });
-            forms.push(form_details);
-        });
-        return forms;
-    }"""
+    extraction_js = FORMS_JS
     
     try:
-        browser_config = BrowserConfig(
-            headless=True
-        )
         run_config = CrawlerRunConfig(
             cache_mode=CacheMode.BYPASS,
             js_code=extraction_js,
             page_timeout=60000,
-            delay_before_return_html=5.0
+            **await page_settle.crawl_options(url),
         )
 
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            result = await crawler.arun(url=url, config=run_config)
-            if result.success and result.extracted_data:
-                return result.extracted_data
-            elif result.error_message:
-                print(f"Error analyzing forms on {url}: {result.error_message}")
-                return []
-            else:
-                return []
+        result = await browser_pool.crawl(url, config=run_config)
+        page_settle.record_result(url, result)
+        if result.success and result.extracted_data:
+            return result.extracted_data
+        elif result.error_message:
+            print(f"Error analyzing forms on {url}: {result.error_message}")
+            return []
+        else:
+            return []
     except Exception as e:
         print(f"Error analyzing forms on {url}: {e}")
         return []
 
 
+PAGE_ANALYSIS_RE = re.compile(r'<script[^>]*id="__page_analysis"[^>]*>(.*?)</script>', re.S)
+
+
+def _page_analysis_from_result(result) -> Dict[str, Any]:
+    """The object returned by PAGE_ANALYSIS_JS, wherever this crawl4ai version put it."""
+    js_result = getattr(result, "js_execution_result", None) or {}
+    for item in js_result.get("results", []) if isinstance(js_result, dict) else []:
+        value = item.get("result", item) if isinstance(item, dict) else None
+        if isinstance(value, dict) and "elements" in value:
+            return value
+    match = PAGE_ANALYSIS_RE.search(result.html or "")
+    if match:
+        try:
+            return json.loads(match.group(1))
+        except json.JSONDecodeError:
+            pass
+    return {}
+
+
+async def analyze_page(url: str) -> Dict[str, Any]:
+    """
+    Load a page once and return everything the agent needs from it:
+    ``markdown``, ``title``, interactive ``elements`` (same shape as
+    get_interactive_elements_with_crawl4ai) and ``forms`` (same schema as
+    analyze_website_forms).
+
+    Tries a plain HTTP GET first: a page that does not need JavaScript (see
+    tiered_fetch) is analyzed from its HTML (see html_analysis), and only the
+    others are rendered in the browser. Falls back to a plain HTTP fetch
+    (markdown only) if the browser load fails.
+    """
+    if not url or not url.startswith(('http://', 'https://')):
+        return {"success": False, "url": url, "error": f"Invalid URL format: {url}"}
+
+    tier = "browser"
+    if not tiered_fetch.FETCH_HTTP_FIRST:
+        tier = "browser_direct"
+    elif tiered_fetch.known_to_need_js(url):
+        tier = "browser_remembered"
+    else:
+        markdown, page_html, _ = await tiered_fetch.fetch_static_page(url)
+        if markdown is not None:
+            tiered_fetch.served("http")
+            # Parsing a large page takes a while; keep it off the event loop
+            analysis = await asyncio.to_thread(analyze_html, page_html, url) if page_html else {}
+            return {
+                "success": True,
+                "url": url,
+                "title": analysis.get("title"),
+                "markdown": markdown,
+                "elements": analysis.get("elements") or [],
+                "forms": analysis.get("forms") or [],
+            }
+
+    try:
+        run_config = CrawlerRunConfig(
+            cache_mode=CacheMode.BYPASS,
+            js_code=PAGE_ANALYSIS_JS,
+            page_timeout=60000,
+            remove_overlay_elements=True,
+            **await page_settle.crawl_options(url),
+        )
+        result = await browser_pool.crawl(url, config=run_config)
+        page_settle.record_result(url, result)
+        if not result.success:
+            raise Exception(result.error_message)
+
+        analysis = _page_analysis_from_result(result)
+        metadata = result.metadata or {}
+        tiered_fetch.served(tier)
+        return {
+            "success": True,
+            "url": url,
+            "title": metadata.get("title") or analysis.get("title"),
+            "markdown": str(result.markdown or ""),
+            "elements": analysis.get("elements") or [],
+            "forms": analysis.get("forms") or [],
+        }
+    except Exception as e:
+        print(f"Error analyzing page {url}: {e}. Falling back to httpx.")
+        tiered_fetch.served("http_fallback")
+        markdown = await _fallback_httpx(url)
+        if markdown.startswith("Error:"):
+            return {"success": False, "url": url, "error": markdown}
+        return {"success": True, "url": url, "title": None, "markdown": markdown, "elements": [], "forms": []}
+
+
 async def ai_map_fields(forms: List[Dict], booking_data: Dict) -> Dict:
     """
     Map booking_data keys to form fields dynamically using an LLM.
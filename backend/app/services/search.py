@@ -1,11 +1,19 @@
 from app.services.rag_service import search_documents
 
+
+def format_chunk(chunk: dict) -> str:
+    """Render a search hit as a compact, citeable snippet."""
+    location = " > ".join(chunk.get("heading_path") or [])
+    source = chunk.get("source") or "knowledge base"
+    header = f"[{source}{': ' + location if location else ''}]"
+    return f"{header}\n{chunk['text']}"
+
 async def run_search(params: dict) -> dict:
     query = params.get("query", "")
-    results = await search_documents(query)
+    results = await search_documents(query, site_id=params.get("site_id"))
     
     if results:
-        answer = "\n".join(results)
+        answer = "\n\n".join(format_chunk(c) for c in results)
     else:
         answer = "Sorry, I couldn’t find any information about that."
     
@@ -0,0 +1,106 @@
+# backend/app/services/single_flight.py
+"""
+Coalescing of identical concurrent requests ("single flight").
+
+When many widget users ask about the same page at once, only the first
+caller starts the scrape. Everyone else with the same key awaits that same
+task instead of launching another browser session:
+
+- Keys are built with ``request_key``, which normalizes the URL (scheme and
+  host case, default port, fragment, query parameter order), so trivially
+  different spellings of a page share one flight.
+- A caller being cancelled (e.g. its client disconnected) does not cancel
+  the shared task while other callers still wait for it. When the last
+  waiter goes away, the task is cancelled.
+- Exceptions reach every waiter of that flight, but nothing is remembered:
+  the key is free again as soon as the task finishes, so the next call
+  retries. Caching results is left to page_cache.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def request_key(kind: str, url: str, **options: Any) -> Tuple[Hashable, ...]:
+    """Key for a ``kind`` of request on ``url``; options that change the result must be passed."""
+    return (kind, normalize_url(url)) + tuple(sorted(options.items()))
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        # Counters
+        self.started = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.abandoned = 0
+
+    def _finished(self, key: Hashable, flight: _Flight, task: asyncio.Task):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await ``factory()``, or the already running call with the same ``key``."""
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(factory())
+            flight = self._flights[key] = _Flight(task)
+            task.add_done_callback(lambda t, key=key, flight=flight: self._finished(key, flight, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joining in-flight request {key}")
+        flight.waiters += 1
+        try:
+            # shield: cancelling one waiter must not cancel the shared task
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                # Last one interested: stop the work and free the key right away
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                self.abandoned += 1
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+        }
+
+
+# Shared by the scraping entry points (scrape_webpage, markdown fetches)
+scrape_flights = SingleFlight()
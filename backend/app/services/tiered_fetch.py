@@ -0,0 +1,167 @@
+# backend/app/services/tiered_fetch.py
+"""
+HTTP-first page fetching with escalation to the headless browser.
+
+Most pages we read are server-rendered, so a plain GET already has the
+content and a Chromium render is wasted work. ``fetch_static`` tries httpx
+first and runs a "needs JS" detector on the response:
+
+- little visible body text once scripts/styles are stripped,
+- an empty SPA mount point (``#root``, ``#app``, ``#__next``, ``<app-root>``...),
+- a ``<noscript>`` "enable JavaScript" hint on a page without much text,
+- a bot challenge / blocked status (403, 429, 503).
+
+If any fires, the caller escalates to the browser and the host is remembered
+as needing JS for HOST_MEMORY_TTL_S, so later pages of it go straight to the
+browser. ``stats()`` reports how often each tier served a request.
+"""
+import html
+import logging
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+import html2text
+from app.services.http_clients import http_clients
+
+logger = logging.getLogger(__name__)
+
+FETCH_HTTP_FIRST = os.getenv("FETCH_HTTP_FIRST", "true").lower() in ("1", "true", "yes")
+NEEDS_JS_MIN_TEXT = int(os.getenv("NEEDS_JS_MIN_TEXT", "200"))
+HOST_MEMORY_TTL_S = float(os.getenv("HOST_MEMORY_TTL_S", "86400"))
+HTTP_FETCH_TIMEOUT_S = float(os.getenv("HTTP_FETCH_TIMEOUT_S", "10"))
+MAX_REMEMBERED_HOSTS = 2000
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+STRIP_RE = re.compile(r"<(script|style|noscript|template|svg)\b[^>]*>.*?</\1\s*>", re.S | re.I)
+TAG_RE = re.compile(r"<[^>]+>")
+BODY_RE = re.compile(r"<body\b[^>]*>(.*)</body\s*>", re.S | re.I)
+SPA_ROOT_RE = re.compile(
+    r"<(div|main|section)\b[^>]*\bid=[\"'](root|app|__next|__nuxt|svelte|q-app|react-root)[\"'][^>]*>\s*</\1\s*>"
+    r"|<app-root\b[^>]*>\s*</app-root\s*>",
+    re.I,
+)
+NOSCRIPT_HINT_RE = re.compile(r"<noscript\b[^>]*>[^<]{0,200}?(enable|requires?|need)[^<]{0,60}?javascript", re.I)
+CHALLENGE_RE = re.compile(r"cf-browser-verification|challenge-platform|cf-chl-|just a moment\.\.\.", re.I)
+
+# host -> (needs_js, decided_at)
+_host_decisions: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+tier_counts: Counter = Counter()
+escalation_reasons: Counter = Counter()
+
+
+def _host(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+def visible_text(page_html: str) -> str:
+    match = BODY_RE.search(page_html)
+    body = match.group(1) if match else page_html
+    text = TAG_RE.sub(" ", STRIP_RE.sub(" ", body))
+    return re.sub(r"\s+", " ", html.unescape(text)).strip()
+
+
+def needs_js(page_html: str, status_code: int = 200) -> Optional[str]:
+    """Why ``page_html`` must be rendered in a browser, or ``None`` if it is usable as is."""
+    if status_code in (403, 429, 503) or CHALLENGE_RE.search(page_html[:20000]):
+        return "bot challenge"
+    if SPA_ROOT_RE.search(page_html):
+        return "empty SPA root"
+    text_length = len(visible_text(page_html))
+    if text_length < NEEDS_JS_MIN_TEXT:
+        return "little text"
+    if text_length < 4 * NEEDS_JS_MIN_TEXT and NOSCRIPT_HINT_RE.search(page_html):
+        return "noscript hint"
+    return None
+
+
+def html_to_markdown(page_html: str) -> str:
+    h = html2text.HTML2Text()
+    h.ignore_links = True
+    return h.handle(page_html)
+
+
+def known_to_need_js(url: str) -> bool:
+    """True if the host recently needed the browser, so the HTTP attempt can be skipped."""
+    decision = _host_decisions.get(_host(url))
+    return bool(decision and decision[0] and time.monotonic() - decision[1] < HOST_MEMORY_TTL_S)
+
+
+def remember(url: str, needs_browser: bool):
+    host = _host(url)
+    _host_decisions[host] = (needs_browser, time.monotonic())
+    _host_decisions.move_to_end(host)
+    if len(_host_decisions) > MAX_REMEMBERED_HOSTS:
+        _host_decisions.popitem(last=False)
+
+
+def served(tier: str):
+    """Count a request served by ``tier``.
+
+    ``http`` (no browser needed), ``browser`` (escalated after the HTTP try),
+    ``browser_remembered`` (host known to need JS), ``browser_direct`` (page
+    scripts/wait conditions requested) or ``http_fallback`` (browser failed).
+    """
+    tier_counts[tier] += 1
+
+
+async def fetch_static(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """Try to get ``url`` as markdown without a browser.
+
+    Returns ``(markdown, None)`` when the static response is good enough, or
+    ``(None, reason)`` when the caller should escalate to the browser.
+    """
+    markdown, _, reason = await fetch_static_page(url)
+    return markdown, reason
+
+
+async def fetch_static_page(url: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Like ``fetch_static``, but also returns the HTML: ``(markdown, html, reason)``.
+
+    ``html`` is ``None`` for plain-text responses and whenever ``markdown`` is.
+    """
+    try:
+        response = await http_clients.get(url).get(url, follow_redirects=True, timeout=HTTP_FETCH_TIMEOUT_S,
+                                                   headers={"User-Agent": USER_AGENT})
+    except Exception as e:
+        reason = f"http error: {type(e).__name__}"
+        escalation_reasons[reason] += 1
+        return None, None, reason
+
+    content_type = response.headers.get("content-type", "")
+    if "html" not in content_type and content_type.startswith("text/") and response.is_success:
+        remember(url, False)
+        return response.text, None, None
+    if "html" not in content_type:
+        reason = f"unsupported content type {content_type.split(';')[0] or 'unknown'}"
+    elif not response.is_success and response.status_code not in (403, 429, 503):
+        reason = f"status {response.status_code}"
+    else:
+        reason = needs_js(response.text, response.status_code)
+        # Only page-level signals say anything about the host as a whole.
+        remember(url, reason is not None)
+        if reason is None:
+            return html_to_markdown(response.text), response.text, None
+
+    escalation_reasons[reason] += 1
+    logger.info(f"🔼 Escalating {url} to the browser: {reason}.")
+    return None, None, reason
+
+
+def stats() -> dict:
+    total = sum(tier_counts.values())
+    return {
+        "http_first": FETCH_HTTP_FIRST,
+        "tiers": dict(tier_counts),
+        "http_share": round(tier_counts["http"] / total, 4) if total else 0.0,
+        "escalation_reasons": dict(escalation_reasons.most_common(20)),
+        "hosts_needing_js": sum(1 for needs, _ in _host_decisions.values() if needs),
+        "hosts_static": sum(1 for needs, _ in _host_decisions.values() if not needs),
+    }
@@ -0,0 +1,226 @@
+"""
+FAISS index factory for the RAG store.
+
+Vectors are always addressed by document id, whatever the underlying structure:
+
+- ``flat``: exact brute-force L2 search (``IndexFlatL2`` in an ``IndexIDMap2``).
+            Best for small corpora.
+- ``ivf``:  inverted lists over a k-means coarse quantizer (``IndexIVFFlat``,
+            which stores ids natively). Needs training, so it is only built
+            once enough vectors exist.
+- ``hnsw``: navigable small-world graph (``IndexHNSWFlat`` in an
+            ``IndexIDMap2``). No training, but no in-place removal either, so
+            removals rebuild.
+
+Independently, vectors can be stored compressed (the "codec"):
+
+- ``none``: float32, 4 bytes per dimension.
+- ``fp16``: scalar-quantized to float16, 2 bytes per dimension. No training.
+- ``sq8``:  scalar-quantized to 8 bits per dimension (per-dimension min/max
+            trained on the corpus), 1 byte per dimension.
+- ``pq``:   product-quantized into ``RAG_PQ_M`` sub-vectors of 8 bits each,
+            i.e. ``RAG_PQ_M`` bytes per vector. Needs k-means training.
+
+Compressed codes are lossy, so indexes holding them are rebuilt from the exact
+vectors kept in the document log rather than from their own reconstructions.
+"""
+import logging
+import math
+import os
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+# Below this many vectors an exact flat scan is both fast and cheaper to keep
+# up to date, so approximate structures are only built past the threshold.
+ANN_MIN_VECTORS = int(os.getenv("RAG_ANN_MIN_VECTORS", "10000"))
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+
+CODECS = ("none", "fp16", "sq8", "pq")
+
+# Trained codecs are only used once there is enough data to train them well;
+# PQ additionally wants ~39 points per centroid of its 256-entry codebooks.
+COMPRESS_MIN_VECTORS = int(os.getenv("RAG_COMPRESS_MIN_VECTORS", "1000"))
+PQ_M = int(os.getenv("RAG_PQ_M", "48"))
+PQ_MIN_VECTORS = max(COMPRESS_MIN_VECTORS, 39 * 256)
+
+
+def ivf_nlist(n_vectors: int) -> int:
+    """Number of IVF lists for a corpus: ~4*sqrt(n), with >= 39 training points per list."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def target_kind(configured: str, n_vectors: int) -> str:
+    """Index type that should be used for a corpus of ``n_vectors``."""
+    if configured not in INDEX_TYPES:
+        logger.warning(f"⚠️ Unknown RAG index type '{configured}', using flat.")
+        return "flat"
+    if configured != "flat" and n_vectors < ANN_MIN_VECTORS:
+        return "flat"
+    return configured
+
+
+def target_codec(configured: str, n_vectors: int) -> str:
+    """Vector codec that should be used for a corpus of ``n_vectors``."""
+    if configured not in CODECS:
+        logger.warning(f"⚠️ Unknown RAG vector codec '{configured}', storing float32.")
+        return "none"
+    if configured == "sq8" and n_vectors < COMPRESS_MIN_VECTORS:
+        return "none"
+    if configured == "pq" and n_vectors < PQ_MIN_VECTORS:
+        return "none"
+    return configured
+
+
+def pq_m(dim: int) -> int:
+    """Number of PQ sub-quantizers: the largest value <= RAG_PQ_M that divides ``dim``."""
+    return next(m for m in range(min(PQ_M, dim), 0, -1) if dim % m == 0)
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_kind(index: faiss.Index) -> str:
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_codec(index: faiss.Index) -> str:
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base = faiss.downcast_index(base.storage)
+    if isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(base, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "none"
+
+
+def bytes_per_vector(index: faiss.Index) -> int:
+    """Approximate resident bytes per stored vector: code, id maps and graph links."""
+    dim = index.d
+    code = {"none": 4 * dim, "fp16": 2 * dim, "sq8": dim, "pq": pq_m(dim)}[index_codec(index)]
+    links = 2 * HNSW_M * 4 if index_kind(index) == "hnsw" else 0
+    return code + links + 64
+
+
+def configure(index: faiss.Index):
+    """Apply search-time parameters (they are not always persisted)."""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(IVF_NPROBE, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+
+
+def excluding(ids) -> faiss.IDSelector:
+    """Selector matching every id except ``ids``, for ``search``."""
+    batch = faiss.IDSelectorBatch(np.asarray(ids, dtype="int64"))
+    selector = faiss.IDSelectorNot(batch)
+    selector.referenced_objects = [batch]  # the C++ selector only borrows ``batch``
+    return selector
+
+
+def search(index: faiss.Index, vectors: np.ndarray, k: int, selector: faiss.IDSelector = None):
+    """``index.search``, optionally restricted to ``selector``, with the configured nprobe / efSearch."""
+    if selector is None:
+        return index.search(vectors, k)
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # Built per call: IndexIDMap temporarily rewrites ``params.sel`` while searching.
+    return index.search(vectors, k, params=params)
+
+
+def _factory_string(kind: str, dim: int, n_vectors: int, codec: str) -> str:
+    storage = {"none": "Flat", "fp16": "SQfp16", "sq8": "SQ8", "pq": f"PQ{pq_m(dim)}x8"}[codec]
+    if kind == "ivf":
+        return f"IVF{ivf_nlist(n_vectors)},{storage}"
+    if kind == "hnsw":
+        # HNSW+PQ takes the sub-quantizer count only (always 8 bits).
+        return f"HNSW{HNSW_M},{storage[:-2] if codec == 'pq' else storage}"
+    return storage
+
+
+def create_index(kind: str, dim: int, n_vectors: int = 0, codec: str = "none") -> faiss.Index:
+    """Create an empty id-mapped index of ``kind`` sized for ``n_vectors``, storing ``codec`` codes."""
+    index = faiss.index_factory(dim, _factory_string(kind, dim, n_vectors, codec), faiss.METRIC_L2)
+    if kind == "ivf":
+        # IVF indexes store ids natively. Hashtable direct map: reconstruct by
+        # id while still allowing removals.
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        if kind == "hnsw":
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index = faiss.IndexIDMap2(index)
+    configure(index)
+    return index
+
+
+def extract_vectors(index: faiss.Index, ids) -> np.ndarray:
+    """Reconstruct the stored vectors for ``ids`` (in that order); lossy for compressed codecs."""
+    ids = np.asarray(ids, dtype="int64")
+    if len(ids) == 0:
+        return np.empty((0, index.d), dtype="float32")
+    return np.asarray(index.reconstruct_batch(ids), dtype="float32")
+
+
+def build_index(kind: str, dim: int, ids: np.ndarray, vectors: np.ndarray, codec: str = "none") -> faiss.Index:
+    """Build (and train, if needed) an index of ``kind`` holding ``vectors`` under ``ids``."""
+    index = create_index(kind, dim, len(ids), codec)
+    if len(ids) == 0:
+        return index
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def needs_rebuild(index: faiss.Index, configured: str, codec: str = "none", exact: bool = False) -> bool:
+    """True if the index type or codec no longer matches the corpus size, or IVF lists are badly undersized.
+
+    With ``exact`` the index must be exactly ``configured`` / ``codec``, whatever the corpus size.
+    """
+    n = index.ntotal
+    kind = index_kind(index)
+    wanted_kind = configured if exact else target_kind(configured, n)
+    wanted_codec = codec if exact else target_codec(codec, n)
+    if kind != wanted_kind or index_codec(index) != wanted_codec:
+        return True
+    if kind == "ivf":
+        return _base_index(index).nlist * 4 < ivf_nlist(n)
+    return False
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray, keep_ids: np.ndarray, vectors_fn=None) -> faiss.Index:
+    """Remove ``ids`` from ``index``; returns the index to use afterwards.
+
+    Structures without in-place removal (HNSW) are rebuilt from ``keep_ids``,
+    whose vectors come from ``vectors_fn(ids)`` (default: reconstructed from
+    the index itself).
+    """
+    try:
+        index.remove_ids(np.asarray(ids, dtype="int64"))
+        return index
+    except RuntimeError:
+        keep_ids = np.asarray(keep_ids, dtype="int64")
+        vectors = (vectors_fn or (lambda i: extract_vectors(index, i)))(keep_ids)
+        codec = target_codec(index_codec(index), len(keep_ids))
+        return build_index(index_kind(index), index.d, keep_ids, vectors, codec)
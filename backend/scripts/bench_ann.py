@@ -0,0 +1,89 @@
+"""
+Recall@k vs. latency benchmark for the RAG index types on synthetic vectors.
+
+Vectors are drawn from a mixture of gaussians (closer to real sentence
+embeddings than uniform noise) with the production dimension of 384.
+Ground truth comes from an exact flat search. Run from the backend directory:
+
+    python scripts/bench_ann.py --sizes 10000 100000 1000000
+
+The 1M run needs ~1.5 GB for the raw vectors plus the index itself.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import vector_index  # noqa: E402
+
+DIM = 384
+
+
+def synthetic_vectors(n: int, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((n_clusters, DIM)).astype("float32")
+    labels = rng.integers(0, n_clusters, size=n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype("float32")
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(n: int, n_queries: int, k: int, seed: int):
+    rng = np.random.default_rng(seed)
+    n_clusters = max(16, int(np.sqrt(n)))
+    data = synthetic_vectors(n + n_queries, n_clusters, rng)
+    base, queries = data[:n], data[n:]
+    ids = np.arange(n, dtype="int64")
+
+    truth = None
+    print(f"\n=== n={n:,}  queries={n_queries}  k={k} ===")
+    print(f"{'index':<6} {'build s':>9} {'p50 ms':>8} {'p95 ms':>8} {'batch ms/q':>11} {'recall@k':>9}")
+    for kind in vector_index.INDEX_TYPES:
+        started = time.perf_counter()
+        index = vector_index.build_index(kind, DIM, ids, base)
+        build_s = time.perf_counter() - started
+
+        # Single-query latency, as served to one chat request.
+        latencies = []
+        found = np.empty((n_queries, k), dtype="int64")
+        for i in range(n_queries):
+            t0 = time.perf_counter()
+            _, I = index.search(queries[i:i + 1], k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            found[i] = I[0]
+
+        # Batched throughput, as served by the embedding batcher.
+        t0 = time.perf_counter()
+        index.search(queries, k)
+        batch_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+        if truth is None:
+            truth = found  # flat runs first and is exact
+        print(f"{kind:<6} {build_s:>9.2f} {np.percentile(latencies, 50):>8.3f} "
+              f"{np.percentile(latencies, 95):>8.3f} {batch_ms:>11.4f} {recall_at_k(found, truth):>9.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"IVF nprobe={vector_index.IVF_NPROBE}  HNSW M={vector_index.HNSW_M} "
+          f"efSearch={vector_index.HNSW_EF_SEARCH}")
+    for n in args.sizes:
+        run(n, args.queries, args.k, args.seed)
+
+
+if __name__ == "__main__":
+    main()
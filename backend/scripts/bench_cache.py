@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the in-process caches: ``TTLCache`` vs ``LRUCache``.
+
+Each cache is filled to capacity with scrape-sized values, then timed on
+inserts of new keys (every one forces an eviction) and on lookups with the
+given hit ratio. ``LRUCache`` is measured with an entry limit only and with an
+equivalent byte budget. Run from the backend directory:
+
+    python scripts/bench_cache.py --sizes 128 1024 8192
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache import LRUCache, TTLCache, approx_size  # noqa: E402
+
+
+def make_value(i: int, value_kb: int) -> dict:
+    return {"url": f"https://example.com/page/{i}", "markdown": "x" * (value_kb * 1024), "forms": [{"id": i}]}
+
+
+def bench(name: str, cache, capacity: int, ops: int, value_kb: int, hit_ratio: float, seed: int):
+    rng = random.Random(seed)
+    values = [make_value(i, value_kb) for i in range(64)]
+    for i in range(capacity):
+        cache.set(f"k{i}", values[i % 64])
+
+    started = time.perf_counter()
+    for i in range(capacity, capacity + ops):
+        cache.set(f"k{i}", values[i % 64])
+    set_us = (time.perf_counter() - started) * 1e6 / ops
+
+    newest = capacity + ops
+    keys = [
+        f"k{rng.randrange(newest - capacity // 2, newest)}" if rng.random() < hit_ratio else f"missing{i}"
+        for i in range(ops)
+    ]
+    started = time.perf_counter()
+    hits = sum(1 for key in keys if cache.get(key) is not None)
+    get_us = (time.perf_counter() - started) * 1e6 / ops
+
+    print(f"{name:<18} {capacity:>8,} {set_us:>12.2f} {get_us:>12.2f} {hits / ops:>9.2f} {len(cache._store):>8,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[128, 1024, 8192], help="cache capacities (entries)")
+    parser.add_argument("--ops", type=int, default=2000, help="timed inserts and lookups per cache")
+    parser.add_argument("--value-kb", type=int, default=4, help="size of each cached value")
+    parser.add_argument("--hit-ratio", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    value_bytes = approx_size(make_value(0, args.value_kb))
+    print(f"{'cache':<18} {'capacity':>8} {'set us/op':>12} {'get us/op':>12} {'hit rate':>9} {'entries':>8}")
+    for capacity in args.sizes:
+        bench("TTLCache", TTLCache(default_ttl=300, max_size=capacity),
+              capacity, args.ops, args.value_kb, args.hit_ratio, args.seed)
+        bench("LRUCache", LRUCache(max_size=capacity, default_ttl=300),
+              capacity, args.ops, args.value_kb, args.hit_ratio, args.seed)
+        bench("LRUCache (bytes)", LRUCache(max_size=10 * capacity, default_ttl=300, max_bytes=capacity * value_bytes),
+              capacity, args.ops, args.value_kb, args.hit_ratio, args.seed)
+
+
+if __name__ == "__main__":
+    main()
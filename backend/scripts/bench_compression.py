@@ -0,0 +1,79 @@
+"""
+Memory / latency / recall benchmark for the RAG vector codecs on synthetic vectors.
+
+Every codec is built on the same data and index type and compared with an
+exact float32 flat search: memory is the serialized index size, recall@k is
+measured against the exact neighbours. Run from the backend directory:
+
+    python scripts/bench_compression.py --sizes 10000 100000
+    python scripts/bench_compression.py --type hnsw --sizes 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import vector_index  # noqa: E402
+from bench_ann import DIM, recall_at_k, synthetic_vectors  # noqa: E402
+
+
+def run(kind: str, n: int, n_queries: int, k: int, seed: int):
+    rng = np.random.default_rng(seed)
+    n_clusters = max(16, int(np.sqrt(n)))
+    data = synthetic_vectors(n + n_queries, n_clusters, rng)
+    base, queries = data[:n], data[n:]
+    ids = np.arange(n, dtype="int64")
+
+    exact = vector_index.build_index("flat", DIM, ids, base)
+    _, truth = exact.search(queries, k)
+    flat_mb = len(faiss.serialize_index(exact)) / (1024 * 1024)
+
+    print(f"\n=== {kind}  n={n:,}  queries={n_queries}  k={k} ===")
+    print(f"{'codec':<6} {'build s':>9} {'MB':>9} {'ratio':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'batch ms/q':>11} {'recall@k':>9} {'loss':>7}")
+    for codec in vector_index.CODECS:
+        started = time.perf_counter()
+        index = vector_index.build_index(kind, DIM, ids, base, codec)
+        build_s = time.perf_counter() - started
+        size_mb = len(faiss.serialize_index(index)) / (1024 * 1024)
+
+        latencies = []
+        found = np.empty((n_queries, k), dtype="int64")
+        for i in range(n_queries):
+            t0 = time.perf_counter()
+            _, I = index.search(queries[i:i + 1], k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            found[i] = I[0]
+
+        t0 = time.perf_counter()
+        index.search(queries, k)
+        batch_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+        recall = recall_at_k(found, truth)
+        print(f"{codec:<6} {build_s:>9.2f} {size_mb:>9.2f} {flat_mb / size_mb:>6.1f}x "
+              f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 95):>8.3f} "
+              f"{batch_ms:>11.4f} {recall:>9.4f} {1 - recall:>7.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--type", choices=vector_index.INDEX_TYPES, default="flat")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"PQ sub-quantizers={vector_index.pq_m(DIM)}x8 bits  IVF nprobe={vector_index.IVF_NPROBE}  "
+          f"HNSW M={vector_index.HNSW_M} efSearch={vector_index.HNSW_EF_SEARCH}")
+    for n in args.sizes:
+        run(args.type, n, args.queries, args.k, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark of a new ``httpx.AsyncClient`` per request against the pooled
+clients of ``http_clients`` on a local stub HTTPS server.
+
+The stub speaks HTTP/1.1 with keep-alive over TLS (self-signed certificate
+generated with ``openssl``; plain HTTP with ``--plain``) and counts the
+connections it accepts, so the handshakes saved by pooling show directly.
+``--rtt-ms`` adds a simulated network round trip: two per new connection
+(TCP + TLS 1.3 handshake) and one per request. Run from the backend directory:
+
+    python scripts/bench_http_clients.py --requests 200 --concurrency 1 10
+    python scripts/bench_http_clients.py --rtt-ms 20
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.http_clients import HttpClients  # noqa: E402
+
+BODY = b'{"choices": [{"message": {"content": "ok"}}]}'
+
+
+class StubServer:
+    def __init__(self, rtt_s: float, tls: bool):
+        self.rtt_s = rtt_s
+        self.tls = tls
+        self.connections = 0
+        self.requests = 0
+        self.cert_dir = tempfile.mkdtemp()
+
+    def _certificate(self):
+        cert, key = os.path.join(self.cert_dir, "cert.pem"), os.path.join(self.cert_dir, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+             "-days", "1", "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"],
+            check=True, capture_output=True,
+        )
+        return cert, key
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(2 * self.rtt_s)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.rtt_s)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\nConnection: keep-alive\r\n\r\n%s" % (len(BODY), BODY))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        context = None
+        if self.tls:
+            cert, key = self._certificate()
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(cert, key)
+            self.client_context = ssl.create_default_context(cafile=cert)
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=context)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"{'https' if self.tls else 'http'}://localhost:{port}/openai/v1/chat/completions"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(name, server, call, n, concurrency):
+    server.connections = 0
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            t0 = time.perf_counter()
+            response = await call()
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    total = time.perf_counter() - started
+    print(f"{name:<16} {concurrency:>5} {n / total:>10.1f} {sum(latencies) / n:>9.2f} "
+          f"{percentile(latencies, 0.5):>9.2f} {percentile(latencies, 0.95):>9.2f} {server.connections:>12}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network round trip")
+    parser.add_argument("--plain", action="store_true", help="plain HTTP instead of TLS")
+    args = parser.parse_args()
+
+    server = StubServer(args.rtt_ms / 1000, tls=not args.plain)
+    url = await server.start()
+    verify = server.client_context if server.tls else True
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "hi"}]}
+
+    async def per_call():
+        async with httpx.AsyncClient(verify=verify) as client:
+            return await client.post(url, json=payload)
+
+    clients = HttpClients(host_limits={}, verify=verify)
+
+    async def pooled():
+        return await clients.get(url).post(url, json=payload)
+
+    print(f"stub: {url}  rtt={args.rtt_ms} ms  requests={args.requests}")
+    print(f"{'mode':<16} {'conc':>5} {'req/s':>10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'connections':>12}")
+    for concurrency in args.concurrency:
+        await run("client per call", server, per_call, args.requests, concurrency)
+        await run("pooled", server, pooled, args.requests, concurrency)
+    await clients.close()
+    server.server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Checks that an index type / codec chosen with ``rebuild_index.py`` survives
+reloads and writes, and that an explicit RAG_INDEX_TYPE / RAG_VECTOR_CODEC
+still wins over it.
+
+Uses random vectors in a temporary storage directory (no embedding model).
+Run from the backend directory:
+
+    python scripts/check_index_settings.py
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+os.environ["RAG_STORAGE_DIR"] = tempfile.mkdtemp(prefix="rag-settings-")
+os.environ.pop("RAG_INDEX_TYPE", None)
+os.environ.pop("RAG_VECTOR_CODEC", None)
+os.environ["RAG_DELTA_MIN_DOCS"] = "16"  # writes below merge into the base, which re-checks the structure
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services import rag_service, vector_index  # noqa: E402
+
+N_VECTORS = 2000
+
+
+def check(name, condition, detail=""):
+    print(f"{'PASS' if condition else 'FAIL'}  {name}  {detail}")
+    if not condition:
+        check.failed += 1
+
+
+check.failed = 0
+
+
+def structure(kb) -> str:
+    return f"{vector_index.index_kind(kb.index)}/{vector_index.index_codec(kb.index)}"
+
+
+def reloaded(kb):
+    kb.close()
+    fresh = rag_service.KnowledgeIndex(kb.name, kb.directory)
+    fresh.load()
+    return fresh
+
+
+async def add_chunks(kb, rng, n: int):
+    chunks = [{"text": f"chunk {i}", "source": f"doc-{i % 20}", "heading_path": []} for i in range(n)]
+    await kb.add(chunks, rng.random((n, rag_service.embedding_dim), dtype="float32"), save=False)
+
+
+def rebuild_script(*args, **env) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "scripts", "rebuild_index.py"), *args],
+                          cwd=BACKEND_DIR, env={**os.environ, **env}, capture_output=True, text=True)
+
+
+async def main():
+    rng = np.random.default_rng(0)
+    kb = rag_service.default_index
+    kb.load()
+    await add_chunks(kb, rng, N_VECTORS)
+    kb.save()
+    check("defaults to flat/none", structure(kb) == "flat/none", structure(kb))
+
+    for args, expected in ((["--type", "hnsw"], "hnsw/none"), (["--codec", "sq8"], "hnsw/sq8"),
+                           (["--type", "ivf"], "ivf/sq8")):
+        result = rebuild_script(*args)
+        kb = reloaded(kb)
+        check(f"rebuild {' '.join(args)} holds after reload", result.returncode == 0 and structure(kb) == expected,
+              structure(kb) if result.returncode == 0 else result.stderr.strip()[-200:])
+        await add_chunks(kb, rng, 64)
+        check(f"rebuild {' '.join(args)} holds after writes", structure(kb) == expected, structure(kb))
+        kb.save()
+
+    result = rebuild_script("--type", "hnsw", RAG_INDEX_TYPE="flat")
+    check("conflicting explicit RAG_INDEX_TYPE is refused", result.returncode == 2, result.stderr.strip())
+
+    kb.close()
+    os.environ["RAG_VECTOR_CODEC"] = "none"
+    fresh = subprocess.run(
+        [sys.executable, "-c", "from app.services import rag_service as r; r.load_default_index(); "
+                               "from app.services import vector_index as v; "
+                               "print(v.index_kind(r.default_index.index), v.index_codec(r.default_index.index))"],
+        cwd=BACKEND_DIR, env=os.environ, capture_output=True, text=True,
+    )
+    check("explicit RAG_VECTOR_CODEC wins over the saved codec", fresh.stdout.split() == ["ivf", "none"],
+          fresh.stdout.strip() or fresh.stderr.strip()[-200:])
+    del os.environ["RAG_VECTOR_CODEC"]
+
+    result = rebuild_script("--reset")
+    kb = rag_service.KnowledgeIndex("default", kb.directory)
+    kb.load()
+    check("--reset follows the environment again", result.returncode == 0 and structure(kb) == "flat/none",
+          structure(kb))
+    kb.close()
+
+    print("all checks passed" if not check.failed else f"{check.failed} check(s) failed")
+    return check.failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
@@ -0,0 +1,175 @@
+"""
+Checks the LLM gateway (``app/services/llm_gateway.py``) against a local fake
+LLM server that replays scripted responses: 429 with ``retry-after``, 5xx,
+rate-limit headers, slow and streamed responses.
+
+The gateway is installed the same way ``llm_provider`` installs it, through
+``HttpClients.wrap_transport``. Run from the backend directory:
+
+    python scripts/check_llm_gateway.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.http_clients import HttpClients  # noqa: E402
+from app.services.llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailableError  # noqa: E402
+
+OK_BODY = b'{"choices": [{"message": {"content": "ok"}}]}'
+
+
+class FakeLLM:
+    """HTTP/1.1 server answering from a script of (status, headers, delay_s), then 200s."""
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.delay_s = 0.0
+        self.chunks = 0
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                status, headers, delay = self.script.pop(0) if self.script else (200, {}, self.delay_s)
+                await asyncio.sleep(delay)
+                self.active -= 1
+                extra = "".join(f"{name}: {value}\r\n" for name, value in headers.items()).encode()
+                if self.chunks:
+                    writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n" + extra + b"\r\n")
+                    for _ in range(self.chunks):
+                        writer.write(b"%x\r\n%s\r\n" % (len(OK_BODY), OK_BODY))
+                        await writer.drain()
+                        await asyncio.sleep(0.05)
+                    writer.write(b"0\r\n\r\n")
+                else:
+                    body = OK_BODY if status == 200 else b'{"error": {"message": "scripted"}}'
+                    writer.write(b"HTTP/1.1 %d X\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n%s"
+                                 % (status, len(body), extra, body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/openai/v1/chat/completions"
+
+
+registries = []
+
+
+def client_for(url, gateway):
+    clients = HttpClients(host_limits={})
+    clients.wrap_transport("127.0.0.1", gateway.transport)
+    registries.append(clients)
+    return clients.get(url)
+
+
+def check(name, condition, detail=""):
+    print(f"{'PASS' if condition else 'FAIL'}  {name}  {detail}")
+    if not condition:
+        check.failed += 1
+
+
+check.failed = 0
+
+
+async def main():
+    server = FakeLLM()
+    url = await server.start()
+    payload = {"model": "fake", "messages": [{"role": "user", "content": "hi"}]}
+
+    # 429 with retry-after: waits as told, then succeeds
+    gateway = LLMGateway(max_retries=3)
+    client = client_for(url, gateway)
+    server.script = [(429, {"retry-after": "1"}, 0)]
+    started = time.monotonic()
+    response = await client.post(url, json=payload)
+    elapsed = time.monotonic() - started
+    check("429 retried after retry-after", response.status_code == 200 and 1.0 <= elapsed < 1.5,
+          f"status={response.status_code} elapsed={elapsed:.2f}s stats={gateway.stats()['rate_limited']} rate-limited")
+
+    # 5xx: jittered backoff, then succeeds
+    server.script = [(503, {}, 0), (502, {}, 0)]
+    response = await client.post(url, json=payload)
+    check("5xx retried with backoff", response.status_code == 200 and gateway.counters["upstream_errors"] == 2,
+          f"retries={gateway.counters['retries']}")
+
+    # Retries exhausted: the last error response is returned to the caller
+    server.script = [(500, {}, 0)] * 4
+    response = await client.post(url, json=payload)
+    check("gives up after max retries", response.status_code == 500 and gateway.counters["gave_up"] == 1)
+
+    # Pacing: the server says no requests are left for 0.5s
+    gateway = LLMGateway(max_retries=0)
+    client = client_for(url, gateway)
+    server.script = [(200, {"x-ratelimit-limit-requests": "10", "x-ratelimit-remaining-requests": "0",
+                            "x-ratelimit-reset-requests": "500ms"}, 0)]
+    await client.post(url, json=payload)
+    started = time.monotonic()
+    await client.post(url, json=payload)
+    elapsed = time.monotonic() - started
+    check("paced from rate-limit headers", 0.03 <= elapsed < 0.5, f"waited={elapsed:.3f}s paced_s={gateway.paced_s:.3f}")
+
+    # Concurrency cap, including streamed responses that hold their slot until closed
+    gateway = LLMGateway(max_concurrency=2, max_retries=0)
+    client = client_for(url, gateway)
+    server.max_active, server.delay_s = 0, 0.2
+    started = time.monotonic()
+    await asyncio.gather(*(client.post(url, json=payload) for _ in range(6)))
+    elapsed = time.monotonic() - started
+    check("concurrency capped", server.max_active == 2 and elapsed >= 0.6,
+          f"max_active={server.max_active} elapsed={elapsed:.2f}s")
+    server.delay_s, server.chunks = 0.0, 3
+    async with client.stream("POST", url, json=payload) as response:
+        held = gateway.in_flight
+        async for _ in response.aiter_bytes():
+            pass
+    check("stream holds its slot until closed", held == 1 and gateway.in_flight == 0)
+    server.chunks = 0
+
+    # Circuit breaker: opens after 3 failures, fails fast, recovers after the cooldown
+    gateway = LLMGateway(max_retries=0, breaker=CircuitBreaker(threshold=3, cooldown_s=0.5))
+    client = client_for(url, gateway)
+    server.script = [(500, {}, 0)] * 3
+    for _ in range(3):
+        await client.post(url, json=payload)
+    before = server.requests
+    started = time.monotonic()
+    try:
+        await client.post(url, json=payload)
+        failed_fast = False
+    except LLMUnavailableError:
+        failed_fast = True
+    check("breaker fails fast", failed_fast and server.requests == before and time.monotonic() - started < 0.05,
+          f"state={gateway.breaker.state}")
+    await asyncio.sleep(0.5)
+    response = await client.post(url, json=payload)
+    check("breaker closes after a good trial call", response.status_code == 200 and gateway.breaker.state == "closed")
+
+    for clients in registries:
+        await clients.close()
+    await asyncio.sleep(0.05)
+    server.server.close()
+    print("all checks passed" if not check.failed else f"{check.failed} check(s) failed")
+    return check.failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
@@ -0,0 +1,64 @@
+"""
+Rebuild (migrate) the persisted RAG index to another FAISS structure or vector codec.
+
+Vectors are taken from the current index (latest snapshot plus log replay),
+or from the log when the index holds lossy compressed codes, so nothing is
+re-embedded. A legacy ``storage/index.faiss`` is imported into the log on
+the first load, so this also converts it. A new snapshot is written
+afterwards. The chosen type / codec is saved with the snapshot and kept by
+later loads and writes; ``--reset`` goes back to following RAG_INDEX_TYPE /
+RAG_VECTOR_CODEC. When those are set explicitly they always win, so a
+conflicting ``--type`` / ``--codec`` is refused. Run from the backend directory:
+
+    python scripts/rebuild_index.py --type hnsw
+    python scripts/rebuild_index.py --codec sq8
+    python scripts/rebuild_index.py --type ivf --codec pq --site <site_id>
+    python scripts/rebuild_index.py --reset
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import rag_service, vector_index  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--type", choices=vector_index.INDEX_TYPES, default=None,
+                        help="Target index type (default: what RAG_INDEX_TYPE calls for at the current size)")
+    parser.add_argument("--codec", choices=vector_index.CODECS, default=None,
+                        help="Target vector codec (default: what RAG_VECTOR_CODEC calls for at the current size)")
+    parser.add_argument("--reset", action="store_true",
+                        help="Forget a previously chosen type/codec and follow RAG_INDEX_TYPE / RAG_VECTOR_CODEC again")
+    parser.add_argument("--site", default=None, help="Site id whose index to rebuild (default: shared knowledge base)")
+    args = parser.parse_args()
+
+    conflicts = [
+        f"{name}={configured} overrides --{flag} {wanted}"
+        for name, explicit, configured, flag, wanted in (
+            ("RAG_INDEX_TYPE", rag_service.INDEX_TYPE_EXPLICIT, rag_service.INDEX_TYPE, "type", args.type),
+            ("RAG_VECTOR_CODEC", rag_service.VECTOR_CODEC_EXPLICIT, rag_service.VECTOR_CODEC, "codec", args.codec),
+        )
+        if explicit and wanted and wanted != configured
+    ]
+    if conflicts:
+        parser.exit(2, "Refusing to rebuild: " + "; ".join(conflicts) + ", so the next load would migrate the index "
+                       "back. Unset or change the environment variable instead.\n")
+
+    if args.site:
+        kb = rag_service.KnowledgeIndex(args.site, rag_service._site_directory(args.site))
+        kb.load()
+    else:
+        rag_service.load_default_index()
+        kb = rag_service.default_index
+    kb.rebuild(args.type, args.codec, reset=args.reset)
+    kb.save(force=True)
+    print(f"Index snapshot in {kb.snapshot_dir} is now {vector_index.index_kind(kb.index)}/"
+          f"{vector_index.index_codec(kb.index)} with {kb.index.ntotal} vectors "
+          f"(~{kb.memory_bytes() / (1024 * 1024):.1f} MB resident).")
+
+
+if __name__ == "__main__":
+    main()
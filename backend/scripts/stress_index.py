@@ -0,0 +1,131 @@
+"""
+Concurrency stress run for the RAG index: concurrent add / remove / search / save.
+
+Uses a deterministic fake embedder (no model download) and a temporary
+storage directory. Throughout the run every search checks that the
+generation it read is internally consistent (each vector hit has its
+document, the FAISS, document and BM25 counts agree). A low delta threshold
+makes writes alternate between delta updates and merges. At the end, the index
+reloaded from disk must match the in-memory one. Run from the backend
+directory:
+
+    python scripts/stress_index.py --seconds 20 --writers 4 --readers 16
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+import numpy as np
+
+os.environ["RAG_STORAGE_DIR"] = tempfile.mkdtemp(prefix="rag-stress-")
+os.environ.setdefault("RAG_SNAPSHOT_DEBOUNCE_S", "0.05")
+os.environ.setdefault("RAG_DELTA_MIN_DOCS", "16")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import rag_service  # noqa: E402
+
+WORDS = "dental cleaning whitening price booking hours contact phone insurance parking".split()
+
+
+class FakeEmbedder:
+    """Vectors derived from a checksum of the text, so equal texts embed equally."""
+
+    def encode(self, texts):
+        return np.stack([
+            np.random.default_rng(zlib.crc32(text.encode("utf-8"))).random(rag_service.embedding_dim)
+            for text in texts
+        ]).astype("float32")
+
+
+def random_document(rng: random.Random) -> str:
+    sections = []
+    for s in range(rng.randint(1, 4)):
+        body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+        sections.append(f"## Section {s}\n{body} {rng.randint(0, 10**6)}")
+    return "\n\n".join(sections)
+
+
+def check_generation(generation):
+    documents = generation.documents
+    assert generation.ntotal == len(documents), (generation.ntotal, len(documents))
+    assert len(generation.lexical) == len(documents), (len(generation.lexical), len(documents))
+    if documents:
+        probe = np.random.default_rng(len(documents)).random((1, rag_service.embedding_dim), dtype="float32")
+        _, ids = generation.search(probe, min(len(documents), 10))
+        assert all(i in documents for i in ids[0].tolist()), ids
+
+
+async def writer(n: int, deadline: float, stats: dict):
+    rng = random.Random(n)
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        source = f"doc-{n}-{rng.randint(0, 20)}"
+        if rng.random() < 0.2:
+            await rag_service.remove_documents([source])
+            stats["removes"] += 1
+        else:
+            await rag_service.add_documents([random_document(rng)], source=source, replace=True)
+            stats["adds"] += 1
+        await asyncio.sleep(0)
+
+
+async def reader(n: int, deadline: float, stats: dict):
+    rng = random.Random(1000 + n)
+    loop = asyncio.get_running_loop()
+    kb = rag_service.default_index
+    while loop.time() < deadline:
+        check_generation(kb.current)
+        query = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        for hit in await rag_service.search_documents(query, k=5):
+            assert hit["source"] and hit["text"], hit
+        stats["searches"] += 1
+        await asyncio.sleep(0)
+
+
+async def saver(deadline: float, stats: dict):
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        # Alternate between the async path and a blocking save from a worker thread.
+        if stats["saves"] % 2:
+            await rag_service.persist()
+        else:
+            await loop.run_in_executor(None, rag_service.save_index)
+        stats["saves"] += 1
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    rag_service.load_default_index()
+    rag_service.embedder = FakeEmbedder()
+    rag_service.embedder_status = "ready"
+
+    stats = {"adds": 0, "removes": 0, "searches": 0, "saves": 0}
+    deadline = asyncio.get_running_loop().time() + args.seconds
+    await asyncio.gather(
+        *(writer(i, deadline, stats) for i in range(args.writers)),
+        *(reader(i, deadline, stats) for i in range(args.readers)),
+        saver(deadline, stats),
+    )
+    await rag_service.persist_all()
+
+    kb = rag_service.default_index
+    check_generation(kb.current)
+    reloaded = rag_service.KnowledgeIndex("reloaded", kb.directory)
+    reloaded.load()
+    assert reloaded.documents == kb.documents, "reloaded documents differ"
+    assert reloaded.current.ntotal == kb.current.ntotal, "reloaded index size differs"
+    reloaded.close()
+
+    print(f"OK  {stats}  final documents={len(kb.documents)}  storage={kb.directory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
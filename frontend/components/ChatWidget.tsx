@@ -176,7 +176,8 @@ export default function ChatWidget() {
           message: input,
           history: messages,
           current_url: contextUrl,
-          site_navigation: scanSiteNavigation()
+          site_navigation: scanSiteNavigation(),
+          site_id: new URLSearchParams(window.location.search).get("site_id")
         }),
       });
 
@@ -185,6 +186,8 @@ export default function ChatWidget() {
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
       let assistantMessageContent = "";
+      // Text of an event whose end has not been read yet
+      let buffer = "";
 
       const assistantMsgTimestamp = Date.now();
       setMessages((prev) => [
@@ -194,10 +197,14 @@ export default function ChatWidget() {
 
       while (true) {
         const { value, done } = await reader.read();
-        if (done) break;
 
-        const chunk = decoder.decode(value);
-        const lines = chunk.split("\n");
+        // stream: true keeps multi-byte characters split across reads intact
+        buffer += done ? decoder.decode() : decoder.decode(value, { stream: true });
+        // Events end with a blank line; a read can stop mid-event, so the
+        // trailing fragment waits for the next read
+        const events = buffer.split("\n\n");
+        buffer = done ? "" : events.pop() ?? "";
+        const lines = events.flatMap((event) => event.split("\n"));
 
         for (const line of lines) {
           if (line.startsWith("data: ")) {
@@ -223,6 +230,9 @@ export default function ChatWidget() {
                     }
                   }, "*");
                 }
+              } else if (data.delta) {
+                // Token-by-token text of the answer as the model generates it
+                assistantMessageContent += data.delta;
               } else if (data.content) {
                 const cleanContent = data.content.replace(/<tool_code>[\s\S]*?<\/tool_code>/g, "")
                   .replace(/<tool_output>[\s\S]*?<\/tool_output>/g, "");
@@ -245,6 +255,8 @@ export default function ChatWidget() {
             }
           }
         }
+
+        if (done) break;
       }
 
       saveMessage({ role: "assistant", content: assistantMessageContent, timestamp: assistantMsgTimestamp });
@@ -36,7 +36,9 @@
       }
     }
   }
-  iframe.src = baseUrl;
+  // Optional tenant id so the widget searches this site's own knowledge base
+  const siteId = scriptEl ? scriptEl.getAttribute("data-site-id") : null;
+  iframe.src = siteId ? `${baseUrl}/?site_id=${encodeURIComponent(siteId)}` : baseUrl;
   iframe.style.width = "400px";
   iframe.style.height = "600px";
   iframe.style.border = "1px solid #ccc";